@@ -1,8 +1,15 @@
 import json
-import asyncio
+import time
 from project_types import TypeDocument
-from retrieve_document import extract_document
+from document_store import get_document_store
+from passage_index import search_passages
+from garanties import estimer_remboursement
+from extraction_demande import detecter_type_document, extraire_demande
+from llm_client import PROMPT_CACHE_ENABLED, PROMPT_CACHE_TTL, get_async_client, is_live_backend, record_usage, run_sync
+from tracing import span, traced
 from pydantic_ai import Agent, RunContext
+from pydantic_ai.models.anthropic import AnthropicModel, AnthropicModelSettings
+from pydantic_ai.providers.anthropic import AnthropicProvider
 from pydantic import BaseModel
 from typing import List, Optional, Annotated
 from dataclasses import dataclass
@@ -20,6 +27,7 @@ class DecisionRemboursement(BaseModel):
     date: Optional[str]
     montant: Optional[float]
     instructions: Optional[str] = None
+    br_inconnue: bool = False  # base de remboursement Sécu inconnue : montant null en attendant le décompte
 
 
 class AgentContext(BaseModel):
@@ -35,20 +43,32 @@ def recuperer_document_contexte(
     Récupère le contrat d’assurance de l’utilisateur correspondant au type fourni, sous forme de chaîne de caractère.
     """
     doc_type = ctx.deps.doc_type
-    return extract_document(doc_type)
+    return get_document_store().get_text(ctx.deps.user_id, doc_type)
+
+def rechercher_passages(
+    ctx: RunContext[AgentContext],
+    requete: str,
+    k: int = 5
+) -> list[dict]:
+    """
+    Recherche les passages les plus pertinents des documents du client pour la requête
+    (garanties, articles, conditions). À privilégier plutôt que de récupérer le document entier.
+    Si un type de document est enregistré dans le contexte, la recherche y est limitée.
+    """
+    doc_types = [ctx.deps.doc_type] if ctx.deps.doc_type else None
+    return search_passages(requete, k=k, doc_types=doc_types, user_id=ctx.deps.user_id)
 
 def extraire_type_document(
     ctx: RunContext[AgentContext],
     texte: str
 ) -> TypeDocument:
     """
-    Extrait une le type de document en lien avec le texte utilisateur.
+    Détermine localement (règles et lexique, sans appel au modèle) le type de document
+    en lien avec le texte utilisateur, et l'enregistre dans le contexte :
+    inutile d'appeler enregistrer_type_document ensuite.
 
-    Il s'agit de tous type de documents permettant de répondre à la question posé.
     Pour les demandes de remboursement, il s'agit du tableau de garantie.
-    Toute demande d'information sont liées aux documents du client.
-
-    Les types possibles sont : 
+    Les types possibles sont :
     TABLEAU_DES_GARANTIES
     CONTRAT
     CONDITIONS_GENERALES
@@ -57,10 +77,10 @@ def extraire_type_document(
     GUIDE_CLIENT
     NOTICE_INFORMATION
 
-    RÈGLES STRICTES :
-    - Tu dois retourner un objet conforme au schéma TypeDocument
-    - Tu dois toujours retourner une valeur autre que None
+    Toujours une valeur : à défaut d'indice, TABLEAU_DES_GARANTIES.
     """
+    ctx.deps.doc_type = detecter_type_document(texte)
+    return ctx.deps.doc_type
 
 def enregistrer_type_document(
     ctx: RunContext[AgentContext],
@@ -72,20 +92,29 @@ def enregistrer_type_document(
     ctx.deps.doc_type = doc_type
     return {"status": "type de document enregistree"}
 
-# def calcule_montant_estimee(
-#     ctx: RunContext[AgentContext],
-#     montant: TypeDocument,
-
-# ) -> dict:
-# """
-#     Calcule le montant estimee à partir du montant.
-# """
+def estimer_montant_remboursement(
+    ctx: RunContext[AgentContext],
+    acte: str,
+    frais_engages: float,
+    base_remboursement: Optional[float] = None
+) -> dict:
+    """
+    Calcule localement le montant estimé du remboursement d'un acte à partir du tableau des garanties.
+    frais_engages : montant payé par l'assuré (€).
+    base_remboursement : base de remboursement Sécurité sociale si connue, sinon null.
+    Le champ total_rembourse est le montant à enregistrer dans la décision de remboursement.
+    Si br_inconnue est vrai (BR ni fournie ni dans le tableau), total_rembourse est null :
+    demande la BR ou le décompte Sécu à l'assuré au lieu d'inventer un montant.
+    """
+    return estimer_remboursement(acte, frais_engages, base_remboursement, user_id=ctx.deps.user_id)
 
 def create_ticket(
     ctx: RunContext[AgentContext]
 ) -> dict:
     """
-    Crée le ticket de remboursement en fonction des informations saisies
+    Crée le ticket de remboursement en fonction des informations saisies.
+    Si la base de remboursement Sécu est inconnue (br_inconnue), le ticket est créé
+    sans montant, en attente du décompte, avec les instructions à suivre.
     """
     
     user_id = ctx.deps.user_id
@@ -95,8 +124,13 @@ def create_ticket(
     if decision_remboursement is None:
         raise RuntimeError("Décision absente")
 
-    if not decision_remboursement.acte or not decision_remboursement.montant:
-        raise RuntimeError("Décision incomplète")
+    manquants = []
+    if not decision_remboursement.acte:
+        manquants.append("acte")
+    if decision_remboursement.montant is None and not decision_remboursement.br_inconnue:
+        manquants.append("montant")
+    if manquants:
+        raise RuntimeError(f"Décision incomplète : {', '.join(manquants)} manquant(s)")
 
 
     # if decision_remboursement.eligible:
@@ -105,6 +139,7 @@ def create_ticket(
         "acte": decision_remboursement.acte,
         "date": decision_remboursement.date,
         "montant": decision_remboursement.montant,
+        "statut": "en_attente_base_remboursement" if decision_remboursement.montant is None else "estime",
         "instructions": decision_remboursement.instructions,
         "document_utiliser": doc_type
     }    
@@ -130,39 +165,124 @@ def enregistrer_decision_remboursement(
     return {"status": "decision_enregistree"}
 
 
+def _instructions(demande, estimation: Optional[dict]) -> Optional[str]:
+    parts = []
+    if estimation is not None and estimation["br_inconnue"]:
+        parts.append(
+            f"Frais engagés : {estimation['frais_engages']} € ; base de remboursement Sécurité sociale inconnue : "
+            "demander le décompte Sécu (ou la BR) à l'assuré, puis estimer_montant_remboursement avec base_remboursement."
+        )
+    elif estimation is not None:
+        parts.append(
+            f"Frais engagés : {estimation['frais_engages']} € ; remboursement estimé : {estimation['total_rembourse']} € "
+            f"(Sécurité sociale {estimation['part_secu']} €, complémentaire {estimation['part_complementaire']} €), "
+            f"reste à charge {estimation['reste_a_charge']} €."
+        )
+    elif demande.frais_engages is not None:
+        parts.append(f"Frais engagés : {demande.frais_engages} € ; remboursement à estimer (estimer_montant_remboursement).")
+    if demande.deja_rembourse is not None:
+        parts.append(f"Déjà remboursé selon l'assuré : {demande.deja_rembourse} €.")
+    if demande.manquants:
+        parts.append("À demander à l'assuré : " + ", ".join(demande.manquants) + ".")
+    return " ".join(parts) or None
+
+
 def extraire_demande_remboursement(
     ctx: RunContext[AgentContext],
     texte: str
 ) -> DecisionRemboursement:
     """
-    Extrait une demande de remboursement depuis le texte utilisateur.
+    Extrait localement (règles et lexiques, sans appel au modèle) une demande de
+    remboursement depuis le texte utilisateur : acte, date de l'acte (AAAA-MM-JJ)
+    et montant.
 
-    L'acte est en lien avec le type de consultation.
-    Les instructions sont les instructions à faire pour compléter le ticket.
+    Si l'acte, les frais engagés et la base de remboursement Sécu (tableau des garanties)
+    sont connus, montant est déjà le remboursement estimé (détail dans instructions) ;
+    sinon il est null et instructions liste ce qu'il faut demander à l'assuré ; avec
+    br_inconnue, create_ticket crée le ticket sans montant, en attente du décompte Sécu.
+    La décision et le type de document sont enregistrés dans le contexte :
+    inutile d'appeler enregistrer_decision_remboursement ou enregistrer_type_document ensuite.
+    Une information absente reste null : rien n'est inventé.
+    """
+    demande = extraire_demande(texte)
+    estimation = None
+    if demande.acte is not None and demande.frais_engages is not None:
+        try:
+            estimation = estimer_remboursement(demande.acte, demande.frais_engages, user_id=ctx.deps.user_id)
+        except (FileNotFoundError, ValueError):  # tableau des garanties introuvable ou acte/document refusé
+            estimation = None
+    decision = DecisionRemboursement(
+        acte=demande.acte,
+        date=demande.date,
+        montant=estimation["total_rembourse"] if estimation is not None else None,
+        instructions=_instructions(demande, estimation),
+        br_inconnue=estimation is not None and estimation["br_inconnue"],
+    )
+    ctx.deps.decision_remboursement = decision
+    if ctx.deps.doc_type is None:
+        ctx.deps.doc_type = demande.type_document
+    return decision
 
-    RÈGLES STRICTES :
-    - Tu dois retourner un objet conforme au schéma DecisionRemboursement
-    - Si une information est absente, mets null
-    - N'invente JAMAIS une valeur
+def build_model():
     """
+    Modèle Anthropic branché sur le client asynchrone partagé (pool de connexions).
+    Avec un backend simulé (LLM_BACKEND=local|replay) : modèle de test pydantic-ai,
+    sans appel d'outil, pour faire tourner l'agent hors ligne.
+    """
+    client = get_async_client()
+    if client is not None and not is_live_backend():
+        from pydantic_ai.models.test import TestModel
+
+        return TestModel(call_tools=[], custom_output_text="Demande prise en compte (backend local).")
+    if client is None or not model.startswith("anthropic:"):
+        return model
+    return AnthropicModel(model.removeprefix("anthropic:"), provider=AnthropicProvider(anthropic_client=client))
+
+
+def build_model_settings(agent_model):
+    """
+    Prompt caching : définitions d'outils et prompt système (statiques) mis en cache,
+    ainsi que le dernier message, pour que le contexte documentaire renvoyé par un
+    outil soit relu depuis le cache aux tours suivants. agent_model : modèle renvoyé
+    par build_model (réglages seulement pour un modèle Anthropic).
+    """
+    if not PROMPT_CACHE_ENABLED or not isinstance(agent_model, AnthropicModel):
+        return None
+    return AnthropicModelSettings(
+        anthropic_cache_tool_definitions=PROMPT_CACHE_TTL,
+        anthropic_cache_instructions=PROMPT_CACHE_TTL,
+        anthropic_cache_messages=PROMPT_CACHE_TTL,
+    )
+
 
 def init_agent()->Agent:
+    agent_model = build_model()
     return Agent(
-        model=model,
+        model=agent_model,
+        model_settings=build_model_settings(agent_model),
         deps_type=AgentContext,
         tools=[
-            extraire_demande_remboursement,
-            enregistrer_decision_remboursement,
-            extraire_type_document,
-            enregistrer_type_document,
-            recuperer_document_contexte,
-            create_ticket,
+            traced(f"tool.{tool.__name__}")(tool)  # un span par appel d'outil
+            for tool in (
+                extraire_demande_remboursement,
+                enregistrer_decision_remboursement,
+                estimer_montant_remboursement,
+                extraire_type_document,
+                enregistrer_type_document,
+                rechercher_passages,
+                recuperer_document_contexte,
+                create_ticket,
+            )
         ],
         system_prompt="""
         Tu es un expert en remboursement d’assurance santé en France.
         Tu dois exraire les informations donné par l'utilisateur et modifier ton contexte à partir de ces entrées.
         Tu dois déterminer le type de document et extraire le document en lien avec la demande si c'est nécessaire.
-        Les demandes de remboursements utilisent les tableaux de garanties pour calculer le montant estimé.
+        Les outils extraire_demande_remboursement et extraire_type_document s'exécutent localement et enregistrent
+        directement leur résultat dans le contexte : commence par eux, puis complète seulement ce qui manque.
+        Pour consulter les documents, utilise d'abord rechercher_passages ; ne récupère le document entier qu'en dernier recours.
+        Les demandes de remboursements utilisent les tableaux de garanties pour calculer le montant estimé :
+        utilise estimer_montant_remboursement plutôt que de faire le calcul toi-même.
         Tu dois créer le ticket.
         """
     )
@@ -171,4 +291,10 @@ def init_agent()->Agent:
 
 
 def run_agent_sync(agent, text, deps):
-    return asyncio.run(agent.run(text, deps=deps))
+    # boucle persistante : le pool du client asynchrone survit d'un appel à l'autre
+    with span("agent"):
+        t0 = time.perf_counter()
+        result = run_sync(agent.run(text, deps=deps))
+        usage = result.usage() if callable(result.usage) else result.usage  # méthode ou propriété selon la version de pydantic-ai
+        record_usage("agent", usage, time.perf_counter() - t0)
+    return result
@@ -0,0 +1,87 @@
+# bench_extraction.py
+"""
+Benchmarks d'extraction PDF.
+
+- série vs pool de processus (pages/s) ;
+- --backends : comparaison des backends du moteur d'extraction (temps, pic mémoire,
+  coût d'un appel servi par le cache).
+
+Usage : python bench_extraction.py [chemin.pdf] [--workers N] [--repeat R] [--backends]
+"""
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+
+from extraction_engine import BACKENDS, ExtractionEngine
+from project_types import TypeDocument
+from retrieve_document import DOCUMENT_PATHS, count_pdf_pages, extract_pages_from_pdf, extract_pages_parallel
+
+
+def bench(label: str, fn, n_pages: int, repeat: int):
+    best = float("inf")
+    pages = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        pages = fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<26} | {best:7.3f}s | {n_pages / best:8.1f} pages/s")
+    return pages
+
+
+def bench_backends(pdf_path: Path, repeat: int) -> None:
+    data = pdf_path.read_bytes()
+    print(f"{'backend':<12} | {'full':>8} | {'2 pages':>8} | {'peak mem':>9} | {'cached':>8} | chars")
+    for backend in BACKENDS:
+        engine = ExtractionEngine()
+        if not engine.available(backend):
+            print(f"{backend:<12} | non installé")
+            continue
+
+        full = float("inf")
+        for _ in range(repeat):
+            engine.clear()  # parsing à froid, sans le cache de pages
+            t0 = time.perf_counter()
+            text = "\n".join(engine.iter_pages(data, backend))
+            full = min(full, time.perf_counter() - t0)
+
+        engine.clear()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        engine.extract_text(data, backend, max_pages=2, max_chars=3000)
+        limited = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        t0 = time.perf_counter()
+        engine.extract_text(data, backend, max_pages=2, max_chars=3000)
+        cached = time.perf_counter() - t0
+
+        print(f"{backend:<12} | {full:7.3f}s | {limited:7.3f}s | {peak / 2**20:7.1f}MB | "
+              f"{1e6 * cached:6.0f}µs | {len(text)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pdf", nargs="?", default=str(DOCUMENT_PATHS[TypeDocument.NOTICE_INFORMATION]))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backends", action="store_true", help="compare les backends du moteur d'extraction")
+    args = parser.parse_args()
+
+    pdf_path = Path(args.pdf)
+    n_pages = count_pdf_pages(pdf_path)
+    print(f"[BENCH] {pdf_path.name} | pages={n_pages} | repeat={args.repeat}")
+
+    if args.backends:
+        bench_backends(pdf_path, args.repeat)
+    else:
+        serial = bench("serial", lambda: extract_pages_from_pdf(pdf_path), n_pages, args.repeat)
+        parallel = bench(
+            f"parallel (workers={args.workers or 'auto'})",
+            # min_pages=0 : on force le pool pour mesurer son coût même sur un petit PDF
+            lambda: extract_pages_parallel(pdf_path, workers=args.workers, min_pages=0),
+            n_pages,
+            args.repeat,
+        )
+        print("[BENCH] same_output=", serial == parallel)
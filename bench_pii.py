@@ -0,0 +1,70 @@
+# bench_pii.py
+"""
+Benchmark redact_pii : substitutions successives (historique) vs scan unique.
+
+Usage : python bench_pii.py [--repeat R]
+"""
+import argparse
+import random
+import time
+
+from security_layer import _redact, _redact_pii_sequential
+
+PHRASES = [
+    "Bonjour, je n'ai pas été remboursé pour une consultation du 12/01.",
+    "Pouvez-vous vérifier mon dossier ? J'ai avancé les frais.",
+    "Je vous joins la facture de l'opticien et l'ordonnance.",
+    "Mon arrêt de travail a commencé le 3 mars, merci de me recontacter.",
+]
+PII = [
+    "jean.dupont@gmail.com",
+    "06 12 34 56 78",
+    "+33 6 98 76 54 32",
+    "FR76 3000 6000 0112 3456 7890 189",
+    "180027501234567",
+    "4111 1111 1111 1111",
+    "75012",
+    "Nom : Martin",
+    "Prénom : Claire",
+    "Madame Durand",
+    "je m'appelle Paul Bernard",
+    "M. Paul 75012 Paris",  # nom suivi d'une PII : pas de point entre les deux
+    "Madame Durand 0612345678",
+]
+
+
+def make_text(n_chars: int, pii_every: int = 3, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts, size, i = [], 0, 0
+    while size < n_chars:
+        chunk = rng.choice(PHRASES)
+        if i % pii_every == 0:
+            chunk += f" {rng.choice(PII)}."
+        parts.append(chunk)
+        size += len(chunk) + 1
+        i += 1
+    return " ".join(parts)[:n_chars]
+
+
+def timeit(fn, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pii-every", type=int, default=3, help="une PII toutes les N phrases")
+    args = parser.parse_args()
+
+    print(f"{'chars':>9} | {'sequential':>10} | {'single-pass':>11} | speedup | same")
+    for n in (1_000, 10_000, 100_000, 1_000_000):
+        text = make_text(n, pii_every=args.pii_every)
+        seq = timeit(_redact_pii_sequential, text, args.repeat)
+        one = timeit(_redact, text, args.repeat)
+        same = _redact(text) == _redact_pii_sequential(text)
+        print(f"{n:>9} | {1000 * seq:>8.2f}ms | {1000 * one:>9.2f}ms | {seq / one:>6.2f}x | {same}")
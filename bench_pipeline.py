@@ -0,0 +1,143 @@
+# bench_pipeline.py
+"""
+Compare les modes du pipeline de classification sur les mêmes demandes :
+- "sequential" : réponse puis classification (2 appels, la classification renvoie
+  la demande et la réponse) ;
+- "single" : réponse et classification dans un seul appel JSON ;
+- "parallel" : en option (--modes).
+
+Pour chaque mode : latence de bout en bout (p50 / p95), appels et tokens
+(entrée, dont cache de prompt, et sortie), puis accord des étiquettes
+(motif, domaine, intention, priorite, ton_client) avec le mode de référence
+(le premier de --modes).
+
+Le cache de réponses, le classifieur local et le journal de classification sont
+désactivés pour que chaque demande passe par le modèle.
+
+Usage :
+    python bench_pipeline.py                                  # API réelle, demandes d'exemple
+    python bench_pipeline.py --input demandes.jsonl --limit 50
+    python bench_pipeline.py --backend local --local-latency 0.5
+    python bench_pipeline.py --backend replay                 # réponses enregistrées (LLM_BACKEND=record)
+"""
+import os
+
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "0")
+os.environ.setdefault("LOCAL_CLASSIFIER_THRESHOLD", "2")  # jamais atteint : pas de raccourci local
+os.environ.setdefault("CLASSIFY_LOG_ENABLED", "0")
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from bulk_process import iter_records, percentile
+from classification import aprocess
+from llm_client import reset_connection_stats, usage_stats
+
+FIELDS = ("motif", "domaine", "intention", "priorite", "ton_client")
+
+SAMPLE_REQUESTS = [
+    "Bonjour, je n'ai toujours pas été remboursé de ma consultation chez le dentiste du 12 mars.",
+    "Pouvez-vous m'envoyer une attestation de tiers payant pour ma pharmacie ?",
+    "Je souhaite un devis pour ajouter mon conjoint à ma mutuelle santé.",
+    "Ma cotisation a augmenté de 15 % sans explication, je conteste cette hausse.",
+    "Je suis en arrêt de travail depuis trois semaines, comment déclarer l'arrêt pour la prévoyance ?",
+    "À quel âge puis-je partir à la retraite avec ma complémentaire ?",
+    "Je déménage le mois prochain, comment mettre à jour mon adresse ?",
+    "C'est la troisième fois que j'appelle, personne ne répond à ma réclamation, c'est inadmissible !",
+    "Je vous envoie la facture de mes lunettes pour le remboursement optique.",
+    "Mon enfant est né le 2 février, je veux l'ajouter comme ayant droit.",
+    "URGENT : hospitalisation demain, la prise en charge est-elle bien envoyée à la clinique ?",
+    "Où en est le remboursement de mon ostéopathe ? J'ai envoyé la facture il y a un mois.",
+]
+
+
+def _token_totals(usage: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+    totals = {"calls": 0, "input_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0, "output_tokens": 0}
+    for stage in usage.values():
+        for key in totals:
+            totals[key] += stage.get(key, 0)
+    return totals
+
+
+async def run_mode(mode: str, texts: List[str]) -> Dict[str, Any]:
+    reset_connection_stats()
+    latencies: List[float] = []
+    labels: List[Dict[str, Any]] = []
+    for text in texts:
+        t0 = time.perf_counter()
+        result = await aprocess(text, mode=mode)
+        latencies.append(time.perf_counter() - t0)
+        labels.append({f: result["classification"].get(f) for f in FIELDS})
+    return {
+        "mode": mode,
+        "requests": len(texts),
+        "p50_s": percentile(latencies, 0.5),
+        "p95_s": percentile(latencies, 0.95),
+        "total_s": sum(latencies),
+        "usage": _token_totals(usage_stats()),
+        "labels": labels,
+    }
+
+
+def agreement(reference: List[Dict[str, Any]], other: List[Dict[str, Any]]) -> Dict[str, float]:
+    n = len(reference) or 1
+    out = {f: sum(r[f] == o[f] for r, o in zip(reference, other)) / n for f in FIELDS}
+    out["all_fields"] = sum(r == o for r, o in zip(reference, other)) / n
+    return out
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    print(f"{'mode':<11} {'p50':>8} {'p95':>8} {'appels':>7} {'entrée':>8} {'cache lu':>9} {'sortie':>8}  (par demande)")
+    for r in results:
+        n, u = r["requests"] or 1, r["usage"]
+        print(
+            f"{r['mode']:<11} {1000 * r['p50_s']:7.0f}ms {1000 * r['p95_s']:7.0f}ms "
+            f"{u['calls'] / n:7.2f} {(u['input_tokens'] + u['cache_write_tokens']) / n:8.0f} "
+            f"{u['cache_read_tokens'] / n:9.0f} {u['output_tokens'] / n:8.0f}"
+        )
+    reference = results[0]
+    for r in results[1:]:
+        agree = agreement(reference["labels"], r["labels"])
+        fields = " | ".join(f"{f}={agree[f]:.0%}" for f in FIELDS)
+        print(f"accord {r['mode']} / {reference['mode']} : {fields} | tous={agree['all_fields']:.0%}")
+
+
+async def main(modes: List[str], texts: List[str]) -> List[Dict[str, Any]]:
+    return [await run_mode(mode, texts) for mode in modes]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", type=Path, default=None, help="JSONL {id, message} (défaut : demandes d'exemple)")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--modes", nargs="+", default=["sequential", "single"], choices=["sequential", "parallel", "single"])
+    parser.add_argument("--backend", choices=["anthropic", "local", "replay"], default="anthropic")
+    parser.add_argument("--local-latency", type=float, default=0.0)
+    parser.add_argument("--json", type=Path, default=None, help="écrit les résultats détaillés")
+    args = parser.parse_args()
+
+    texts = [text for _, text in iter_records(args.input, "id", "message")] if args.input else list(SAMPLE_REQUESTS)
+    texts = texts[: args.limit] if args.limit else texts
+
+    if args.backend == "local":
+        from local_backend import install
+
+        install(latency=args.local_latency)
+    elif args.backend == "replay":
+        from llm_client import use_clients
+        from local_backend import backend_clients
+
+        use_clients(*backend_clients("replay"), backend="replay")
+
+    logging.getLogger("assurai").setLevel(logging.WARNING)
+    with contextlib.redirect_stdout(open(os.devnull, "w")):  # sorties console ([CONFIG]...)
+        results = asyncio.run(main(args.modes, texts))
+    print_report(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
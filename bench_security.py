@@ -0,0 +1,172 @@
+# bench_security.py
+"""
+Micro-benchmarks de la couche sécurité et de l'extraction.
+
+Fonctions mesurées : redact_pii, prepare_safe_payload (texte, PDF à froid / pages
+servies par le cache), extract_text_from_file (à froid / servi par le cache) et extract_document (à froid / cache disque).
+Les messages sont synthétiques (demandes de remboursement FR, densité de PII
+contrôlée par --pii-every) de 100 caractères à 1 Mo.
+
+Pour chaque cas : ops/s, latences p50/p99 et pic mémoire (tracemalloc, mesuré
+sur un appel séparé pour ne pas fausser les temps).
+
+Usage :
+    python bench_security.py --save-baseline     # enregistre la référence
+    python bench_security.py                     # compare à la référence, code 1 si régression
+    python bench_security.py --quick             # tailles réduites (≤ 100 Ko)
+
+La référence dépend de la machine : elle n'est pas versionnée.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from bench_pii import make_text
+from extraction_engine import get_extraction_engine
+from retrieve_document import DOCUMENT_PATHS, ROOT_FOLDER, extract_document
+from security_layer import extract_text_from_file, prepare_safe_payload, redact_pii
+
+BASELINE_PATH = Path(os.getenv("BENCH_BASELINE_PATH", str(ROOT_FOLDER / "bench_security_baseline.json")))
+SIZES = (100, 1_000, 10_000, 100_000, 1_000_000)
+QUICK_SIZES = (100, 1_000, 10_000, 100_000)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def measure(fn: Callable[[], object], min_runs: int, budget_s: float, setup: Optional[Callable[[], None]] = None) -> Dict:
+    """Appelle fn au moins min_runs fois, puis tant que le budget de temps n'est pas épuisé."""
+    samples: List[float] = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # sorties console éventuelles
+        fn()  # échauffement (imports, compilation des regex)
+        start = time.perf_counter()
+        while len(samples) < min_runs or time.perf_counter() - start < budget_s:
+            if setup is not None:
+                setup()
+            t0 = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t0)
+            if len(samples) >= 10_000:
+                break
+
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "runs": len(samples),
+        "ops_per_sec": len(samples) / sum(samples),
+        "p50_ms": 1000 * percentile(samples, 0.50),
+        "p99_ms": 1000 * percentile(samples, 0.99),
+        "peak_kb": peak / 1024,
+    }
+
+
+def _attachment_pdf() -> Optional[Path]:
+    return next((p for p in DOCUMENT_PATHS.values() if p.exists()), None)
+
+
+def run_suite(sizes, pii_every: int, min_runs: int, budget_s: float) -> Dict[str, Dict]:
+    results: Dict[str, Dict] = {}
+    engine = get_extraction_engine()
+
+    for n in sizes:
+        text = make_text(n, pii_every=pii_every)
+        results[f"redact_pii/{n}"] = measure(lambda: redact_pii(text), min_runs, budget_s)
+        results[f"prepare_safe_payload/{n}"] = measure(
+            lambda: prepare_safe_payload(text, max_chars=n), min_runs, budget_s
+        )
+
+    pdf = _attachment_pdf()
+    if pdf is not None:
+        data = pdf.read_bytes()
+        results["extract_text_from_file/cold"] = measure(
+            lambda: extract_text_from_file(data, pdf.name), min_runs, budget_s, setup=engine.clear
+        )
+        results["extract_text_from_file/cached"] = measure(
+            lambda: extract_text_from_file(data, pdf.name), min_runs, budget_s
+        )
+        results["prepare_safe_payload/pdf"] = measure(
+            lambda: prepare_safe_payload(make_text(500, pii_every), file_bytes=data, file_name=pdf.name),
+            min_runs, budget_s, setup=engine.clear,
+        )
+        results["prepare_safe_payload/pdf_cached"] = measure(
+            lambda: prepare_safe_payload(make_text(500, pii_every), file_bytes=data, file_name=pdf.name),
+            min_runs, budget_s,
+        )
+
+        doc_type = next(d for d, p in DOCUMENT_PATHS.items() if p == pdf)
+        results["extract_document/cold"] = measure(
+            lambda: extract_document(doc_type, use_cache=False), min(min_runs, 3), budget_s
+        )
+        results["extract_document/cached"] = measure(lambda: extract_document(doc_type), min_runs, budget_s)
+
+    return results
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Cas dont le p50 ou le pic mémoire dépasse la référence de plus de `tolerance`."""
+    regressions = []
+    for name, res in results.items():
+        ref = baseline.get(name)
+        if ref is None:
+            continue
+        for metric in ("p50_ms", "peak_kb"):
+            if ref[metric] > 0 and res[metric] > ref[metric] * tolerance:
+                regressions.append(f"{name} {metric}: {res[metric]:.3f} > {ref[metric]:.3f} x {tolerance}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pii-every", type=int, default=3, help="une PII toutes les N phrases")
+    parser.add_argument("--min-runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=0.5, help="secondes de mesure par cas")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="facteur toléré vs la référence")
+    parser.add_argument("--quick", action="store_true")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = run_suite(QUICK_SIZES if args.quick else SIZES, args.pii_every, args.min_runs, args.budget)
+
+    baseline = {}
+    if not args.save_baseline and args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))["results"]
+
+    print(f"{'case':<34} | {'ops/s':>10} | {'p50':>9} | {'p99':>9} | {'peak':>9} | vs ref")
+    for name, res in results.items():
+        ref = baseline.get(name)
+        delta = f"{res['p50_ms'] / ref['p50_ms']:.2f}x" if ref and ref["p50_ms"] > 0 else "-"
+        print(f"{name:<34} | {res['ops_per_sec']:>10.1f} | {res['p50_ms']:>7.3f}ms | "
+              f"{res['p99_ms']:>7.3f}ms | {res['peak_kb']:>7.0f}KB | {delta}")
+
+    if args.save_baseline:
+        payload = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "pii_every": args.pii_every, "results": results}
+        args.baseline.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"\n[BENCH] référence enregistrée : {args.baseline}")
+        sys.exit(0)
+
+    if not baseline:
+        print("\n[BENCH] pas de référence : lancer avec --save-baseline")
+        sys.exit(0)
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\n[BENCH] régressions :")
+        for r in regressions:
+            print(f"- {r}")
+        sys.exit(1)
+    print("\n[BENCH] OK : aucune régression")
@@ -0,0 +1,216 @@
+# bulk_process.py
+"""
+Traitement en masse d'un fichier JSONL de demandes avec le pipeline de classification.
+
+- entrée lue en flux, une demande par ligne ({"id": ..., "message": ...}) ;
+- N demandes en vol au plus (--concurrency), via aprocess et le client asynchrone partagé ;
+- sortie JSONL écrite au fil de l'eau ; elle sert aussi de point de reprise :
+  relancer la même commande saute les ids déjà traités avec succès et retente
+  les erreurs (leurs lignes sont retirées : un id par ligne à la fin) ;
+- débit (enregistrements/s) et latences par étape (sécurisation, réponse, classification).
+
+Usage :
+    python bulk_process.py demandes.jsonl resultats.jsonl [--concurrency 8] [--mode parallel]
+    python bulk_process.py demandes.jsonl resultats.jsonl --backend local --local-latency 0.2
+    python bulk_process.py demandes.jsonl resultats.jsonl --backend replay   # réponses enregistrées (record)
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from classification import PROCESS_MODES, aprocess
+
+STAGES = ("secure_s", "reply_s", "classify_s", "reply_classify_s", "total_s")
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+@dataclass
+class BulkStats:
+    processed: int = 0
+    errors: int = 0
+    skipped: int = 0
+    blocked: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: {s: [] for s in STAGES})
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def records_per_sec(self) -> float:
+        return self.processed / self.elapsed if self.elapsed else 0.0
+
+    def record(self, timings: Dict[str, float]) -> None:
+        for stage, seconds in timings.items():
+            if stage in self.latencies:
+                self.latencies[stage].append(seconds)
+
+    def summary(self) -> str:
+        lines = [
+            f"[BULK] traités={self.processed} | erreurs={self.errors} | bloqués={self.blocked} | "
+            f"repris={self.skipped} | {self.elapsed:.1f}s | {self.records_per_sec:.2f} enr/s"
+        ]
+        for stage, samples in self.latencies.items():
+            if samples:
+                lines.append(
+                    f"  {stage:<16} p50={1000 * percentile(samples, 0.5):8.1f}ms | "
+                    f"p95={1000 * percentile(samples, 0.95):8.1f}ms | max={1000 * max(samples):8.1f}ms"
+                )
+        return "\n".join(lines)
+
+
+def iter_records(path: Path, id_field: str, text_field: str) -> Iterator[Tuple[str, str]]:
+    """(id, texte) pour chaque ligne ; l'id par défaut est le numéro de ligne."""
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            yield str(record.get(id_field, lineno)), record.get(text_field) or ""
+
+
+def completed_ids(path: Path) -> Set[str]:
+    """
+    Ids déjà traités sans erreur dans la sortie. Avant la reprise, la sortie est
+    compactée : les lignes d'erreur (ces ids sont retentés) et une dernière ligne
+    tronquée (arrêt brutal) sont retirées, pour qu'un id n'y figure qu'une fois.
+    """
+    done: Set[str] = set()
+    if not path.exists():
+        return done
+    stale = False
+    with open(path, "rb") as f:
+        for raw in f:
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                stale = True
+                break
+            if "error" in record:
+                stale = True
+            else:
+                done.add(str(record["id"]))
+    if stale:
+        tmp = path.with_name(path.name + ".compact")
+        with open(path, "rb") as src, open(tmp, "wb") as dst:
+            for raw in src:
+                try:
+                    record = json.loads(raw)
+                except ValueError:
+                    break
+                if "error" not in record:
+                    dst.write(raw if raw.endswith(b"\n") else raw + b"\n")
+        os.replace(tmp, path)
+    return done
+
+
+async def run_bulk(
+    input_path: Path,
+    output_path: Path,
+    concurrency: int = 8,
+    mode: Optional[str] = None,
+    id_field: str = "id",
+    text_field: str = "message",
+    progress_every: int = 100,
+) -> BulkStats:
+    stats = BulkStats()
+    done = completed_ids(output_path)
+    queue: "asyncio.Queue[Optional[Tuple[str, str]]]" = asyncio.Queue(maxsize=2 * concurrency)
+
+    with open(output_path, "a", encoding="utf-8") as out:
+
+        def write(record: Dict[str, Any]) -> None:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()  # chaque ligne écrite est un point de reprise
+
+        async def worker() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                record_id, text = item
+                t0 = time.perf_counter()
+                try:
+                    result = await aprocess(text, mode=mode)
+                except Exception as e:
+                    stats.errors += 1
+                    write({"id": record_id, "error": f"{type(e).__name__}: {e}"})
+                    continue
+                timings = {**result.pop("timings", {}), "total_s": time.perf_counter() - t0}
+                stats.record(timings)
+                stats.processed += 1
+                stats.blocked += bool(result.get("blocked"))
+                write({"id": record_id, **result, "timings": timings})
+                if progress_every and stats.processed % progress_every == 0:
+                    print(f"[BULK] {stats.processed} traités | {stats.records_per_sec:.2f} enr/s", file=sys.stderr)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        for record_id, text in iter_records(input_path, id_field, text_field):
+            if record_id in done:
+                stats.skipped += 1
+                continue
+            await queue.put((record_id, text))  # bloque quand N demandes sont déjà en attente
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", type=Path)
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BULK_CONCURRENCY", "8")))
+    parser.add_argument("--mode", choices=PROCESS_MODES, default=None)
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="message")
+    parser.add_argument("--backend", choices=["anthropic", "local", "replay", "record"], default="anthropic")
+    parser.add_argument("--local-latency", type=float, default=0.0, help="latence simulée par appel (backend local)")
+    parser.add_argument("--verbose", action="store_true", help="garder les logs par demande")
+    parser.add_argument("--metrics-file", type=Path, default=None, help="histogrammes par span, format Prometheus (tracing.py)")
+    args = parser.parse_args()
+
+    if args.backend == "local":
+        from local_backend import install
+
+        install(latency=args.local_latency)
+    elif args.backend != "anthropic":
+        from llm_client import use_clients
+        from local_backend import backend_clients
+
+        use_clients(*backend_clients(args.backend), backend=args.backend)
+
+    quiet = contextlib.ExitStack()
+    if not args.verbose:
+        logging.getLogger("assurai").setLevel(logging.WARNING)
+        quiet.enter_context(contextlib.redirect_stdout(open(os.devnull, "w")))  # sorties console ([CONFIG]...)
+    with quiet:
+        stats = asyncio.run(run_bulk(
+            args.input, args.output,
+            concurrency=args.concurrency, mode=args.mode,
+            id_field=args.id_field, text_field=args.text_field,
+        ))
+    print(stats.summary())
+    if args.metrics_file:
+        from tracing import write_metrics
+
+        write_metrics(args.metrics_file)
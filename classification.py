@@ -1,23 +1,28 @@
 # claude_agent.py
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+import asyncio
 import os
 import json
-from security_layer import prepare_safe_payload
+import threading
+import time
+from security_layer import PseudonymVault, SafePayload, prepare_safe_payload
 import logging; logging.basicConfig(level=logging.INFO); log = logging.getLogger("assurai")
 
-from anthropic import Anthropic  # pip install anthropic
+from anthropic import Anthropic, AsyncAnthropic  # pip install anthropic
 
 from config import ANTHROPIC_API_KEY, CLAUDE_MODEL
+from llm_client import cached_block, get_async_client, get_client, is_live_backend, record_usage, run_sync, sampling_params, usage_tokens
+from local_classifier import CLASSIFY_LOG_PATH, get_local_classifier
+from rate_limiter import current_lane, lane_for, priority
+from response_cache import get_response_cache, prompt_version
+from tracing import observe, traced
 
 
 def build_claude_client() -> Optional[Anthropic]:
-    """Crée un client Claude (Anthropic). Utilise ANTHROPIC_API_KEY si présent."""
-    api_key = ANTHROPIC_API_KEY or os.environ.get("ANTHROPIC_API_KEY")
-    log.info("build_claude_client | model=%s | key_present=%s", CLAUDE_MODEL, bool(api_key))  # debug config
-
-    if not api_key:
-        return None
-    return Anthropic(api_key=api_key)  # conforme à l'exemple officiel
+    """Client Claude (Anthropic) partagé par le process : pool de connexions keep-alive, retries."""
+    client = get_client()
+    log.info("build_claude_client | model=%s | key_present=%s", CLAUDE_MODEL, client is not None)  # debug config
+    return client
 
 
 def _extract_text(message) -> str:
@@ -40,25 +45,174 @@ Règles :
 - Ne pas inventer d’infos.
 - Si infos manquantes : poser 2 à 4 questions ciblées.
 - Ne retourne pas de JSON ici.
+- Les jetons comme [NOM_1] ou [EMAIL_1] remplacent des données personnelles : tu peux les réutiliser tels quels.
 """
 
 
+# "sequential" : la classification voit la réponse générée (2 appels enchaînés)
+# "parallel"   : classification de la seule demande, en même temps que la réponse (aprocess)
+# "single"     : réponse et classification produites par un seul appel JSON (reply_and_classify)
+PROCESS_MODE = os.getenv("PROCESS_MODE", "sequential")
+PROCESS_MODES = ("sequential", "parallel", "single")
+
+
+def build_async_claude_client() -> Optional[AsyncAnthropic]:
+    """Client Claude asynchrone partagé par le process."""
+    client = get_async_client()
+    log.info("build_async_claude_client | model=%s | key_present=%s", CLAUDE_MODEL, client is not None)
+    return client
+
+
+MISSING_KEY_REPLY = "⚠️ Impossible d'appeler Claude : clé API manquante."
+
+
+def _reply_request(user_message: str) -> Dict[str, Any]:
+    return dict(
+        model=CLAUDE_MODEL,
+        max_tokens=500,
+        system=[cached_block(SYSTEM_PROMPT_RESPONSE)],  # system prompt statique, servi par le cache de prompt
+        messages=[{"role": "user", "content": user_message}],
+        **sampling_params(temperature=0.3),
+    )
+
+
+def _cache_version(request: Dict[str, Any]) -> str:
+    # tout sauf le contenu du message : prompt système, schéma, paramètres d'échantillonnage
+    return prompt_version({k: v for k, v in request.items() if k not in ("model", "messages")})
+
+
+def _cache_get(stage: str, request: Dict[str, Any], text: str) -> Optional[Any]:
+    """Texte déjà rédigé (SafePayload.text) : aucune PII brute dans la clé ni dans la valeur."""
+    cache = get_response_cache()
+    if cache is None or not is_live_backend():  # pas de réponses simulées dans le cache
+        return None
+    value = cache.get(stage, request["model"], _cache_version(request), text)
+    log.info("response_cache | stage=%s | hit=%s | hit_rate=%.2f", stage, value is not None, cache.stats.hit_rate)
+    return value
+
+
+def _cache_put(stage: str, request: Dict[str, Any], text: str, value: Any) -> None:
+    cache = get_response_cache()
+    if cache is not None and is_live_backend():
+        cache.put(stage, request["model"], _cache_version(request), text, value)
+
+
+@traced("reply")
 def generate_customer_reply(user_message: str) -> str:
     """1er appel : génère la réponse destinée au client."""
+    request = _reply_request(user_message)
+    cached = _cache_get("reply", request, user_message)
+    if cached is not None:
+        return cached
+
     client = build_claude_client()
     log.info("generate_customer_reply | input_len=%d", len(user_message))  # taille entrée (sans contenu)
     if client is None:
-        return "⚠️ Impossible d'appeler Claude : clé API manquante."
+        return MISSING_KEY_REPLY
 
-    msg = client.messages.create(
-        model=CLAUDE_MODEL,
-        max_tokens=500,
-        system=SYSTEM_PROMPT_RESPONSE,  # system prompt côté Claude Messages API
-        messages=[{"role": "user", "content": user_message}],
-        temperature=0.3,
-    )
+    t0 = time.perf_counter()
+    msg = client.messages.create(**request)
+    record_usage("reply", getattr(msg, "usage", None), time.perf_counter() - t0)
     log.info("generate_customer_reply | ok | blocks=%d", len(getattr(msg, "content", []) or []))  # réponse reçue
-    return _extract_text(msg)
+    reply = _extract_text(msg)
+    _cache_put("reply", request, user_message, reply)
+    return reply
+
+
+@traced("reply")
+async def agenerate_customer_reply(user_message: str) -> str:
+    """Version asynchrone de generate_customer_reply."""
+    request = _reply_request(user_message)
+    cached = _cache_get("reply", request, user_message)
+    if cached is not None:
+        return cached
+
+    client = build_async_claude_client()
+    log.info("agenerate_customer_reply | input_len=%d", len(user_message))
+    if client is None:
+        return MISSING_KEY_REPLY
+
+    t0 = time.perf_counter()
+    msg = await client.messages.create(**request)
+    record_usage("reply", getattr(msg, "usage", None), time.perf_counter() - t0)
+    log.info("agenerate_customer_reply | ok | blocks=%d", len(getattr(msg, "content", []) or []))
+    reply = _extract_text(msg)
+    _cache_put("reply", request, user_message, reply)
+    return reply
+
+
+class ReplyStream:
+    """
+    Réponse client en flux (itérateur de deltas de texte), même cache et même
+    requête que generate_customer_reply.
+    Une fois consommé : .text (réponse complète), .ttft (premier token) et .total, en secondes.
+    """
+
+    def __init__(self, user_message: str):
+        self.user_message = user_message
+        self.text = ""
+        self.ttft: Optional[float] = None
+        self.total: Optional[float] = None
+        self.cached = False
+        self.usage = None
+        self._gen = self._run()
+
+    def __iter__(self) -> "ReplyStream":
+        return self
+
+    def __next__(self) -> str:
+        return next(self._gen)
+
+    def consume(self) -> str:
+        """Lit la fin du flux (s'il en reste) et renvoie la réponse complète."""
+        for _ in self:
+            pass
+        return self.text
+
+    def _run(self) -> Iterator[str]:
+        t0 = time.perf_counter()
+        parts: List[str] = []
+        for delta in self._deltas():
+            if self.ttft is None:
+                self.ttft = time.perf_counter() - t0
+            parts.append(delta)
+            yield delta
+        self.text = "".join(parts).strip()
+        self.total = time.perf_counter() - t0
+        # la durée du flux dépend de l'itération par l'appelant : mesure hors span
+        observe("reply_stream", self.total, *usage_tokens(self.usage))
+        log.info("stream_customer_reply | ttft=%.3fs | total=%.3fs | cached=%s", self.ttft or 0.0, self.total, self.cached)
+
+    def _deltas(self) -> Iterator[str]:
+        request = _reply_request(self.user_message)
+        cached = _cache_get("reply", request, self.user_message)
+        if cached is not None:
+            self.cached = True
+            yield cached
+            return
+
+        client = build_claude_client()
+        log.info("stream_customer_reply | input_len=%d", len(self.user_message))
+        if client is None:
+            yield MISSING_KEY_REPLY
+            return
+
+        t0 = time.perf_counter()
+        ttft = None
+        with client.messages.stream(**request) as stream:
+            for delta in stream.text_stream:
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                yield delta
+            final = stream.get_final_message()
+        self.usage = getattr(final, "usage", None)
+        record_usage("reply", self.usage, time.perf_counter() - t0, ttft=ttft)
+        _cache_put("reply", request, self.user_message, _extract_text(final))
+
+
+def stream_customer_reply(user_message: str) -> ReplyStream:
+    """1er appel, en flux : les deltas arrivent au fil de la génération."""
+    return ReplyStream(user_message)
 
 
 # 2) Classification (JSON strict via output_config.format / json_schema)
@@ -113,28 +267,28 @@ CLASSIFICATION_SCHEMA: Dict[str, Any] = {
 }
 
 
-def classify(text_to_classify: str) -> Dict[str, Any]:
-    """2e appel : classification JSON garantie par le schéma."""
-    client = build_claude_client()
-    if client is None:
-        return {
-            "motif": "AUTRE",
-            "domaine": "INCONNU",
-            "intention": "INFORMATION",
-            "priorite": "NORMALE",
-            "ton_client": "CALME",
-            "actions_recommandees": ["DEMANDER_INFOS"],
-            "infos_a_collecter": [],
-            "resume_1_phrase": "Clé API manquante : classification non réalisée.",
-            "confiance": 0.0,
-        }
+def _default_classification(resume: str) -> Dict[str, Any]:
+    return {
+        "motif": "AUTRE",
+        "domaine": "INCONNU",
+        "intention": "INFORMATION",
+        "priorite": "NORMALE",
+        "ton_client": "CALME",
+        "actions_recommandees": ["DEMANDER_INFOS"],
+        "infos_a_collecter": [],
+        "resume_1_phrase": resume,
+        "confiance": 0.0,
+    }
+
+
+def _classify_request(text_to_classify: str) -> Dict[str, Any]:
     log.info("classify | input_len=%d | schema_keys=%d", len(text_to_classify), len(CLASSIFICATION_SCHEMA.get("properties", {})))  # debug schema
-    msg = client.messages.create(
+    return dict(
         model=CLAUDE_MODEL,
         max_tokens=300,
-        system=SYSTEM_PROMPT_CLASSIFIER,
+        system=[cached_block(SYSTEM_PROMPT_CLASSIFIER)],
         messages=[{"role": "user", "content": f"Texte à classifier :\n{text_to_classify}"}],
-        temperature=0.0,
+        **sampling_params(temperature=0.0),
         # Structured outputs (JSON Schema) => JSON valide dans response.content[0].text
         output_config={
             "format": {
@@ -144,12 +298,16 @@ def classify(text_to_classify: str) -> Dict[str, Any]:
         },
     )
 
+
+def _parse_classification(msg) -> Dict[str, Any]:
     raw_json = _extract_text(msg)
     log.info("classify | raw_json=%s", raw_json[:300].replace("\n", "\\n"))  # tronqué (évite fuite)
     #print("DEBUG raw_json:", repr(raw_json))
-    data = json.loads(raw_json)
+    return _check_classification(json.loads(raw_json))
+
 
-# Validation simple / garde-fou : forcer confiance dans [0, 1]
+def _check_classification(data: Dict[str, Any]) -> Dict[str, Any]:
+    # Validation simple / garde-fou : forcer confiance dans [0, 1]
     try:
         c = float(data.get("confiance", 0.0))
     except (TypeError, ValueError):
@@ -160,45 +318,219 @@ def classify(text_to_classify: str) -> Dict[str, Any]:
     return data
 
 
-def process(user_message: str, file_bytes: bytes = None, file_name: str = None) -> Dict[str, Any]:
-    log.info("process | start | msg_len=%d", len(user_message))  # début pipeline
+# Journal (texte rédigé, classification) qui sert à entraîner local_classifier
+CLASSIFY_LOG_ENABLED = os.getenv("CLASSIFY_LOG_ENABLED", "1") not in ("0", "false", "False")
+_LOG_LOCK = threading.Lock()
 
-    """
-    Pipeline complet : sécurisation -> réponse -> classification.
-    Le LLM ne voit jamais les PII brutes (redaction).
-    """
+
+def _log_classification(text_to_classify: str, data: Dict[str, Any]) -> None:
+    if not CLASSIFY_LOG_ENABLED or not is_live_backend():
+        return
+    line = json.dumps({"text": text_to_classify, "classification": data}, ensure_ascii=False)
+    with _LOG_LOCK:
+        CLASSIFY_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(CLASSIFY_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _local_classify(text_to_classify: str) -> Optional[Dict[str, Any]]:
+    """Classifieur local d'abord ; None si pas de modèle ou confiance sous le seuil."""
+    model = get_local_classifier()
+    if model is None:
+        return None
+    data = model.classify(text_to_classify)
+    log.info("local_classifier | hit=%s | avoided_rate=%.2f", data is not None, model.stats.avoided_rate)
+    return data
+
+
+@traced("classify")
+def classify(text_to_classify: str) -> Dict[str, Any]:
+    """2e appel : classification JSON garantie par le schéma."""
+    request = _classify_request(text_to_classify)
+    cached = _cache_get("classify", request, text_to_classify)
+    if cached is not None:
+        return cached
+
+    local = _local_classify(text_to_classify)
+    if local is not None:
+        return local
+
+    client = build_claude_client()
+    if client is None:
+        return _default_classification("Clé API manquante : classification non réalisée.")
+    t0 = time.perf_counter()
+    msg = client.messages.create(**request)
+    record_usage("classify", getattr(msg, "usage", None), time.perf_counter() - t0)
+    data = _parse_classification(msg)
+    _cache_put("classify", request, text_to_classify, data)
+    _log_classification(text_to_classify, data)
+    return data
+
+
+@traced("classify")
+async def aclassify(text_to_classify: str) -> Dict[str, Any]:
+    """Version asynchrone de classify."""
+    request = _classify_request(text_to_classify)
+    cached = _cache_get("classify", request, text_to_classify)
+    if cached is not None:
+        return cached
+
+    local = _local_classify(text_to_classify)
+    if local is not None:
+        return local
+
+    client = build_async_claude_client()
+    if client is None:
+        return _default_classification("Clé API manquante : classification non réalisée.")
+    t0 = time.perf_counter()
+    msg = await client.messages.create(**request)
+    record_usage("classify", getattr(msg, "usage", None), time.perf_counter() - t0)
+    data = _parse_classification(msg)
+    _cache_put("classify", request, text_to_classify, data)
+    _log_classification(text_to_classify, data)
+    return data
+
+
+# 3) Réponse + classification en un seul appel (PROCESS_MODE=single)
+SYSTEM_PROMPT_COMBINED = SYSTEM_PROMPT_RESPONSE.replace(
+    "- Ne retourne pas de JSON ici.\n", ""
+) + """
+Retourne UNIQUEMENT un JSON conforme au schéma fourni :
+- "reponse" : ta réponse à l'assuré (texte, selon les règles ci-dessus) ;
+- "classification" : la demande classée ; si incertain : AUTRE/INCONNU + confiance faible.
+"""
+
+COMBINED_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "reponse": {"type": "string"},  # en premier : la classification est générée après la réponse
+        "classification": CLASSIFICATION_SCHEMA,
+    },
+    "required": ["reponse", "classification"],
+    "additionalProperties": False,
+}
+
+
+def _combined_request(user_message: str) -> Dict[str, Any]:
+    return dict(
+        model=CLAUDE_MODEL,
+        max_tokens=800,
+        system=[cached_block(SYSTEM_PROMPT_COMBINED)],
+        messages=[{"role": "user", "content": user_message}],
+        **sampling_params(temperature=0.3),
+        output_config={
+            "format": {
+                "type": "json_schema",
+                "schema": COMBINED_SCHEMA,
+            }
+        },
+    )
+
+
+def _parse_combined(msg) -> Tuple[str, Dict[str, Any]]:
+    data = json.loads(_extract_text(msg))
+    return data["reponse"].strip(), _check_classification(data["classification"])
+
+
+def _combined_from_local(user_message: str) -> Optional[Dict[str, Any]]:
+    # classifieur local sûr de lui : seul l'appel de réponse reste nécessaire
+    return _local_classify(_classification_input(user_message, None))
+
+
+@traced("reply_classify")
+def reply_and_classify(user_message: str) -> Tuple[str, Dict[str, Any]]:
+    """Un seul appel : réponse client et classification JSON (schéma COMBINED_SCHEMA)."""
+    request = _combined_request(user_message)
+    cached = _cache_get("combined", request, user_message)
+    if cached is not None:
+        return cached["reponse"], cached["classification"]
+
+    local = _combined_from_local(user_message)
+    if local is not None:
+        return generate_customer_reply(user_message), local
+
+    client = build_claude_client()
+    log.info("reply_and_classify | input_len=%d", len(user_message))
+    if client is None:
+        return MISSING_KEY_REPLY, _default_classification("Clé API manquante : classification non réalisée.")
+    t0 = time.perf_counter()
+    msg = client.messages.create(**request)
+    record_usage("combined", getattr(msg, "usage", None), time.perf_counter() - t0)
+    reply, data = _parse_combined(msg)
+    _cache_put("combined", request, user_message, {"reponse": reply, "classification": data})
+    _log_classification(_classification_input(user_message, reply), data)
+    return reply, data
+
+
+@traced("reply_classify")
+async def areply_and_classify(user_message: str) -> Tuple[str, Dict[str, Any]]:
+    """Version asynchrone de reply_and_classify."""
+    request = _combined_request(user_message)
+    cached = _cache_get("combined", request, user_message)
+    if cached is not None:
+        return cached["reponse"], cached["classification"]
+
+    local = _combined_from_local(user_message)
+    if local is not None:
+        return await agenerate_customer_reply(user_message), local
+
+    client = build_async_claude_client()
+    log.info("areply_and_classify | input_len=%d", len(user_message))
+    if client is None:
+        return MISSING_KEY_REPLY, _default_classification("Clé API manquante : classification non réalisée.")
+    t0 = time.perf_counter()
+    msg = await client.messages.create(**request)
+    record_usage("combined", getattr(msg, "usage", None), time.perf_counter() - t0)
+    reply, data = _parse_combined(msg)
+    _cache_put("combined", request, user_message, {"reponse": reply, "classification": data})
+    _log_classification(_classification_input(user_message, reply), data)
+    return reply, data
+
+
+def _secure(
+    user_message: str,
+    file_bytes: Optional[bytes],
+    file_name: Optional[str],
+    vault: Optional[PseudonymVault],
+) -> SafePayload:
     safe = prepare_safe_payload(
         user_message=user_message,
         file_bytes=file_bytes,
         file_name=file_name,
         hard_block=False,  # mets True si tu veux bloquer IBAN/NIR/carte
+        vault=vault,
     )
     log.info("security | pii_found=%s | blocked=%s", getattr(safe, "pii_found", None), getattr(safe, "blocked", None))  # privacy-by-design
+    return safe
 
 
-    # Si tu veux bloquer en cas de données très sensibles :
-    if safe.blocked:
-        return {
-            "reply": "⚠️ Votre message contient des données très sensibles (IBAN/NIR/carte). "
-                     "Merci de les retirer avant de continuer.",
-            "classification": {
-                "motif": "AUTRE",
-                "domaine": "INCONNU",
-                "intention": "INFORMATION",
-                "priorite": "NORMALE",
-                "ton_client": "CALME",
-                "actions_recommandees": ["DEMANDER_INFOS"],
-                "infos_a_collecter": [],
-                "resume_1_phrase": "Blocage sécurité: données sensibles détectées.",
-                "confiance": 0.0,
-            },
-            "pii_found": safe.pii_found,
-            "blocked": True,
-            "block_reason": safe.block_reason,
-        }
-
-    reply = generate_customer_reply(safe.text)
-    classification = classify(f"DEMANDE CLIENT:\n{safe.text}\n\nREPONSE ASSISTANT:\n{reply}")
+def _blocked_result(safe: SafePayload) -> Dict[str, Any]:
+    return {
+        "reply": "⚠️ Votre message contient des données très sensibles (IBAN/NIR/carte). "
+                 "Merci de les retirer avant de continuer.",
+        "classification": _default_classification("Blocage sécurité: données sensibles détectées."),
+        "pii_found": safe.pii_found,
+        "blocked": True,
+        "block_reason": safe.block_reason,
+    }
+
+
+def _classification_input(safe_text: str, reply: Optional[str]) -> str:
+    if reply is None:
+        return f"DEMANDE CLIENT:\n{safe_text}"
+    return f"DEMANDE CLIENT:\n{safe_text}\n\nREPONSE ASSISTANT:\n{reply}"
+
+
+def _result(
+    safe: SafePayload,
+    reply: str,
+    classification: Dict[str, Any],
+    vault: Optional[PseudonymVault],
+) -> Dict[str, Any]:
+    if vault is not None:
+        reply = vault.rehydrate(reply)
+        classification["resume_1_phrase"] = vault.rehydrate(classification.get("resume_1_phrase", ""))
+        classification["infos_a_collecter"] = [vault.rehydrate(i) for i in classification.get("infos_a_collecter", [])]
 
     return {
         "reply": reply,
@@ -207,3 +539,185 @@ def process(user_message: str, file_bytes: bytes = None, file_name: str = None)
         "blocked": False,
         "block_reason": None,
     }
+
+
+def _lane_hint(safe_text: str) -> str:
+    """
+    Voie de priorité des appels au modèle (rate_limiter) : priorite prédite par le
+    classifieur local s'il est entraîné, même sous le seuil de confiance.
+    """
+    model = get_local_classifier()
+    if model is None:
+        return current_lane()
+    predicted, _ = model.predict(_classification_input(safe_text, None))
+    return lane_for(predicted.get("priorite"))
+
+
+@traced("process")
+def process(
+    user_message: str,
+    file_bytes: bytes = None,
+    file_name: str = None,
+    vault: Optional[PseudonymVault] = None,
+    mode: Optional[str] = None,
+) -> Dict[str, Any]:
+    log.info("process | start | msg_len=%d", len(user_message))  # début pipeline
+
+    """
+    Pipeline complet : sécurisation -> réponse -> classification. Modes (PROCESS_MODE
+    par défaut) comme aprocess : "sequential", "parallel" (les deux appels ensemble,
+    sur la boucle du client asynchrone) ou "single" (un seul appel). Mode inconnu : ValueError.
+    Le LLM ne voit jamais les PII brutes (redaction).
+    Avec un coffre de session (vault), les PII sont pseudonymisées ([NOM_1]...)
+    et réinjectées dans la réponse et le ticket après les appels.
+    """
+    mode = mode or PROCESS_MODE
+    if mode not in PROCESS_MODES:
+        raise ValueError(f"Unknown process mode: {mode}")
+    t0 = time.perf_counter()
+    safe = _secure(user_message, file_bytes, file_name, vault)
+    t1 = time.perf_counter()
+
+    # Si tu veux bloquer en cas de données très sensibles :
+    if safe.blocked:
+        return _blocked_result(safe)
+
+    with priority(_lane_hint(safe.text)):  # HAUTE d'abord quand le régulateur fait la queue
+        if mode == "single":
+            reply, classification = reply_and_classify(safe.text)
+            result = _result(safe, reply, classification, vault)
+            result["timings"] = {"secure_s": t1 - t0, "reply_classify_s": time.perf_counter() - t1}
+            return result
+
+        if mode == "parallel":
+            # la voie de priorité suit la coroutine (contexte copié vers la boucle)
+            (reply, reply_s), (classification, classify_s) = run_sync(_reply_classify_parallel(safe.text))
+        else:
+            reply = generate_customer_reply(safe.text)
+            t2 = time.perf_counter()
+            reply_s = t2 - t1
+            classification = classify(_classification_input(safe.text, reply))
+            classify_s = time.perf_counter() - t2
+        result = _result(safe, reply, classification, vault)
+        result["timings"] = {"secure_s": t1 - t0, "reply_s": reply_s, "classify_s": classify_s}
+        return result
+
+
+async def _timed(coro) -> Tuple[Any, float]:
+    t0 = time.perf_counter()
+    value = await coro
+    return value, time.perf_counter() - t0
+
+
+async def _reply_classify_parallel(safe_text: str) -> List[Tuple[Any, float]]:
+    """Réponse et classification de la demande seule, lancées ensemble ; (valeur, durée) de chacune."""
+    return await asyncio.gather(
+        _timed(agenerate_customer_reply(safe_text)),
+        _timed(aclassify(_classification_input(safe_text, None))),
+    )
+
+
+@traced("process")
+async def aprocess(
+    user_message: str,
+    file_bytes: bytes = None,
+    file_name: str = None,
+    vault: Optional[PseudonymVault] = None,
+    mode: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Pipeline asynchrone, sur le client asynchrone partagé.
+    - mode "sequential" : comme process (la classification voit la réponse) ;
+    - mode "parallel" : réponse et classification de la demande lancées ensemble,
+      la latence de bout en bout tombe à celle de l'appel le plus long ;
+    - mode "single" : un seul appel produit la réponse et la classification.
+    """
+    mode = mode or PROCESS_MODE
+    if mode not in PROCESS_MODES:
+        raise ValueError(f"Unknown process mode: {mode}")
+    log.info("aprocess | start | msg_len=%d | mode=%s", len(user_message), mode)
+
+    # redaction + extraction PDF : CPU / disque, hors de la boucle d'évènements
+    safe, secure_s = await _timed(asyncio.to_thread(_secure, user_message, file_bytes, file_name, vault))
+    if safe.blocked:
+        return _blocked_result(safe)
+
+    with priority(_lane_hint(safe.text)):  # hérité par les tâches de gather
+        if mode == "single":
+            (reply, classification), combined_s = await _timed(areply_and_classify(safe.text))
+            result = _result(safe, reply, classification, vault)
+            result["timings"] = {"secure_s": secure_s, "reply_classify_s": combined_s}
+            return result
+
+        if mode == "parallel":
+            (reply, reply_s), (classification, classify_s) = await _reply_classify_parallel(safe.text)
+        else:
+            reply, reply_s = await _timed(agenerate_customer_reply(safe.text))
+            classification, classify_s = await _timed(aclassify(_classification_input(safe.text, reply)))
+        result = _result(safe, reply, classification, vault)
+        result["timings"] = {"secure_s": secure_s, "reply_s": reply_s, "classify_s": classify_s}
+        return result
+
+
+class ProcessStream:
+    """
+    process() en flux. Itérer sur l'objet renvoie la réponse client au fil de la
+    génération (jetons de pseudonymisation déjà réinjectés) ; result() lit la fin du
+    flux puis lance la classification et renvoie le même dictionnaire que process().
+    Appels au modèle dans la voie de priorité de la demande, comme process().
+    """
+
+    def __init__(self, safe: SafePayload, vault: Optional[PseudonymVault] = None, secure_s: Optional[float] = None):
+        self.safe = safe
+        self.vault = vault
+        self.blocked = safe.blocked
+        self.secure_s = secure_s
+        self.lane = None if safe.blocked else _lane_hint(safe.text)
+        self.reply = None if safe.blocked else stream_customer_reply(safe.text)
+        self._result: Optional[Dict[str, Any]] = None
+
+    def __iter__(self) -> Iterator[str]:
+        if self.reply is None:
+            return iter(())
+        deltas = self._in_lane()
+        return self.vault.rehydrate_stream(deltas) if self.vault is not None else deltas
+
+    def _in_lane(self) -> Iterator[str]:
+        # la requête part au premier next() ; la voie n'est pas laissée active entre deux yield
+        with priority(self.lane):
+            first = next(self.reply, None)
+        if first is None:
+            return
+        yield first
+        yield from self.reply
+
+    def result(self) -> Dict[str, Any]:
+        if self._result is None:
+            if self.blocked:
+                self._result = _blocked_result(self.safe)
+            else:
+                with priority(self.lane):
+                    reply = self.reply.consume()
+                    t0 = time.perf_counter()
+                    classification = classify(_classification_input(self.safe.text, reply))
+                self._result = _result(self.safe, reply, classification, self.vault)
+                self._result["timings"] = {
+                    "secure_s": self.secure_s,
+                    "ttft_s": self.reply.ttft,
+                    "reply_s": self.reply.total,
+                    "classify_s": time.perf_counter() - t0,
+                }
+        return self._result
+
+
+def process_stream(
+    user_message: str,
+    file_bytes: bytes = None,
+    file_name: str = None,
+    vault: Optional[PseudonymVault] = None,
+) -> ProcessStream:
+    """Sécurisation immédiate ; réponse en flux puis classification (voir ProcessStream)."""
+    log.info("process_stream | start | msg_len=%d", len(user_message))
+    t0 = time.perf_counter()
+    safe = _secure(user_message, file_bytes, file_name, vault)
+    return ProcessStream(safe, vault, secure_s=time.perf_counter() - t0)
@@ -0,0 +1,192 @@
+# corpus_snapshot.py
+"""
+Snapshot binaire du corpus de l'espace client.
+
+`python corpus_snapshot.py build` compile tous les documents de DOCUMENT_PATHS
+(texte des pages, offsets, index de passages) en un seul fichier versionné.
+À l'exécution, le fichier est ouvert en mmap : les pages sont servies comme des
+tranches (memoryview) sans copie, et la mémoire est partagée entre processus
+via le cache de pages de l'OS.
+
+Format :
+    MAGIC (8 octets) | taille de l'en-tête (uint32 LE) | en-tête JSON | blob texte | blob index
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from document_cache import get_document_cache
+
+ROOT_FOLDER = Path(__file__).resolve().parent
+
+SNAPSHOT_PATH = Path(os.getenv("CORPUS_SNAPSHOT_PATH", str(ROOT_FOLDER / "data" / ".cache" / "corpus.snap")))
+SNAPSHOT_MAGIC = b"AISNAP01"
+SNAPSHOT_VERSION = 1
+_HEADER_LEN = struct.Struct("<I")
+
+
+class CorpusSnapshot:
+    """Lecture d'un snapshot via mmap."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mm)
+
+        if self._view[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"Not a corpus snapshot: {path}")
+        start = len(SNAPSHOT_MAGIC) + _HEADER_LEN.size
+        (header_len,) = _HEADER_LEN.unpack_from(self._mm, len(SNAPSHOT_MAGIC))
+        self.header: Dict = json.loads(bytes(self._view[start:start + header_len]))
+        if self.header.get("version") != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported snapshot version: {self.header.get('version')}")
+        self._data_start = start + header_len
+
+    @property
+    def documents(self) -> Dict[str, Dict]:
+        return self.header["documents"]
+
+    def fingerprint(self, doc_type: str) -> Optional[str]:
+        doc = self.documents.get(doc_type)
+        return doc["sha256"] if doc else None
+
+    def num_pages(self, doc_type: str) -> int:
+        return len(self.documents[doc_type]["pages"])
+
+    def page_bytes(self, doc_type: str, page_no: int) -> memoryview:
+        """Tranche UTF-8 d'une page, sans copie."""
+        offset, length = self.documents[doc_type]["pages"][page_no]
+        start = self._data_start + offset
+        return self._view[start:start + length]
+
+    def page_text(self, doc_type: str, page_no: int) -> str:
+        return str(self.page_bytes(doc_type, page_no), "utf-8")
+
+    def pages(self, doc_type: str) -> List[str]:
+        return [self.page_text(doc_type, i) for i in range(self.num_pages(doc_type))]
+
+    def index_data(self) -> Optional[Dict]:
+        """Index de passages sérialisé dans le snapshot (None s'il n'y en a pas)."""
+        section = self.header.get("index")
+        if not section:
+            return None
+        start = self._data_start + section[0]
+        return json.loads(bytes(self._view[start:start + section[1]]))
+
+    def close(self) -> None:
+        """
+        Les tranches renvoyées par page_bytes doivent avoir été libérées (release) avant,
+        sinon BufferError ; le fichier est fermé dans tous les cas.
+        """
+        try:
+            self._view.release()
+            self._mm.close()
+        finally:
+            self._file.close()
+
+
+def build_snapshot(path: Path = SNAPSHOT_PATH) -> Dict:
+    """Compile le corpus (pages + index de passages) dans un snapshot."""
+    # imports locaux : retrieve_document importe ce module
+    from passage_index import build_index
+    from retrieve_document import DOCUMENT_PATHS, extract_document_pages
+
+    cache = get_document_cache()
+    documents: Dict[str, Dict] = {}
+    blob = bytearray()
+
+    for doc_type, pdf_path in DOCUMENT_PATHS.items():
+        if not pdf_path.exists():
+            continue
+        st = pdf_path.stat()
+        offsets = []
+        for page in extract_document_pages(doc_type):
+            data = page.encode("utf-8")
+            offsets.append([len(blob), len(data)])
+            blob += data
+        documents[doc_type.value] = {
+            "source": str(pdf_path),
+            "sha256": cache.fingerprint(pdf_path),
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "pages": offsets,
+        }
+
+    index_blob = json.dumps(build_index().to_dict(), ensure_ascii=False).encode("utf-8")
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "documents": documents,
+        "index": [len(blob), len(index_blob)],
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(_HEADER_LEN.pack(len(header_bytes)))
+        f.write(header_bytes)
+        f.write(blob)
+        f.write(index_blob)
+    os.replace(tmp, path)  # les lecteurs déjà ouverts gardent l'ancien fichier
+    return header
+
+
+_SNAPSHOT: Optional[CorpusSnapshot] = None
+_SNAPSHOT_MTIME: Optional[int] = None
+_SNAPSHOT_LOCK = threading.Lock()
+
+
+def get_snapshot(path: Path = SNAPSHOT_PATH) -> Optional[CorpusSnapshot]:
+    """Snapshot partagé par le process, ou None si aucun n'a été construit."""
+    global _SNAPSHOT, _SNAPSHOT_MTIME
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    if _SNAPSHOT is not None and _SNAPSHOT_MTIME == mtime:
+        return _SNAPSHOT
+    with _SNAPSHOT_LOCK:
+        if _SNAPSHOT is None or _SNAPSHOT_MTIME != mtime:
+            try:
+                snapshot = CorpusSnapshot(path)
+            except (OSError, ValueError):
+                return None
+            previous, _SNAPSHOT, _SNAPSHOT_MTIME = _SNAPSHOT, snapshot, mtime
+            if previous is not None:
+                # fichier reconstruit : l'ancien mapping est libéré au lieu de fuir
+                try:
+                    previous.close()
+                except BufferError:
+                    pass  # tranches page_bytes encore détenues : le mapping part avec la dernière
+        return _SNAPSHOT
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:2] == ["build"]:
+        t0 = time.perf_counter()
+        header = build_snapshot()
+        print(f"[SNAPSHOT] {SNAPSHOT_PATH} | docs={list(header['documents'])} | "
+              f"bytes={SNAPSHOT_PATH.stat().st_size} | {time.perf_counter() - t0:.2f}s")
+    else:
+        t0 = time.perf_counter()
+        snap = get_snapshot()
+        if snap is None:
+            print("[SNAPSHOT] absent : lancer `python corpus_snapshot.py build`")
+            sys.exit(1)
+        print(f"[SNAPSHOT] open={1000 * (time.perf_counter() - t0):.2f}ms | built_at={snap.header['built_at']}")
+        for doc_type in snap.documents:
+            print(f"- {doc_type}: {snap.num_pages(doc_type)} pages")
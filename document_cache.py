@@ -0,0 +1,243 @@
+# document_cache.py
+"""
+Cache disque des extractions PDF.
+
+Chaque document est identifié par le SHA-256 de son contenu ; le triplet
+(chemin, mtime, taille) sert de raccourci pour éviter de re-hasher un fichier
+inchangé. Le texte est stocké page par page, et l'ensemble est borné en taille
+avec une éviction LRU. Un hit ne fait que dater l'entrée en mémoire : l'ordre LRU
+est écrit avec l'index à la prochaine écriture (ajout, éviction) ou à close().
+"""
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT_FOLDER = Path(__file__).resolve().parent
+
+CACHE_DIR = Path(os.getenv("EXTRACTION_CACHE_DIR", str(ROOT_FOLDER / "data" / ".cache" / "extraction")))
+CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_INDEX_VERSION = 1
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 du contenu d'un fichier, lu par blocs."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    page_hits: int = 0
+    page_misses: int = 0
+    evictions: int = 0
+    rehashes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        d = asdict(self)
+        d["hit_rate"] = round(self.hit_rate, 4)
+        return d
+
+
+class DocumentCache:
+    """
+    Cache persistant : index.json + un dossier par empreinte contenant une
+    entrée par page (00000.txt, 00001.txt, ...).
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.RLock()
+        self._index_path = self.cache_dir / "index.json"
+        self._index = self._load_index()
+        self._dirty = False  # dates d'accès pas encore écrites
+
+    # ---------- index ----------
+    def _load_index(self) -> Dict:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") == CACHE_INDEX_VERSION:
+                return index
+        except (OSError, ValueError):
+            pass
+        return {"version": CACHE_INDEX_VERSION, "files": {}, "entries": {}}
+
+    def _save_index(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # nom temporaire unique : deux process peuvent écrire l'index en même temps
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.cache_dir, suffix=".tmp", delete=False) as f:
+            json.dump(self._index, f)
+        try:
+            os.replace(f.name, self._index_path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+        self._dirty = False
+
+    def close(self) -> None:
+        """Écrit l'ordre LRU accumulé par les hits depuis la dernière écriture."""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _entry_dir(self, sha: str) -> Path:
+        return self.cache_dir / sha
+
+    def _page_path(self, sha: str, page_no: int) -> Path:
+        return self._entry_dir(sha) / f"{page_no:05d}.txt"
+
+    # ---------- empreinte ----------
+    def fingerprint(self, path: Path) -> str:
+        """
+        Retourne le SHA-256 du fichier. Si mtime et taille n'ont pas bougé
+        depuis le dernier passage, l'empreinte mémorisée est réutilisée.
+        """
+        path = Path(path).resolve()
+        st = path.stat()
+        key = str(path)
+        with self._lock:
+            known = self._index["files"].get(key)
+            if known and known["mtime_ns"] == st.st_mtime_ns and known["size"] == st.st_size:
+                return known["sha256"]
+
+        sha = file_sha256(path)
+        with self._lock:
+            self.stats.rehashes += 1
+            self._index["files"][key] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": sha}
+            self._save_index()
+        return sha
+
+    # ---------- lecture / écriture ----------
+    def num_pages(self, sha: str) -> Optional[int]:
+        entry = self._index["entries"].get(sha)
+        return entry["pages"] if entry else None
+
+    def get_page(self, sha: str, page_no: int) -> Optional[str]:
+        """Lit une page en cache (None si absente)."""
+        with self._lock:
+            entry = self._index["entries"].get(sha)
+            if entry is None or page_no >= entry["pages"]:
+                self.stats.page_misses += 1
+                return None
+            try:
+                text = self._page_path(sha, page_no).read_text(encoding="utf-8")
+            except OSError:
+                # entrée corrompue (dossier supprimé à la main, etc.)
+                self._drop(sha)
+                self._save_index()
+                self.stats.page_misses += 1
+                return None
+            entry["last_access"] = time.time()
+            self._dirty = True
+            self.stats.page_hits += 1
+            return text
+
+    def get_pages(self, sha: str) -> Optional[List[str]]:
+        """Toutes les pages d'un document en cache, ou None."""
+        with self._lock:
+            n = self.num_pages(sha)
+            if n is None:
+                return None
+            pages: List[str] = []
+            for i in range(n):
+                text = self.get_page(sha, i)
+                if text is None:
+                    return None
+                pages.append(text)
+            return pages
+
+    def put_pages(self, sha: str, pages: List[str], source: Optional[Path] = None) -> None:
+        """Enregistre les pages d'un document puis applique l'éviction LRU."""
+        with self._lock:
+            entry_dir = self._entry_dir(sha)
+            entry_dir.mkdir(parents=True, exist_ok=True)
+            size = 0
+            for i, text in enumerate(pages):
+                data = text.encode("utf-8")
+                self._page_path(sha, i).write_bytes(data)
+                size += len(data)
+            self._index["entries"][sha] = {
+                "pages": len(pages),
+                "bytes": size,
+                "source": str(source) if source else None,
+                "last_access": time.time(),
+            }
+            self._evict(keep=sha)
+            self._save_index()
+
+    def get_or_extract(self, path: Path, extract_pages: Callable[[Path], List[str]]) -> List[str]:
+        """
+        Pages du PDF depuis le cache ; sinon appelle `extract_pages(path)`
+        et mémorise le résultat.
+        """
+        sha = self.fingerprint(path)
+        with self._lock:
+            pages = self.get_pages(sha)
+            if pages is not None:
+                self.stats.hits += 1
+                return pages
+            self.stats.misses += 1
+        pages = extract_pages(path)
+        self.put_pages(sha, pages, source=path)
+        return pages
+
+    # ---------- éviction ----------
+    def total_bytes(self) -> int:
+        return sum(e["bytes"] for e in self._index["entries"].values())
+
+    def _drop(self, sha: str) -> None:
+        self._index["entries"].pop(sha, None)
+        shutil.rmtree(self._entry_dir(sha), ignore_errors=True)
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        entries = self._index["entries"]
+        total = self.total_bytes()
+        for sha in sorted(entries, key=lambda s: entries[s]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if sha == keep:
+                continue
+            total -= entries[sha]["bytes"]
+            self._drop(sha)
+            self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for sha in list(self._index["entries"]):
+                self._drop(sha)
+            self._index["files"] = {}
+            self._save_index()
+
+
+_DEFAULT_CACHE: Optional[DocumentCache] = None
+
+
+def get_document_cache() -> DocumentCache:
+    """Instance partagée par le process (créée à la première utilisation)."""
+    global _DEFAULT_CACHE
+    if _DEFAULT_CACHE is None:
+        _DEFAULT_CACHE = DocumentCache()
+        atexit.register(_DEFAULT_CACHE.close)
+    return _DEFAULT_CACHE
@@ -0,0 +1,167 @@
+# document_store.py
+"""
+Magasin de documents par adhérent.
+
+Les documents sont indexés par (user_id, TypeDocument) et lus via un backend
+interchangeable (système de fichiers local par défaut). Le texte extrait est
+gardé en mémoire dans un working set LRU borné en octets ; deux adhérents qui
+partagent le même PDF (même SHA-256) partagent aussi la même copie en mémoire.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Optional, Protocol, Tuple
+
+from document_cache import get_document_cache
+from project_types import TypeDocument
+from retrieve_document import ROOT_FOLDER, DOCUMENT_PATHS, extract_pages_parallel
+
+MEMBERS_FOLDER = Path(os.getenv("MEMBERS_DOCUMENTS_DIR", str(ROOT_FOLDER / "data" / "adherents")))
+STORE_MAX_BYTES = int(os.getenv("DOCUMENT_STORE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+class DocumentBackend(Protocol):
+    def locate(self, user_id: str, doc_type: TypeDocument) -> Path:
+        """Chemin du PDF de l'adhérent pour ce type (FileNotFoundError s'il n'existe pas)."""
+
+    def read_pages(self, path: Path) -> List[str]:
+        """Texte des pages du PDF."""
+
+
+class LocalFilesystemBackend:
+    """
+    Arborescence <root>/<user_id>/<fichier>.pdf, avec les mêmes noms de fichiers
+    que DOCUMENT_PATHS. À défaut de document propre à l'adhérent, on retombe sur
+    le document commun de data/espace_client.
+    """
+
+    def __init__(self, root: Path = MEMBERS_FOLDER, shared: Optional[Dict[TypeDocument, Path]] = None):
+        self.root = Path(root)
+        self.shared = DOCUMENT_PATHS if shared is None else shared
+
+    def member_folder(self, user_id: str) -> Path:
+        """Dossier de l'adhérent ; ValueError si user_id sortirait de la racine."""
+        if not user_id or user_id in (".", "..") or any(sep in user_id for sep in ("/", "\\", os.sep, "\0")):
+            raise ValueError(f"Invalid user_id: {user_id!r}")
+        folder = self.root / user_id
+        if not folder.resolve().is_relative_to(self.root.resolve()):
+            raise ValueError(f"Invalid user_id: {user_id!r}")
+        return folder
+
+    def locate(self, user_id: str, doc_type: TypeDocument) -> Path:
+        if doc_type not in self.shared:
+            raise ValueError(f"Unsupported document type: {doc_type}")
+        filename = self.shared[doc_type].name
+        own = self.member_folder(user_id) / filename
+        if own.exists():
+            return own
+        if self.shared[doc_type].exists():
+            return self.shared[doc_type]
+        raise FileNotFoundError(f"Document not found for {user_id}: {filename}")
+
+    def read_pages(self, path: Path) -> List[str]:
+        return get_document_cache().get_or_extract(path, extract_pages_parallel)
+
+
+@dataclass
+class StoreStats:
+    hits: int = 0
+    misses: int = 0
+    dedup_hits: int = 0
+    evictions: int = 0
+    resident_docs: int = 0
+    resident_blobs: int = 0
+    resident_bytes: int = 0
+
+
+@dataclass
+class _Blob:
+    pages: Tuple[str, ...]
+    nbytes: int
+    refs: int = 0
+
+
+class DocumentStore:
+    def __init__(self, backend: Optional[DocumentBackend] = None, max_bytes: int = STORE_MAX_BYTES):
+        self.backend = backend or LocalFilesystemBackend()
+        self.max_bytes = max_bytes
+        self._lock = threading.RLock()
+        self._resident: "OrderedDict[Tuple[str, TypeDocument], Tuple[Path, str]]" = OrderedDict()
+        self._blobs: Dict[str, _Blob] = {}
+        self._bytes = 0
+        self._stats = StoreStats()
+
+    def locate(self, user_id: str, doc_type: TypeDocument) -> Path:
+        """PDF lu pour cet adhérent : le sien s'il existe, sinon le document commun."""
+        return self.backend.locate(user_id, doc_type)
+
+    def get_pages(self, user_id: str, doc_type: TypeDocument) -> Tuple[str, ...]:
+        path = self.backend.locate(user_id, doc_type)
+        sha = get_document_cache().fingerprint(path)
+        key = (user_id, doc_type)
+
+        with self._lock:
+            current = self._resident.get(key)
+            if current is not None and current[1] == sha:
+                self._resident.move_to_end(key)
+                self._stats.hits += 1
+                return self._blobs[sha].pages
+            if current is not None:  # le PDF a changé depuis le chargement
+                self._release(key)
+
+            self._stats.misses += 1
+            blob = self._blobs.get(sha)
+            if blob is not None:
+                self._stats.dedup_hits += 1
+            else:
+                pages = tuple(self.backend.read_pages(path))
+                blob = _Blob(pages=pages, nbytes=sum(sys.getsizeof(p) for p in pages))
+                self._blobs[sha] = blob
+                self._bytes += blob.nbytes
+
+            blob.refs += 1
+            self._resident[key] = (path, sha)
+            self._evict(keep=key)
+            return blob.pages
+
+    def get_text(self, user_id: str, doc_type: TypeDocument) -> str:
+        return "\n".join(p for p in self.get_pages(user_id, doc_type) if p)
+
+    def _release(self, key: Tuple[str, TypeDocument]) -> None:
+        _, sha = self._resident.pop(key)
+        blob = self._blobs[sha]
+        blob.refs -= 1
+        if blob.refs == 0:
+            del self._blobs[sha]
+            self._bytes -= blob.nbytes
+
+    def _evict(self, keep: Tuple[str, TypeDocument]) -> None:
+        while self._bytes > self.max_bytes and len(self._resident) > 1:
+            oldest = next(iter(self._resident))
+            if oldest == keep:
+                break
+            self._release(oldest)
+            self._stats.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._stats.resident_docs = len(self._resident)
+            self._stats.resident_blobs = len(self._blobs)
+            self._stats.resident_bytes = self._bytes
+            return asdict(self._stats)
+
+
+_STORE: Optional[DocumentStore] = None
+
+
+def get_document_store() -> DocumentStore:
+    """Magasin partagé par le process."""
+    global _STORE
+    if _STORE is None:
+        _STORE = DocumentStore()
+    return _STORE
@@ -0,0 +1,204 @@
+# extraction_demande.py
+"""
+Extraction locale d'une demande d'assuré : acte, date, montants (€) et type de
+document à consulter.
+
+Règles et lexiques simples, sans appel au modèle : les outils de l'agent
+(extraire_demande_remboursement, extraire_type_document) renvoient un résultat
+rempli dès le premier tour au lieu de laisser le modèle tout extraire lui-même.
+Une information absente reste à None : rien n'est deviné.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+from passage_index import strip_accents
+from project_types import TypeDocument
+
+# Acte -> préfixes de mots (minuscules, sans accents). Ordre = priorité en cas d'égalité :
+# les actes les plus spécifiques d'abord (prothèse avant soins dentaires, spécialiste avant généraliste).
+ACTES: List[Tuple[str, Tuple[str, ...]]] = [
+    ("prothèse dentaire", ("prothese dentaire", "couronne", "bridge", "implant")),
+    ("orthodontie", ("orthodont", "appareil dentaire", "bagues")),
+    ("soins dentaires", ("dentiste", "dentaire", "detartrage", "carie", "devitalis")),
+    ("optique", ("lunette", "verres", "monture", "lentille", "opticien")),
+    ("audioprothèse", ("audioprothes", "appareil auditif", "appareils auditifs", "prothese auditive")),
+    ("chambre particulière", ("chambre particuliere", "chambre individuelle")),
+    ("hospitalisation", ("hospitalis", "clinique", "hopital", "chirurgi", "operation")),
+    ("maternité", ("maternite", "accouchement")),
+    ("consultation spécialiste", (
+        "specialiste", "dermatolog", "cardiolog", "gynecolog", "ophtalmolog", "pediatre", "psychiatr",
+        "rhumatolog", "orl", "gastro", "endocrinolog", "neurolog", "urolog", "allergolog",
+    )),
+    ("consultation généraliste", ("generaliste", "medecin traitant", "consultation", "docteur", "medecin")),
+    ("analyses de laboratoire", ("analyse", "laboratoire", "prise de sang", "bilan sanguin")),
+    ("radiologie", ("radio", "irm", "scanner", "echograph", "mammograph")),
+    ("kinésithérapie", ("kine", "kinesitherap", "reeducation")),
+    ("ostéopathie", ("osteopath",)),
+    ("psychologue", ("psychologue",)),
+    ("pharmacie", ("pharmacie", "medicament", "ordonnance")),
+]
+
+# Type de document -> préfixes de mots. Demande de remboursement : tableau des garanties.
+TYPES_DOCUMENT: List[Tuple[TypeDocument, Tuple[str, ...]]] = [
+    (TypeDocument.CONDITIONS_PARTICULIERES, ("conditions particulieres", "mon option", "ma formule", "niveau de garantie")),
+    (TypeDocument.CONDITIONS_GENERALES, ("conditions generales", "exclusion", "carence", "delai de carence", "franchise")),
+    (TypeDocument.REGLES_DE_REMBOURSEMENT, (
+        "delai de remboursement", "feuille de soins", "teletransmission", "noemie", "comment etre rembourse",
+        "justificatif", "pieces a fournir",
+    )),
+    (TypeDocument.CONTRAT, ("contrat", "resili", "cotisation", "adhesion", "ayant droit", "beneficiaire", "echeancier")),
+    (TypeDocument.GUIDE_CLIENT, ("espace client", "application", "mot de passe", "identifiant", "carte tiers payant", "attestation")),
+    (TypeDocument.NOTICE_INFORMATION, ("notice", "assistance", "teleconsultation", "prevention")),
+    (TypeDocument.TABLEAU_DES_GARANTIES, ("rembours", "garantie", "prise en charge", "combien", "forfait", "plafond")),
+]
+
+MOIS = {
+    "janvier": 1, "fevrier": 2, "mars": 3, "avril": 4, "mai": 5, "juin": 6, "juillet": 7,
+    "aout": 8, "septembre": 9, "octobre": 10, "novembre": 11, "decembre": 12,
+}
+RELATIFS = {"aujourd'hui": 0, "ce matin": 0, "avant-hier": 2, "hier": 1}
+
+# Le texte est comparé sans accents et en minuscules.
+RE_DATE_NUM = re.compile(r"\b(\d{1,2})[/.-](\d{1,2})(?:[/.-](\d{4}|\d{2}))?\b")
+RE_DATE_TXT = re.compile(r"\b(1er|\d{1,2})\s+(" + "|".join(MOIS) + r")(?:\s+(\d{4}))?\b")
+RE_DATE_REL = re.compile(r"\b(aujourd'hui|ce matin|avant-hier|hier)\b")
+RE_MONTANT = re.compile(
+    r"(?<![\d,.])(\d{1,3}(?:[  .]\d{3})+(?:,\d{1,2})?|\d+(?:[,.]\d{1,2})?)\s*(?:€|euros?\b|eur\b)"
+)
+# Date jj.mm / jj-mm sans année : seulement derrière un mot qui annonce une date
+# ("le 3.5"), sinon c'est souvent une quantité ("1.5 heure")
+RE_AMORCE_DATE = re.compile(r"\b(le|du|au|depuis|jusqu'au|date)\s+$")
+# Rôle d'un montant : verbe juste après ("60 € payés"), sinon le plus proche avant
+# ("payé 60 €", "remboursé 30 €")
+PAYE = r"(?:pay|regl|debours|coute|cout|factur|depense|montant|tarif|honoraire|frais)"
+REMBOURSE = r"(?:rembours)"
+RE_ROLE_APRES = re.compile(r"\W*(?:de\s+|d')?(?:(" + PAYE + r")|(" + REMBOURSE + r"))")  # ancré par match(t, pos)
+RE_ROLE_AVANT = re.compile(r".*\b(?:(" + PAYE + r")|(" + REMBOURSE + r"))\w*\W+(?:\w+\W+){0,4}$")  # .* : le plus proche
+
+
+def _normalise(texte: str) -> str:
+    return strip_accents(texte.lower()).replace("’", "'")
+
+
+def _score(texte: str, mots: Tuple[str, ...]) -> int:
+    return sum(1 for mot in mots if re.search(r"\b" + re.escape(mot), texte))
+
+
+def detecter_acte(texte: str) -> Optional[str]:
+    """Acte du lexique ACTES le mieux représenté dans le texte, ou None."""
+    t = _normalise(texte)
+    scores = [(_score(t, mots), -i, acte) for i, (acte, mots) in enumerate(ACTES)]
+    best = max(scores)
+    return best[2] if best[0] > 0 else None
+
+
+def detecter_type_document(texte: str) -> TypeDocument:
+    """
+    Type de document où chercher la réponse. Toujours une valeur : à défaut
+    d'indice, le tableau des garanties (demandes de remboursement).
+    """
+    t = _normalise(texte)
+    scores = [(_score(t, mots), -i, doc) for i, (doc, mots) in enumerate(TYPES_DOCUMENT)]
+    best = max(scores)
+    return best[2] if best[0] > 0 else TypeDocument.TABLEAU_DES_GARANTIES
+
+
+def _annee(annee: Optional[str], jour: int, mois: int, reference: date) -> Optional[int]:
+    if annee:
+        return int(annee) + 2000 if len(annee) == 2 else int(annee)
+    # année absente : la plus récente qui ne tombe pas dans le futur
+    try:
+        return reference.year if date(reference.year, mois, jour) <= reference else reference.year - 1
+    except ValueError:
+        return None
+
+
+def extraire_dates(texte: str, reference: Optional[date] = None) -> List[date]:
+    """Dates du texte, dans l'ordre d'apparition (jj/mm[/aaaa], « 12 mars [2024] », hier...)."""
+    reference = reference or date.today()
+    t = _normalise(texte)
+    trouvees: List[Tuple[int, date]] = []
+    for m in RE_DATE_NUM.finditer(t):
+        jour, mois = int(m.group(1)), int(m.group(2))
+        if t[m.end():m.end() + 1].isdigit() or re.match(r"\s*(?:€|euro)", t[m.end():]):
+            continue  # montant (12.50 €) plutôt que date
+        if re.search(r"\d[/.-]$", t[:m.start()]) or re.match(r"[/.-]\d", t[m.end():]):
+            continue  # morceau d'une suite plus longue (06.12.34.56.78)
+        if m.group(3) is None and "/" not in m.group(0) and not RE_AMORCE_DATE.search(t[:m.start()]):
+            continue  # "1.5 heure" : quantité plutôt que date
+        annee = _annee(m.group(3), jour, mois, reference) if 1 <= mois <= 12 else None
+        if annee is not None:
+            try:
+                trouvees.append((m.start(), date(annee, mois, jour)))
+            except ValueError:
+                pass
+    for m in RE_DATE_TXT.finditer(t):
+        jour, mois = 1 if m.group(1) == "1er" else int(m.group(1)), MOIS[m.group(2)]
+        annee = _annee(m.group(3), jour, mois, reference)
+        if annee is not None:
+            try:
+                trouvees.append((m.start(), date(annee, mois, jour)))
+            except ValueError:
+                pass
+    for m in RE_DATE_REL.finditer(t):
+        trouvees.append((m.start(), reference - timedelta(days=RELATIFS[m.group(1)])))
+    # un acte à rembourser est passé : une date future (année explicite) est une erreur de lecture
+    return [d for _, d in sorted(trouvees, key=lambda x: x[0]) if d <= reference]
+
+
+def _montant(brut: str) -> float:
+    brut = brut.replace(" ", " ")
+    if re.fullmatch(r"\d{1,3}(?:[ .]\d{3})+(?:,\d{1,2})?", brut):
+        brut = re.sub(r"[ .]", "", brut)
+    return float(brut.replace(",", "."))
+
+
+def extraire_montants(texte: str) -> List[Tuple[float, str]]:
+    """Montants en euros avec leur rôle : "paye", "rembourse" ou "" (indéterminé)."""
+    t = _normalise(texte)
+    out = []
+    for m in RE_MONTANT.finditer(t):
+        role = RE_ROLE_APRES.match(t, m.end()) or RE_ROLE_AVANT.search(t[max(0, m.start() - 60):m.start()])
+        out.append((_montant(m.group(1)), "" if role is None else "paye" if role.group(1) else "rembourse"))
+    return out
+
+
+@dataclass
+class DemandeExtraite:
+    acte: Optional[str]
+    date: Optional[str]  # ISO AAAA-MM-JJ
+    frais_engages: Optional[float]  # montant payé par l'assuré
+    deja_rembourse: Optional[float] = None
+    type_document: TypeDocument = TypeDocument.TABLEAU_DES_GARANTIES
+    manquants: List[str] = field(default_factory=list)
+
+
+def extraire_demande(texte: str, reference: Optional[date] = None) -> DemandeExtraite:
+    """Acte, date de l'acte, frais engagés et type de document, extraits localement."""
+    acte = detecter_acte(texte)
+    dates = extraire_dates(texte, reference)
+    montants = extraire_montants(texte)
+    payes = [v for v, role in montants if role == "paye"]
+    autres = [v for v, role in montants if role == ""]
+    rembourses = [v for v, role in montants if role == "rembourse"]
+    frais = payes[0] if payes else autres[0] if autres else None
+
+    manquants = []
+    if acte is None:
+        manquants.append("acte (type de consultation ou de soin)")
+    if not dates:
+        manquants.append("date de l'acte")
+    if frais is None:
+        manquants.append("montant payé (facture)")
+    return DemandeExtraite(
+        acte=acte,
+        date=dates[0].isoformat() if dates else None,
+        frais_engages=frais,
+        deja_rembourse=rembourses[0] if rembourses else None,
+        type_document=detecter_type_document(texte),
+        manquants=manquants,
+    )
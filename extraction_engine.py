@@ -0,0 +1,215 @@
+# extraction_engine.py
+"""
+Moteur d'extraction PDF commun à security_layer (pièces jointes uploadées)
+et retrieve_document (documents sur disque).
+
+- backends sélectionnables : "pdfplumber" ou "pypdf2" (dépendances optionnelles) ;
+- limites pages / caractères appliquées pendant le parsing : on arrête de
+  parser dès que le budget est atteint ;
+- cache LRU en mémoire des résultats, clé = SHA-256 du contenu + backend + limites,
+  pour ne pas re-parser la même pièce jointe à chaque rerun ;
+- cache LRU des pages déjà parsées (contenu en bytes), partagé par iter_pages :
+  le flux de pages de prepare_safe_payload en profite aussi.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple, Union
+
+try:
+    import pdfplumber
+except Exception:
+    pdfplumber = None
+
+try:
+    from PyPDF2 import PdfReader
+except Exception:
+    PdfReader = None
+
+ATTACHMENT_PDF_BACKEND = os.getenv("ATTACHMENT_PDF_BACKEND", "pypdf2")
+DOCUMENT_PDF_BACKEND = os.getenv("DOCUMENT_PDF_BACKEND", "pdfplumber")
+EXTRACTION_CACHE_ENTRIES = int(os.getenv("EXTRACTION_CACHE_ENTRIES", "128"))
+
+Source = Union[bytes, Path, str, BinaryIO]
+
+
+def _open_source(source: Source):
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def _pdfplumber_pages(source: Source) -> Iterator[str]:
+    with pdfplumber.open(_open_source(source)) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text() or ""
+            page.close()  # libère les objets de mise en page de la page
+            yield text
+
+
+def _pypdf2_pages(source: Source) -> Iterator[str]:
+    src = _open_source(source)
+    if isinstance(src, (str, Path)):
+        with open(src, "rb") as f:
+            yield from _pypdf2_pages(f)
+        return
+    for page in PdfReader(src).pages:
+        yield page.extract_text() or ""
+
+
+BACKENDS: Dict[str, Tuple[Callable[[Source], Iterator[str]], object]] = {
+    "pdfplumber": (_pdfplumber_pages, pdfplumber),
+    "pypdf2": (_pypdf2_pages, PdfReader),
+}
+
+
+@dataclass(frozen=True)
+class ExtractionResult:
+    text: str
+    pages_used: int
+    backend: str
+    cached: bool = False
+
+
+class ExtractionEngine:
+    def __init__(self, cache_entries: int = EXTRACTION_CACHE_ENTRIES):
+        self.cache_entries = cache_entries
+        self._cache: "OrderedDict[Tuple, ExtractionResult]" = OrderedDict()
+        # (sha256, backend) -> (pages parsées dans l'ordre, parsing allé jusqu'au bout)
+        self._pages: "OrderedDict[Tuple[str, str], Tuple[Tuple[str, ...], bool]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.page_hits = 0
+        self.page_misses = 0
+
+    @staticmethod
+    def available(backend: str) -> bool:
+        return backend in BACKENDS and BACKENDS[backend][1] is not None
+
+    def iter_raw_pages(self, source: Source, backend: str) -> Iterator[str]:
+        """Toutes les pages (vides comprises), au fil du parsing."""
+        if not self.available(backend):
+            raise RuntimeError(f"PDF backend unavailable: {backend}")
+        return BACKENDS[backend][0](source)
+
+    def _cached_raw_pages(self, source: Source, backend: str) -> Iterator[str]:
+        """
+        iter_raw_pages avec cache des pages parsées pour un contenu en bytes. Le
+        parsing peut s'arrêter en cours de route : les pages déjà lues sont gardées
+        et, si une lecture suivante va plus loin, le PDF est re-parsé jusque-là.
+        """
+        if not isinstance(source, (bytes, bytearray)):
+            yield from self.iter_raw_pages(source, backend)
+            return
+        key = (hashlib.sha256(source).hexdigest(), backend)
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None:
+                self._pages.move_to_end(key)
+                self.page_hits += 1
+            else:
+                self.page_misses += 1
+        known: Tuple[str, ...] = ()
+        if entry is not None:
+            known, complete = entry
+            yield from known
+            if complete:
+                return
+
+        parsed = []
+        complete = False
+        pages = self.iter_raw_pages(source, backend)
+        try:
+            for text in pages:
+                parsed.append(text)
+                if len(parsed) > len(known):  # les pages connues ont déjà été servies
+                    yield text
+            complete = True
+        finally:
+            pages.close()
+            if len(parsed) > len(known) or complete:
+                with self._lock:
+                    self._pages[key] = (tuple(parsed), complete)
+                    self._pages.move_to_end(key)
+                    while len(self._pages) > self.cache_entries:
+                        self._pages.popitem(last=False)
+
+    def iter_pages(
+        self,
+        source: Source,
+        backend: str,
+        max_pages: Optional[int] = None,
+        max_chars: Optional[int] = None,
+        skip_empty: bool = True,
+    ) -> Iterator[str]:
+        """
+        Pages parsées une à une. On s'arrête après `max_pages` pages parsées, ou
+        dès que `max_chars` caractères utiles (hors espaces de tête) sont réunis.
+        Pour un contenu en bytes, les pages déjà parsées sont servies depuis le cache.
+        """
+        pages = self._cached_raw_pages(source, backend)
+        used = 0
+        try:
+            for i, text in enumerate(pages):
+                if max_pages is not None and i >= max_pages:
+                    return
+                if skip_empty and not text.strip():
+                    continue
+                used += len(text) + 1 if used else len(text.lstrip())
+                yield text
+                if max_chars is not None and used >= max_chars:
+                    return
+        finally:
+            pages.close()
+
+    def extract_text(
+        self,
+        data: bytes,
+        backend: str,
+        max_pages: Optional[int] = None,
+        max_chars: Optional[int] = None,
+    ) -> ExtractionResult:
+        """Texte des pages non vides, joint et tronqué à max_chars ; résultat mis en cache."""
+        key = (hashlib.sha256(data).hexdigest(), backend, max_pages, max_chars)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return ExtractionResult(cached.text, cached.pages_used, backend, cached=True)
+
+        chunks = list(self.iter_pages(data, backend, max_pages=max_pages, max_chars=max_chars))
+        joined = "\n".join(chunks).strip()
+        result = ExtractionResult(joined[:max_chars] if max_chars is not None else joined, len(chunks), backend)
+
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = result
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._pages.clear()
+            self.hits = 0
+            self.misses = 0
+            self.page_hits = 0
+            self.page_misses = 0
+
+
+_ENGINE: Optional[ExtractionEngine] = None
+
+
+def get_extraction_engine() -> ExtractionEngine:
+    """Moteur partagé par le process."""
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = ExtractionEngine()
+    return _ENGINE
@@ -1,5 +1,6 @@
 import streamlit as st
-from classification import process
+from classification import process_stream
+from security_layer import PseudonymVault
 from config import ensure_api_key
 import random
 import datetime
@@ -7,9 +8,12 @@ from agent import AgentContext, init_agent, run_agent_sync
 from retrieve_document import extract_text_from_pdf, extract_document
 from project_types import TypeDocument, TypeTache
 import traceback
+from tracing import start_metrics_server
+from rate_limiter import lane_for, priority
 
 # ---------------- CONFIG ----------------
 st.set_page_config(page_title="AssurAI Winner Demo", layout="wide")
+start_metrics_server()  # /metrics si TRACE_METRICS_PORT est défini ; une seule fois par process
 
 if "history" not in st.session_state:
     st.session_state.history = []
@@ -23,6 +27,9 @@ if "sent" not in st.session_state:
 if "documents" not in st.session_state:
     st.session_state.documents = []
 
+if "vault" not in st.session_state:
+    st.session_state.vault = PseudonymVault()
+
 if "agent" not in st.session_state:
     st.session_state.agent = init_agent()
 
@@ -123,8 +130,18 @@ if st.button("🚀 Analyse IA"):
             context += "\n Actions de l'agent :" + agent_result
             print("agent result added to context in first interaction")
             print(agent_result)
-        result = process(context, file_bytes=file_bytes, file_name=file_name)
-        st.write(f"[DEBUG] process_return | blocked={result.get('blocked')} | pii_found={result.get('pii_found')}")
+        stream = process_stream(context, file_bytes=file_bytes, file_name=file_name, vault=st.session_state.vault)
+
+    # Réponse affichée au fil de la génération ; la classification part à la fin du flux
+    live_reply = st.empty()
+    if not stream.blocked:
+        with live_reply.container():
+            st.subheader("💬 Réponse IA")
+            st.write_stream(stream)
+    with st.spinner("Classification..."):
+        result = stream.result()
+    live_reply.empty()  # la réponse est réaffichée dans RESULTATS
+    st.write(f"[DEBUG] process_return | blocked={result.get('blocked')} | pii_found={result.get('pii_found')} | timings={result.get('timings')}")
 
     st.session_state.analysis = result
     st.session_state.history.append(context)
@@ -204,7 +221,8 @@ if st.session_state.analysis:
     if st.button("Envoyer réponse"):
         st.session_state.history.append(follow)
 
-        with st.spinner("Mise à jour analyse..."):
+        # suivi d'un dossier HAUTE : servi en premier quand les appels au modèle font la queue
+        with st.spinner("Mise à jour analyse..."), priority(lane_for(cls["priorite"])):
             history_context = "\n".join(st.session_state.history)
             try:
                 agent_result = run_agent_sync(st.session_state.agent, history_context, st.session_state.agent_deps).output
@@ -218,7 +236,10 @@ if st.session_state.analysis:
                 history_context += "\n Actions de l'agent :" + agent_result
                 print("agent result added to context in complementary info")
                 print(agent_result)
-            result = process(history_context)
+            stream = process_stream(history_context, vault=st.session_state.vault)
+            if not stream.blocked:
+                st.write_stream(stream)
+            result = stream.result()
 
         st.session_state.analysis = result
         st.rerun()
@@ -1,15 +1,13 @@
 import streamlit as st
-import anthropic
 import os
 from dotenv import load_dotenv
 import random
+from llm_client import get_client
 
 load_dotenv()
 
 # -------- CONFIG CLAUDE --------
-client = anthropic.Anthropic(
-    api_key=os.getenv("ANTHROPIC_API_KEY")
-)
+client = get_client()
 
 MODEL = "claude-3-haiku-20240307"
 
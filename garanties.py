@@ -0,0 +1,302 @@
+# garanties.py
+"""
+Moteur local du tableau des garanties.
+
+Le PDF TABLEAU_DES_GARANTIES est parsé une seule fois en une table typée
+(acte -> taux de la base de remboursement, forfait, plafond, base si indiquée), persistée à côté
+du cache d'extraction. L'estimation d'un remboursement devient alors un simple
+calcul local, déterministe, sans appel au modèle.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+import tempfile
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from document_cache import get_document_cache
+from document_store import get_document_store
+from passage_index import normalize_tokens
+from project_types import TypeDocument
+from retrieve_document import ROOT_FOLDER, DOCUMENT_PATHS, document_path, extract_document_pages
+
+TABLE_PATH = Path(os.getenv("GARANTIES_TABLE_PATH", str(ROOT_FOLDER / "data" / ".cache" / "garanties.json")))
+TABLE_VERSION = 2
+# Tables gardées en mémoire (une par tableau distinct : commun ou propre à un adhérent)
+TABLES_MAX = int(os.getenv("GARANTIES_TABLES_MAX", "64"))
+
+# Taux de remboursement Sécurité sociale par défaut, selon la rubrique du tableau
+TAUX_SECU_PAR_RUBRIQUE = {
+    "hospitalisation": 0.80,
+    "pharmacie": 0.65,
+    "dentaire": 0.60,
+    "optique": 0.60,
+    "auditif": 0.60,
+    "analyse": 0.60,
+    "auxiliaire": 0.60,
+}
+TAUX_SECU_DEFAUT = 0.70
+
+RE_TAUX = re.compile(r"(\d{2,3}(?:[.,]\d+)?)\s*%\s*(?:de\s+la\s+|du\s+)?(BRSS|BR|TM|FR|PMSS)\b", re.IGNORECASE)
+RE_MONTANT = re.compile(r"(\d{1,3}(?:[\s .]\d{3})*(?:,\d{1,2})?)\s*(?:€|euros?)", re.IGNORECASE)
+# Base de remboursement Sécurité sociale indiquée sur la ligne ("BR 30 €", "base de remboursement : 23 €")
+RE_BASE = re.compile(
+    r"\b(?:BRSS|BR|base\s+de\s+remboursement)\s*(?:[:=]|de)?\s*(\d{1,4}(?:[.,]\d{1,2})?)\s*(?:€|euros?)", re.IGNORECASE
+)
+RE_PLAFOND = re.compile(r"(limit|plafon|maximum|max\.)", re.IGNORECASE)
+RE_FRAIS_REELS = re.compile(r"\bfrais\s+r[ée]els\b|\b100\s*%\s*FR\b", re.IGNORECASE)
+RE_RUBRIQUE = re.compile(r"^[A-ZÀ-ÖØ-Ý][A-ZÀ-ÖØ-Ý ,'’/&-]{3,}$")
+
+
+def _to_float(raw: str) -> float:
+    return float(re.sub(r"[\s .]", "", raw).replace(",", "."))
+
+
+@dataclass
+class GarantieActe:
+    acte: str
+    rubrique: Optional[str] = None
+    taux_br: Optional[float] = None  # 1.5 pour "150 % BR"
+    forfait: Optional[float] = None  # montant en € alloué au-delà de la Sécu
+    plafond: Optional[float] = None  # plafond en € de la part complémentaire
+    frais_reels: bool = False
+    base_remboursement: Optional[float] = None  # BR Sécu en €, si le tableau l'indique
+
+
+@dataclass
+class EstimationRemboursement:
+    acte: str
+    garantie: Optional[str]
+    frais_engages: float
+    # None (et br_inconnue) si la base de remboursement n'est ni fournie ni dans le tableau
+    base_remboursement: Optional[float]
+    part_secu: Optional[float]
+    part_complementaire: Optional[float]
+    total_rembourse: Optional[float]
+    reste_a_charge: Optional[float]
+    br_inconnue: bool = False
+
+
+def parse_ligne(ligne: str, rubrique: Optional[str] = None) -> Optional[GarantieActe]:
+    """Une ligne 'acte + garantie' du tableau, ou None si la ligne n'en est pas une."""
+    taux = RE_TAUX.search(ligne)
+    base = RE_BASE.search(ligne)
+    montants = [m for m in RE_MONTANT.finditer(ligne) if not (base and base.start() <= m.start() < base.end())]
+    frais_reels = bool(RE_FRAIS_REELS.search(ligne))
+    if not (taux or montants or frais_reels):
+        return None
+
+    starts = [m.start() for m in ([taux] if taux else []) + ([base] if base else []) + montants]
+    fr = RE_FRAIS_REELS.search(ligne)
+    if fr:
+        starts.append(fr.start())
+    acte = ligne[:min(starts)].strip(" :.-–\t")
+    if not normalize_tokens(acte):
+        return None
+
+    garantie = GarantieActe(acte=acte, rubrique=rubrique, frais_reels=frais_reels)
+    if base:
+        garantie.base_remboursement = _to_float(base.group(1))
+    if taux and taux.group(2).upper() in ("BR", "BRSS", "TM"):
+        garantie.taux_br = _to_float(taux.group(1)) / 100
+    for m in montants:
+        # un montant précédé de "dans la limite de", "plafond"... est un plafond
+        if RE_PLAFOND.search(ligne[max(0, m.start() - 30):m.start()]):
+            garantie.plafond = _to_float(m.group(1))
+        elif garantie.forfait is None:
+            garantie.forfait = _to_float(m.group(1))
+    return garantie
+
+
+def parse_tableau(pages: List[str]) -> List[GarantieActe]:
+    """Parse le texte du tableau des garanties, rubrique par rubrique."""
+    garanties: List[GarantieActe] = []
+    rubrique: Optional[str] = None
+    for page in pages:
+        for ligne in page.splitlines():
+            ligne = ligne.strip()
+            if not ligne:
+                continue
+            garantie = parse_ligne(ligne, rubrique)
+            if garantie is not None:
+                garanties.append(garantie)
+            elif RE_RUBRIQUE.match(ligne):
+                rubrique = ligne.title()
+    return garanties
+
+
+class TableGaranties:
+    """Table indexée : clé normalisée de l'acte -> garantie, plus un index par mot."""
+
+    def __init__(self, garanties: List[GarantieActe], fingerprint: Optional[str] = None):
+        self.garanties = garanties
+        self.fingerprint = fingerprint
+        self._par_cle: Dict[str, GarantieActe] = {}
+        self._par_mot: Dict[str, List[int]] = {}
+        for i, g in enumerate(garanties):
+            tokens = normalize_tokens(g.acte)
+            self._par_cle.setdefault(" ".join(tokens), g)
+            for tok in set(tokens):
+                self._par_mot.setdefault(tok, []).append(i)
+
+    def lookup(self, acte: str) -> Optional[GarantieActe]:
+        """Garantie exacte si possible, sinon celle qui partage le plus de mots avec l'acte."""
+        tokens = normalize_tokens(acte)
+        exact = self._par_cle.get(" ".join(tokens))
+        if exact is not None:
+            return exact
+
+        votes: Dict[int, int] = {}
+        for tok in set(tokens):
+            for i in self._par_mot.get(tok, ()):
+                votes[i] = votes.get(i, 0) + 1
+        if not votes:
+            return None
+        best = max(votes, key=lambda i: (votes[i], -len(self.garanties[i].acte)))
+        return self.garanties[best]
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": TABLE_VERSION,
+            "fingerprint": self.fingerprint,
+            "garanties": [asdict(g) for g in self.garanties],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TableGaranties":
+        return cls([GarantieActe(**g) for g in data["garanties"]], fingerprint=data.get("fingerprint"))
+
+
+def taux_secu_pour(garantie: Optional[GarantieActe]) -> float:
+    texte = " ".join(normalize_tokens(f"{garantie.rubrique or ''} {garantie.acte}")) if garantie else ""
+    for mot, taux in TAUX_SECU_PAR_RUBRIQUE.items():
+        if mot in texte:
+            return taux
+    return TAUX_SECU_DEFAUT
+
+
+def estimer(
+    table: TableGaranties,
+    acte: str,
+    frais_engages: float,
+    base_remboursement: Optional[float] = None,
+    taux_secu: Optional[float] = None,
+) -> EstimationRemboursement:
+    """
+    Estime le remboursement d'un acte. La base de remboursement vient de l'appel,
+    sinon de la ligne du tableau ; inconnue, on ne devine pas (les frais engagés
+    dépassent souvent la BR) : montants à None et br_inconnue=True.
+    """
+    garantie = table.lookup(acte)
+    br = base_remboursement
+    if br is None and garantie is not None:
+        br = garantie.base_remboursement
+    if br is None:
+        return EstimationRemboursement(
+            acte=acte,
+            garantie=garantie.acte if garantie else None,
+            frais_engages=frais_engages,
+            base_remboursement=None,
+            part_secu=None,
+            part_complementaire=None,
+            total_rembourse=None,
+            reste_a_charge=None,
+            br_inconnue=True,
+        )
+    taux_secu = taux_secu_pour(garantie) if taux_secu is None else taux_secu
+    part_secu = min(frais_engages, round(br * taux_secu, 2))
+    depassement = max(frais_engages - part_secu, 0.0)
+
+    part_comp = 0.0
+    if garantie is not None:
+        if garantie.frais_reels:
+            part_comp = depassement
+        else:
+            if garantie.taux_br is not None:
+                part_comp += max(min(frais_engages, br * garantie.taux_br) - part_secu, 0.0)
+            if garantie.forfait is not None:
+                part_comp += garantie.forfait
+            part_comp = min(part_comp, depassement)
+        if garantie.plafond is not None:
+            part_comp = min(part_comp, garantie.plafond)
+
+    part_comp = round(part_comp, 2)
+    total = round(part_secu + part_comp, 2)
+    return EstimationRemboursement(
+        acte=acte,
+        garantie=garantie.acte if garantie else None,
+        frais_engages=frais_engages,
+        base_remboursement=br,
+        part_secu=part_secu,
+        part_complementaire=part_comp,
+        total_rembourse=total,
+        reste_a_charge=round(frais_engages - total, 2),
+    )
+
+
+def _save(table: TableGaranties, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # nom temporaire unique : deux process peuvent écrire en même temps
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, suffix=".tmp", delete=False) as f:
+        json.dump(table.to_dict(), f, ensure_ascii=False)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+
+# Empreinte SHA-256 du PDF -> table ; les adhérents sans tableau propre partagent la table commune
+_TABLES: Dict[str, TableGaranties] = {}
+
+
+def get_table(path: Path = TABLE_PATH, user_id: Optional[str] = None) -> TableGaranties:
+    """
+    Table du tableau des garanties : celui de l'adhérent s'il en a un propre (magasin
+    de documents), sinon le tableau commun. Rechargée depuis le JSON tant que le PDF
+    n'a pas changé, sinon re-parsée une fois puis persistée (un JSON par tableau propre).
+    """
+    shared = DOCUMENT_PATHS[TypeDocument.TABLEAU_DES_GARANTIES]
+    if user_id is None:
+        source = document_path(TypeDocument.TABLEAU_DES_GARANTIES)
+    else:
+        source = get_document_store().locate(user_id, TypeDocument.TABLEAU_DES_GARANTIES)
+    fingerprint = get_document_cache().fingerprint(source)
+    table = _TABLES.get(fingerprint)
+    if table is not None:
+        return table
+
+    if source != shared:
+        path = path.with_name(f"{path.stem}-{fingerprint[:16]}{path.suffix}")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") == TABLE_VERSION and data.get("fingerprint") == fingerprint:
+            table = TableGaranties.from_dict(data)
+    except (OSError, ValueError):
+        pass
+
+    if table is None:
+        if user_id is None:
+            pages = extract_document_pages(TypeDocument.TABLEAU_DES_GARANTIES)
+        else:
+            pages = list(get_document_store().get_pages(user_id, TypeDocument.TABLEAU_DES_GARANTIES))
+        table = TableGaranties(parse_tableau(pages), fingerprint=fingerprint)
+        _save(table, path)
+    _TABLES[fingerprint] = table
+    while len(_TABLES) > TABLES_MAX:
+        del _TABLES[next(iter(_TABLES))]
+    return table
+
+
+def estimer_remboursement(
+    acte: str,
+    frais_engages: float,
+    base_remboursement: Optional[float] = None,
+    user_id: Optional[str] = None,
+) -> Dict:
+    """Estimation sérialisable (outil agent) à partir du tableau des garanties du client."""
+    return asdict(estimer(get_table(user_id=user_id), acte, frais_engages, base_remboursement))
@@ -0,0 +1,454 @@
+# llm_client.py
+"""
+Clients Anthropic partagés par le process.
+
+Un seul client synchrone et un seul client asynchrone, chacun avec son pool de
+connexions HTTP keep-alive : les appels successifs (réponse, classification,
+agent...) réutilisent la connexion TLS déjà ouverte au lieu d'en négocier une
+nouvelle à chaque appel.
+
+- taille du pool, keep-alive et timeouts configurables par variables d'environnement ;
+- retries délégués au SDK (max_retries) : backoff exponentiel avec jitter,
+  respect de retry-after, sur erreurs réseau / 408 / 409 / 429 / 5xx ;
+- compteurs de requêtes et de connexions ouvertes, pour suivre la réutilisation ;
+- chaque tentative vers /v1/messages passe par le régulateur partagé (rate_limiter.py) :
+  débit, priorité et concurrence coordonnés entre sessions, retries compris ;
+- prompt caching : blocs statiques marqués cache_control, et compteurs de
+  tokens lus / écrits dans le cache par étape (reply, classify, agent...) ;
+- LLM_BACKEND=local|replay|record : backend simulé ou rejoué sans réseau (local_backend.py).
+"""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import os
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, Coroutine, Dict, Optional, Tuple
+
+from anthropic import Anthropic, AsyncAnthropic
+from anthropic.resources.messages import Messages
+
+try:
+    import httpx2 as httpx  # SDK anthropic >= 1.0
+except ImportError:
+    import httpx  # SDK anthropic 0.x
+
+from config import ANTHROPIC_API_KEY
+from rate_limiter import estimate_tokens, get_governor, retry_after
+from tracing import add_tokens
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "10"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", str(LLM_MAX_CONNECTIONS)))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "1") not in ("0", "false", "False")
+PROMPT_CACHE_TTL = os.getenv("PROMPT_CACHE_TTL", "5m")  # "5m" ou "1h"
+
+# évènements de trace du pool (httpcore) émis à l'ouverture d'une connexion
+_CONNECT_EVENTS = ("connection.connect_tcp.complete", "connection.connect_unix_socket.complete")
+
+
+@dataclass
+class ConnectionStats:
+    requests: int = 0
+    connections_opened: int = 0
+
+    @property
+    def reused(self) -> int:
+        return max(self.requests - self.connections_opened, 0)
+
+    @property
+    def reuse_rate(self) -> float:
+        return self.reused / self.requests if self.requests else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "reused": self.reused, "reuse_rate": round(self.reuse_rate, 3)}
+
+
+_STATS = ConnectionStats()
+_STATS_LOCK = threading.Lock()
+
+
+def _count(field: str) -> None:
+    with _STATS_LOCK:
+        setattr(_STATS, field, getattr(_STATS, field) + 1)
+
+
+def _governed(request) -> bool:
+    return request.method == "POST" and request.url.path.endswith("/messages")
+
+
+def _request_tokens(request) -> int:
+    try:
+        return estimate_tokens(request.content)
+    except httpx.RequestNotRead:  # corps en flux : pas d'estimation
+        return 0
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Corps de réponse qui libère la place du régulateur à sa fermeture (réponses en flux comprises)."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            release, self._release = self._release, None
+            if release is not None:
+                release()
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """
+    Transport standard qui compte les requêtes et les connexions réellement ouvertes.
+    `inner` : transport de remplacement derrière le comptage et le régulateur
+    (ex. httpx.MockTransport du backend local) au lieu du réseau.
+    """
+
+    def __init__(self, *args, inner: Optional["httpx.BaseTransport"] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._inner = inner
+
+    def _send(self, request):
+        return self._inner.handle_request(request) if self._inner is not None else super().handle_request(request)
+
+    def handle_request(self, request):
+        _count("requests")
+        previous = request.extensions.get("trace")
+
+        def trace(event_name, info):
+            if event_name in _CONNECT_EVENTS:
+                _count("connections_opened")
+            if previous is not None:
+                previous(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        governor = get_governor() if _governed(request) else None
+        if governor is None:
+            return self._send(request)
+
+        governor.acquire(_request_tokens(request))
+        try:
+            response = self._send(request)
+        except BaseException:
+            governor.release(None)
+            raise
+        status, delay = response.status_code, retry_after(response.headers)
+        response.stream = _ReleasingStream(response.stream, lambda: governor.release(status, delay))
+        return response
+
+
+class AsyncCountingTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, *args, inner: Optional["httpx.AsyncBaseTransport"] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._inner = inner
+
+    async def _send(self, request):
+        if self._inner is not None:
+            return await self._inner.handle_async_request(request)
+        return await super().handle_async_request(request)
+
+    async def handle_async_request(self, request):
+        _count("requests")
+        previous = request.extensions.get("trace")
+
+        async def trace(event_name, info):
+            if event_name in _CONNECT_EVENTS:
+                _count("connections_opened")
+            if previous is not None:
+                await previous(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        governor = get_governor() if _governed(request) else None
+        if governor is None:
+            return await self._send(request)
+
+        await governor.aacquire(_request_tokens(request))
+        try:
+            response = await self._send(request)
+        except BaseException:
+            governor.release(None)
+            raise
+        status, delay = response.status_code, retry_after(response.headers)
+        response.stream = _AsyncReleasingStream(response.stream, lambda: governor.release(status, delay))
+        return response
+
+
+def _limits() -> "httpx.Limits":
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> "httpx.Timeout":
+    return httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+
+def _api_key() -> Optional[str]:
+    return ANTHROPIC_API_KEY or os.environ.get("ANTHROPIC_API_KEY")
+
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "anthropic")  # anthropic | local | replay | record (voir local_backend.py)
+
+_CLIENT: Optional[Anthropic] = None
+_ASYNC_CLIENT: Optional[AsyncAnthropic] = None
+_LOCK = threading.Lock()
+
+
+_BACKEND = "anthropic"
+
+
+def use_clients(client: Any, async_client: Any, backend: str = "local") -> None:
+    """
+    Remplace les clients partagés (ex. backend local de local_backend.py pour les
+    tests et les traitements hors ligne). Tout objet exposant messages.create convient.
+    """
+    global _CLIENT, _ASYNC_CLIENT, _BACKEND
+    with _LOCK:
+        _CLIENT, _ASYNC_CLIENT, _BACKEND = client, async_client, backend
+
+
+def current_backend() -> str:
+    """"anthropic" pour l'API réelle ; sinon nom du backend branché par use_clients."""
+    return _BACKEND
+
+
+def is_live_backend() -> bool:
+    """Vraies réponses du modèle (API directe ou enregistrée) : on peut les mettre en cache / les journaliser."""
+    return _BACKEND in ("anthropic", "record")
+
+
+def build_anthropic_clients(
+    inner: Optional["httpx.BaseTransport"] = None,
+    async_inner: Optional["httpx.AsyncBaseTransport"] = None,
+    base_url: Optional[str] = None,
+) -> Tuple[Optional[Anthropic], Optional[AsyncAnthropic]]:
+    """
+    Nouveaux clients API (synchrone, asynchrone) avec pool partagé, ou (None, None) sans clé.
+    inner / async_inner : transports sous le comptage et le régulateur à la place du
+    réseau (backend local) ; aucune clé n'est alors nécessaire.
+    """
+    local = inner is not None or async_inner is not None
+    api_key = _api_key() or ("local" if local else None)
+    if not api_key:
+        return None, None
+    client = Anthropic(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=httpx.Client(transport=CountingTransport(limits=_limits(), inner=inner), limits=_limits(), timeout=_timeout()),
+        timeout=_timeout(),
+        max_retries=LLM_MAX_RETRIES,
+    )
+    async_client = AsyncAnthropic(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=httpx.AsyncClient(
+            transport=AsyncCountingTransport(limits=_limits(), inner=async_inner), limits=_limits(), timeout=_timeout()
+        ),
+        timeout=_timeout(),
+        max_retries=LLM_MAX_RETRIES,
+    )
+    return client, async_client
+
+
+def _ensure_clients() -> None:
+    global _CLIENT, _ASYNC_CLIENT, _BACKEND
+    if _CLIENT is not None:
+        return
+    if LLM_BACKEND != "anthropic":
+        from local_backend import backend_clients
+
+        client, async_client = backend_clients(LLM_BACKEND)
+        with _LOCK:
+            if _CLIENT is None:
+                _CLIENT, _ASYNC_CLIENT, _BACKEND = client, async_client, LLM_BACKEND
+        return
+    if not _api_key():
+        return
+    with _LOCK:
+        if _CLIENT is None:
+            _CLIENT, _ASYNC_CLIENT = build_anthropic_clients()
+
+
+def get_client() -> Optional[Anthropic]:
+    """Client synchrone partagé, ou None si aucune clé API n'est configurée."""
+    _ensure_clients()
+    return _CLIENT
+
+
+def get_async_client() -> Optional[AsyncAnthropic]:
+    """
+    Client asynchrone partagé, ou None sans clé API.
+    Son pool est lié à une boucle asyncio : l'utiliser via run_sync (ou depuis une
+    boucle unique), pas via des asyncio.run() successifs.
+    """
+    _ensure_clients()
+    return _ASYNC_CLIENT
+
+
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP
+    with _LOCK:
+        if _LOOP is None:
+            _LOOP = asyncio.new_event_loop()
+            threading.Thread(target=_LOOP.run_forever, name="llm-client-loop", daemon=True).start()
+    return _LOOP
+
+
+def run_sync(coro: Coroutine) -> Any:
+    """
+    Exécute une coroutine sur la boucle dédiée du process et attend son résultat.
+    La boucle survit d'un appel à l'autre : le pool du client asynchrone reste valide.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+def connection_stats() -> Dict[str, Any]:
+    """Requêtes HTTP émises, connexions ouvertes et taux de réutilisation depuis le démarrage."""
+    with _STATS_LOCK:
+        return _STATS.as_dict()
+
+
+def cache_control() -> Optional[Dict[str, str]]:
+    if not PROMPT_CACHE_ENABLED:
+        return None
+    return {"type": "ephemeral"} if PROMPT_CACHE_TTL == "5m" else {"type": "ephemeral", "ttl": PROMPT_CACHE_TTL}
+
+
+# SDK anthropic >= 1.0 : messages.create n'accepte plus temperature
+_SAMPLING_PARAMS = frozenset(p for p in ("temperature",) if p in inspect.signature(Messages.create).parameters)
+
+
+def sampling_params(**params: Any) -> Dict[str, Any]:
+    """Paramètres d'échantillonnage acceptés par le SDK installé (les autres sont ignorés)."""
+    return {k: v for k, v in params.items() if k in _SAMPLING_PARAMS}
+
+
+def cached_block(text: str) -> Dict[str, Any]:
+    """
+    Bloc texte marqué comme préfixe cacheable (prompt caching). Tout ce qui précède
+    le marqueur (outils, system...) doit être identique d'un appel à l'autre : les
+    parties statiques en premier, le contenu variable après.
+    """
+    block: Dict[str, Any] = {"type": "text", "text": text}
+    control = cache_control()
+    if control is not None:
+        block["cache_control"] = control
+    return block
+
+
+@dataclass
+class StageUsage:
+    calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    seconds: float = 0.0
+    streamed: int = 0
+    ttft_seconds: float = 0.0  # cumul du temps jusqu'au premier token (appels en flux)
+
+    @property
+    def cache_read_ratio(self) -> float:
+        """Part des tokens d'entrée servis par le cache."""
+        total = self.input_tokens + self.cache_read_tokens + self.cache_write_tokens
+        return self.cache_read_tokens / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            **asdict(self),
+            "seconds": round(self.seconds, 3),
+            "avg_seconds": round(self.seconds / self.calls, 3) if self.calls else 0.0,
+            "ttft_seconds": round(self.ttft_seconds, 3),
+            "avg_ttft_seconds": round(self.ttft_seconds / self.streamed, 3) if self.streamed else None,
+            "cache_read_ratio": round(self.cache_read_ratio, 3),
+        }
+
+
+_USAGE: Dict[str, StageUsage] = {}
+
+
+def usage_tokens(usage: Any) -> Tuple[int, int, int, int]:
+    """
+    (entrée hors cache, sortie, lus dans le cache, écrits dans le cache) depuis `usage`
+    de l'API Messages (cache_read_input_tokens, cache_creation_input_tokens) ou RunUsage
+    de pydantic-ai (cache_read_tokens, cache_write_tokens). L'input_tokens de pydantic-ai
+    inclut les tokens du cache, contrairement à celui de l'API : on les retire.
+    """
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    output_tokens = getattr(usage, "output_tokens", 0) or 0
+    read = getattr(usage, "cache_read_input_tokens", None)
+    write = getattr(usage, "cache_creation_input_tokens", None)
+    if read is None and write is None:
+        read = getattr(usage, "cache_read_tokens", 0) or 0
+        write = getattr(usage, "cache_write_tokens", 0) or 0
+        return max(input_tokens - read - write, 0), output_tokens, read, write
+    return input_tokens, output_tokens, read or 0, write or 0
+
+
+def record_usage(stage: str, usage: Any, seconds: float = 0.0, ttft: Optional[float] = None) -> None:
+    """
+    Cumule l'usage d'un appel (voir usage_tokens).
+    `ttft` : temps jusqu'au premier token, pour les appels en flux.
+    Les tokens sont aussi rattachés au span de trace actif (tracing.py).
+    """
+    if usage is None:
+        return
+    input_tokens, output_tokens, read, write = usage_tokens(usage)
+    add_tokens(input_tokens, output_tokens, read, write)
+    with _STATS_LOCK:
+        stats = _USAGE.setdefault(stage, StageUsage())
+        stats.calls += getattr(usage, "requests", 1) or 1
+        stats.input_tokens += input_tokens
+        stats.output_tokens += output_tokens
+        stats.cache_read_tokens += read
+        stats.cache_write_tokens += write
+        stats.seconds += seconds
+        if ttft is not None:
+            stats.streamed += 1
+            stats.ttft_seconds += ttft
+
+
+def usage_stats() -> Dict[str, Dict[str, Any]]:
+    """Tokens (dont lus / écrits dans le cache de prompt) et durée cumulée, par étape."""
+    with _STATS_LOCK:
+        return {stage: u.as_dict() for stage, u in _USAGE.items()}
+
+
+def reset_connection_stats() -> None:
+    with _STATS_LOCK:
+        _STATS.requests = 0
+        _STATS.connections_opened = 0
+        _USAGE.clear()
@@ -0,0 +1,642 @@
+# local_backend.py
+"""
+Backend local, sans réseau, qui imite l'API Messages d'Anthropic.
+
+- réponses déterministes (même requête => même réponse) : texte de réponse client
+  gabarit, ou JSON conforme au schéma passé dans output_config (CLASSIFICATION_SCHEMA) ;
+- latence simulée (fixe, uniforme ou log-normale) et pannes simulées (429 / 529 / 500)
+  selon une distribution configurable ;
+- enregistrement des vraies réponses (LLM_BACKEND=record) puis rejeu hors ligne
+  (LLM_BACKEND=replay) ;
+- messages.create et messages.stream, en synchrone et en asynchrone ;
+- mode serveur HTTP (`python local_backend.py serve`) : pointer ANTHROPIC_BASE_URL
+  dessus pour faire passer le vrai SDK (retries compris) sur le backend simulé.
+
+Sélection par variable d'environnement : LLM_BACKEND=anthropic|local|replay|record
+(voir llm_client.get_client), ou install() dans un script. Le backend local branche
+de vrais clients SDK sur un httpx.MockTransport derrière le transport de comptage
+(sdk_clients) : les pannes simulées passent par les retries du SDK et par le
+régulateur, comme en production. LocalAnthropic (appel direct, pannes levées telles
+quelles) reste disponible pour les tests unitaires et le rejeu.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import anthropic
+from anthropic.types import Message
+
+ROOT_FOLDER = Path(__file__).resolve().parent
+
+LOCAL_BACKEND_LATENCY = float(os.getenv("LOCAL_BACKEND_LATENCY", "0"))
+LOCAL_BACKEND_LATENCY_DIST = os.getenv("LOCAL_BACKEND_LATENCY_DIST", "fixed")  # fixed | uniform | lognormal
+LOCAL_BACKEND_JITTER = float(os.getenv("LOCAL_BACKEND_JITTER", "0.3"))
+LOCAL_BACKEND_FAILURE_RATE = float(os.getenv("LOCAL_BACKEND_FAILURE_RATE", "0"))
+LOCAL_BACKEND_FAILURES = os.getenv("LOCAL_BACKEND_FAILURES", "429:0.6,529:0.3,500:0.1")
+LOCAL_BACKEND_SEED = int(os.getenv("LOCAL_BACKEND_SEED", "0"))
+LOCAL_BACKEND_RETRY_AFTER = os.getenv("LOCAL_BACKEND_RETRY_AFTER", "1")  # secondes, en-tête des pannes simulées
+LOCAL_BACKEND_TOKEN_DELAY = float(os.getenv("LOCAL_BACKEND_TOKEN_DELAY", "0"))  # entre deux deltas en flux
+LLM_RECORD_PATH = Path(os.getenv("LLM_RECORD_PATH", str(ROOT_FOLDER / "data" / ".cache" / "llm_recordings.jsonl")))
+
+# mots-clés -> motif (les autres champs d'enum sont tirés du hash du texte)
+MOTIF_KEYWORDS = [
+    ("rembours", "REMBOURSEMENT_SANTE"),
+    ("devis", "DEVIS"),
+    ("cotisation", "COTISATIONS"),
+    ("attestation", "ATTESTATION"),
+    ("arrêt de travail", "ARRET_TRAVAIL_PREVOYANCE"),
+    ("retraite", "RETRAITE_INFO"),
+    ("déménag", "CHANGEMENT_SITUATION"),
+    ("réclamation", "RECLAMATION"),
+]
+
+ERROR_TYPES = {
+    400: "invalid_request_error",
+    429: "rate_limit_error",
+    500: "api_error",
+    529: "overloaded_error",
+}
+
+Responder = Callable[[Dict[str, Any]], Message]
+
+
+# ---------- latence et pannes ----------
+@dataclass
+class LatencyModel:
+    mean: float = LOCAL_BACKEND_LATENCY
+    dist: str = LOCAL_BACKEND_LATENCY_DIST
+    jitter: float = LOCAL_BACKEND_JITTER  # uniforme : ± jitter * mean ; log-normale : sigma
+
+    def sample(self, rng: random.Random) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.dist == "uniform":
+            return max(0.0, rng.uniform(self.mean * (1 - self.jitter), self.mean * (1 + self.jitter)))
+        if self.dist == "lognormal":
+            # moyenne conservée : mu = ln(mean) - sigma² / 2
+            return rng.lognormvariate(math.log(self.mean) - self.jitter ** 2 / 2, self.jitter)
+        return self.mean
+
+
+def parse_failures(spec: str) -> Dict[int, float]:
+    """"429:0.6,529:0.3,500:0.1" -> {429: 0.6, 529: 0.3, 500: 0.1}"""
+    out: Dict[int, float] = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        status, weight = part.split(":")
+        out[int(status)] = float(weight)
+    return out
+
+
+@dataclass
+class FailureModel:
+    rate: float = LOCAL_BACKEND_FAILURE_RATE
+    statuses: Dict[int, float] = field(default_factory=lambda: parse_failures(LOCAL_BACKEND_FAILURES))
+
+    def sample(self, rng: random.Random) -> Optional[int]:
+        if self.rate <= 0 or rng.random() >= self.rate:
+            return None
+        codes, weights = zip(*self.statuses.items())
+        return rng.choices(codes, weights=weights)[0]
+
+
+class Behaviour:
+    """Latence et pannes simulées ; tirages reproductibles (graine fixe)."""
+
+    def __init__(self, latency: Optional[LatencyModel] = None, failures: Optional[FailureModel] = None, seed: int = LOCAL_BACKEND_SEED):
+        self.latency = latency or LatencyModel()
+        self.failures = failures or FailureModel()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failed: Dict[int, int] = {}
+
+    def draw(self) -> Tuple[float, Optional[int]]:
+        with self._lock:
+            self.calls += 1
+            delay = self.latency.sample(self._rng)
+            status = self.failures.sample(self._rng)
+            if status is not None:
+                self.failed[status] = self.failed.get(status, 0) + 1
+            return delay, status
+
+
+def api_error(status: int) -> anthropic.APIStatusError:
+    """Exception du SDK correspondant au statut HTTP simulé."""
+    from llm_client import httpx
+
+    request = httpx.Request("POST", "http://local-backend/v1/messages")
+    body = {"type": "error", "error": {"type": ERROR_TYPES.get(status, "api_error"), "message": "simulated failure"}}
+    response = httpx.Response(status, request=request, json=body, headers={"retry-after": LOCAL_BACKEND_RETRY_AFTER})
+    cls = {
+        400: anthropic.BadRequestError,
+        429: anthropic.RateLimitError,
+        500: anthropic.InternalServerError,
+    }.get(status, anthropic.APIStatusError)
+    return cls(f"Error code: {status} (simulated)", response=response, body=body)
+
+
+# ---------- réponses simulées ----------
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def _user_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(b.get("text", "") for b in content or [] if isinstance(b, dict))
+    return "\n".join(parts)
+
+
+def _request_part(text: str) -> str:
+    """Demande client seule (sans gabarit de classification ni réponse de l'assistant)."""
+    text = text.removeprefix("Texte à classifier :\n").removeprefix("DEMANDE CLIENT:\n")
+    return text.split("\n\nREPONSE ASSISTANT:", 1)[0]
+
+
+def fake_json(schema: Dict[str, Any], text: str, path: str = "") -> Any:
+    """Valeur conforme au schéma JSON, choisie de façon déterministe à partir du texte."""
+    if "enum" in schema:
+        if path == "motif":
+            lowered = text.lower()
+            for keyword, motif in MOTIF_KEYWORDS:
+                if keyword in lowered and motif in schema["enum"]:
+                    return motif
+        return schema["enum"][_digest(path + text) % len(schema["enum"])]
+    kind = schema.get("type")
+    if kind == "object":
+        return {k: fake_json(v, text, k) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        items = schema.get("items", {})
+        return [fake_json(items, text, path)] if "enum" in items else []
+    if kind == "number":
+        return round(0.5 + (_digest(path + text) % 50) / 100, 2)
+    if kind == "integer":
+        return _digest(path + text) % 100
+    if kind == "boolean":
+        return bool(_digest(path + text) % 2)
+    words = text.split()
+    return " ".join(words[:20]) + ("..." if len(words) > 20 else "")
+
+
+def conforms(schema: Dict[str, Any], value: Any) -> bool:
+    """Validation minimale (type, enum, required, additionalProperties) pour les tests."""
+    if "enum" in schema:
+        return value in schema["enum"]
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            return False
+        props = schema.get("properties", {})
+        if any(k not in value for k in schema.get("required", [])):
+            return False
+        if schema.get("additionalProperties") is False and any(k not in props for k in value):
+            return False
+        return all(conforms(props[k], v) for k, v in value.items() if k in props)
+    if kind == "array":
+        return isinstance(value, list) and all(conforms(schema.get("items", {}), v) for v in value)
+    if kind == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if kind == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if kind == "boolean":
+        return isinstance(value, bool)
+    if kind == "string":
+        return isinstance(value, str)
+    return True
+
+
+def fake_text(request: Dict[str, Any]) -> str:
+    text = _request_part(_user_text(request.get("messages", [])))
+    schema = ((request.get("output_config") or {}).get("format") or {}).get("schema")
+    if schema is not None:
+        return json.dumps(fake_json(schema, text), ensure_ascii=False)
+    return (
+        "Bonjour, merci pour votre message. Nous avons bien pris en compte votre demande "
+        f"(réf. {_digest(text) % 100000:05d}). Pouvez-vous nous transmettre vos justificatifs ?"
+    )
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Clé stable d'une requête (hors options de transport) pour l'enregistrement / rejeu."""
+    payload = {k: v for k, v in request.items() if k not in ("stream", "timeout") and not k.startswith("extra_")}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def fake_message(request: Dict[str, Any]) -> Message:
+    text = fake_text(request)
+    return Message.model_validate({
+        "id": f"msg_local_{request_key(request)[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": request.get("model", "local"),
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": len(_user_text(request.get("messages", []))) // 4,
+            "output_tokens": len(text) // 4,
+            "cache_read_input_tokens": 0,
+            "cache_creation_input_tokens": 0,
+        },
+    })
+
+
+# ---------- enregistrement / rejeu ----------
+class Recorder:
+    """Ajoute chaque (clé de requête, réponse) à un JSONL."""
+
+    def __init__(self, path: Path = LLM_RECORD_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def record(self, request: Dict[str, Any], message: Message) -> None:
+        line = json.dumps({"key": request_key(request), "response": message.model_dump(mode="json")}, ensure_ascii=False)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class Replay:
+    """
+    Rejoue les réponses enregistrées. Requête inconnue : réponse simulée
+    (fake_message), ou KeyError si strict.
+    """
+
+    def __init__(self, path: Path = LLM_RECORD_PATH, strict: bool = False):
+        self.strict = strict
+        self.responses: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        if Path(path).exists():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.responses[entry["key"]] = entry["response"]
+
+    def __call__(self, request: Dict[str, Any]) -> Message:
+        data = self.responses.get(request_key(request))
+        if data is not None:
+            self.hits += 1
+            return Message.model_validate(data)
+        self.misses += 1
+        if self.strict:
+            raise KeyError(f"No recorded response for request {request_key(request)[:12]}")
+        return fake_message(request)
+
+
+# ---------- clients en processus ----------
+def _chunks(text: str, size: int = 12) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _text_of(message: Message) -> str:
+    return "".join(getattr(b, "text", "") for b in message.content)
+
+
+class FakeStream:
+    """Équivalent local de messages.stream(...) : text_stream puis get_final_message()."""
+
+    def __init__(self, message: Message, delay: float, token_delay: float):
+        self._message = message
+        self._delay = delay
+        self._token_delay = token_delay
+
+    def __enter__(self) -> "FakeStream":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+    @property
+    def text_stream(self) -> Iterator[str]:
+        time.sleep(self._delay)  # temps jusqu'au premier token
+        for i, chunk in enumerate(_chunks(_text_of(self._message))):
+            if i and self._token_delay:
+                time.sleep(self._token_delay)
+            yield chunk
+
+    def get_final_message(self) -> Message:
+        return self._message
+
+
+class AsyncFakeStream(FakeStream):
+    async def __aenter__(self) -> "AsyncFakeStream":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    @property
+    async def text_stream(self) -> AsyncIterator[str]:
+        await asyncio.sleep(self._delay)
+        for i, chunk in enumerate(_chunks(_text_of(self._message))):
+            if i and self._token_delay:
+                await asyncio.sleep(self._token_delay)
+            yield chunk
+
+    async def get_final_message(self) -> Message:
+        return self._message
+
+
+class _Messages:
+    def __init__(self, responder: Responder, behaviour: Behaviour, token_delay: float):
+        self.responder = responder
+        self.behaviour = behaviour
+        self.token_delay = token_delay
+
+    def _respond(self, request: Dict[str, Any]) -> Tuple[float, Message]:
+        delay, status = self.behaviour.draw()
+        if status is not None:
+            raise api_error(status)
+        return delay, self.responder(request)
+
+    def create(self, **request) -> Message:
+        delay, message = self._respond(request)
+        time.sleep(delay)
+        return message
+
+    def stream(self, **request) -> FakeStream:
+        delay, message = self._respond(request)
+        return FakeStream(message, delay, self.token_delay)
+
+
+class _AsyncMessages(_Messages):
+    async def create(self, **request) -> Message:
+        delay, message = self._respond(request)
+        await asyncio.sleep(delay)
+        return message
+
+    def stream(self, **request) -> AsyncFakeStream:
+        delay, message = self._respond(request)
+        return AsyncFakeStream(message, delay, self.token_delay)
+
+
+class LocalAnthropic:
+    """Remplaçant d'anthropic.Anthropic pour messages.create / messages.stream."""
+
+    def __init__(
+        self,
+        responder: Responder = fake_message,
+        behaviour: Optional[Behaviour] = None,
+        token_delay: float = LOCAL_BACKEND_TOKEN_DELAY,
+    ):
+        self.behaviour = behaviour or Behaviour()
+        self.messages = _Messages(responder, self.behaviour, token_delay)
+
+
+class AsyncLocalAnthropic(LocalAnthropic):
+    def __init__(self, responder: Responder = fake_message, behaviour: Optional[Behaviour] = None, token_delay: float = LOCAL_BACKEND_TOKEN_DELAY):
+        self.behaviour = behaviour or Behaviour()
+        self.messages = _AsyncMessages(responder, self.behaviour, token_delay)
+
+
+# ---------- enregistrement des vraies réponses ----------
+class _RecordingStream:
+    def __init__(self, manager, request: Dict[str, Any], recorder: Recorder):
+        self._manager = manager
+        self._request = request
+        self._recorder = recorder
+        self._stream = None
+
+    def __enter__(self):
+        self._stream = self._manager.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._manager.__exit__(*exc)
+
+    @property
+    def text_stream(self):
+        return self._stream.text_stream
+
+    def get_final_message(self) -> Message:
+        message = self._stream.get_final_message()
+        self._recorder.record(self._request, message)
+        return message
+
+
+class _RecordingMessages:
+    def __init__(self, inner, recorder: Recorder):
+        self._inner = inner
+        self._recorder = recorder
+
+    def create(self, **request) -> Message:
+        message = self._inner.create(**request)
+        self._recorder.record(request, message)
+        return message
+
+    def stream(self, **request):
+        return _RecordingStream(self._inner.stream(**request), request, self._recorder)
+
+
+class _AsyncRecordingMessages(_RecordingMessages):
+    async def create(self, **request) -> Message:
+        message = await self._inner.create(**request)
+        self._recorder.record(request, message)
+        return message
+
+
+class RecordingClient:
+    """Client réel dont les réponses messages.create / stream sont enregistrées pour rejeu."""
+
+    def __init__(self, inner, recorder: Optional[Recorder] = None, is_async: bool = False):
+        self._inner = inner
+        recorder = recorder or Recorder()
+        self.messages = (_AsyncRecordingMessages if is_async else _RecordingMessages)(inner.messages, recorder)
+
+
+# ---------- transport HTTP simulé ----------
+def _error_payload(status: int) -> Dict[str, Any]:
+    return {"type": "error", "error": {"type": ERROR_TYPES.get(status, "api_error"), "message": "simulated failure"}}
+
+
+def _sse_events(message: Dict[str, Any]) -> Iterator[Tuple[bool, bytes]]:
+    """Événements SSE de messages.stream ; le booléen marque les deltas après le premier (délai inter-tokens)."""
+
+    def event(name: str, data: Dict[str, Any]) -> bytes:
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+    text = "".join(b.get("text", "") for b in message["content"])
+    yield False, event("message_start", {"type": "message_start", "message": {**message, "content": [], "stop_reason": None}})
+    yield False, event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+    for i, chunk in enumerate(_chunks(text)):
+        yield bool(i), event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}})
+    yield False, event("content_block_stop", {"type": "content_block_stop", "index": 0})
+    yield False, event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": message["usage"]["output_tokens"]}})
+    yield False, event("message_stop", {"type": "message_stop"})
+
+
+def _draw_response(path: str, body: bytes, responder: Responder, behaviour: Behaviour) -> Tuple[float, int, Dict[str, Any], bool]:
+    """(délai, statut, charge JSON, flux SSE ?) pour un POST simulé sur /v1/messages."""
+    if not path.split("?")[0].endswith("/v1/messages"):
+        return 0.0, 404, {"type": "error", "error": {"type": "not_found_error", "message": path}}, False
+    request = json.loads(body or b"{}")
+    delay, status = behaviour.draw()
+    if status is not None:
+        return delay, status, _error_payload(status), False
+    return delay, 200, responder(request).model_dump(mode="json"), bool(request.get("stream"))
+
+
+def mock_transports(responder: Responder = fake_message, behaviour: Optional[Behaviour] = None, token_delay: float = LOCAL_BACKEND_TOKEN_DELAY):
+    """(httpx.MockTransport synchrone, asynchrone) servant /v1/messages comme serve(), sans socket."""
+    from llm_client import httpx
+
+    behaviour = behaviour or Behaviour()
+
+    def response(status: int, payload: Dict[str, Any], content=None):
+        if content is not None:
+            return httpx.Response(status, headers={"content-type": "text/event-stream"}, content=content)
+        headers = {"content-type": "application/json"}
+        if status >= 400:
+            headers["retry-after"] = LOCAL_BACKEND_RETRY_AFTER
+        # corps en flux (non lu d'avance) : sa fermeture libère la place du régulateur
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        return httpx.Response(status, headers=headers, stream=httpx.ByteStream(body))
+
+    def handle(request):
+        delay, status, payload, stream = _draw_response(request.url.path, request.content, responder, behaviour)
+        time.sleep(delay)  # temps jusqu'au premier octet
+        if not stream:
+            return response(status, payload)
+
+        def events() -> Iterator[bytes]:
+            for wait, chunk in _sse_events(payload):
+                if wait and token_delay:
+                    time.sleep(token_delay)
+                yield chunk
+
+        return response(status, payload, events())
+
+    async def ahandle(request):
+        delay, status, payload, stream = _draw_response(request.url.path, request.content, responder, behaviour)
+        await asyncio.sleep(delay)
+        if not stream:
+            return response(status, payload)
+
+        async def events() -> AsyncIterator[bytes]:
+            for wait, chunk in _sse_events(payload):
+                if wait and token_delay:
+                    await asyncio.sleep(token_delay)
+                yield chunk
+
+        return response(status, payload, events())
+
+    return httpx.MockTransport(handle), httpx.MockTransport(ahandle)
+
+
+def sdk_clients(responder: Responder = fake_message, behaviour: Optional[Behaviour] = None, token_delay: float = LOCAL_BACKEND_TOKEN_DELAY):
+    """
+    Vrais clients anthropic (synchrone, asynchrone) sur le transport simulé, derrière
+    CountingTransport : retries du SDK, retry-after et régulateur s'appliquent aux pannes.
+    """
+    from llm_client import build_anthropic_clients
+
+    inner, async_inner = mock_transports(responder, behaviour, token_delay)
+    return build_anthropic_clients(inner, async_inner, base_url="http://local-backend")
+
+
+# ---------- sélection ----------
+def backend_clients(name: str) -> Tuple[Any, Any]:
+    """(client synchrone, client asynchrone) pour LLM_BACKEND=local|replay|record."""
+    if name == "local":
+        return sdk_clients()
+    if name == "replay":
+        replay = Replay()
+        return LocalAnthropic(replay, Behaviour(failures=FailureModel(rate=0))), AsyncLocalAnthropic(replay, Behaviour(failures=FailureModel(rate=0)))
+    if name == "record":
+        from llm_client import build_anthropic_clients
+
+        client, async_client = build_anthropic_clients()
+        if client is None:
+            raise RuntimeError("LLM_BACKEND=record needs ANTHROPIC_API_KEY")
+        recorder = Recorder()
+        return RecordingClient(client, recorder), RecordingClient(async_client, recorder, is_async=True)
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+
+def install(latency: float = LOCAL_BACKEND_LATENCY, behaviour: Optional[Behaviour] = None, responder: Responder = fake_message) -> None:
+    """Branche le backend local (vrais clients SDK, transport simulé) à la place des clients Anthropic partagés."""
+    from llm_client import use_clients
+
+    behaviour = behaviour or Behaviour(latency=LatencyModel(mean=latency))
+    use_clients(*sdk_clients(responder, behaviour))
+
+
+# ---------- serveur HTTP ----------
+def serve(host: str = "127.0.0.1", port: int = 8089, responder: Responder = fake_message, behaviour: Optional[Behaviour] = None):
+    """Serveur /v1/messages (JSON ou SSE selon "stream") ; bloque jusqu'à Ctrl-C."""
+    import http.server
+
+    behaviour = behaviour or Behaviour()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send(self, status: int, payload: Dict, headers: Optional[Dict[str, str]] = None) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self) -> None:
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            delay, status, payload, stream = _draw_response(self.path, body, responder, behaviour)
+            time.sleep(delay)
+            if not stream:
+                self._send(status, payload, {"retry-after": LOCAL_BACKEND_RETRY_AFTER} if status >= 400 else None)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for wait, chunk in _sse_events(payload):
+                if wait and LOCAL_BACKEND_TOKEN_DELAY:
+                    time.sleep(LOCAL_BACKEND_TOKEN_DELAY)
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+    return http.server.ThreadingHTTPServer((host, port), Handler)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--replay", action="store_true", help="rejouer les réponses enregistrées")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, responder=Replay() if args.replay else fake_message)
+    print(f"[LOCAL] http://{args.host}:{args.port}/v1/messages | latence={LOCAL_BACKEND_LATENCY}s ({LOCAL_BACKEND_LATENCY_DIST}) "
+          f"| pannes={LOCAL_BACKEND_FAILURE_RATE:.0%} | export ANTHROPIC_BASE_URL=http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
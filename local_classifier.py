@@ -0,0 +1,364 @@
+# local_classifier.py
+"""
+Classifieur local en amont de Claude.
+
+Les champs à enum de CLASSIFICATION_SCHEMA (motif, domaine, intention, priorite,
+ton_client) forment un petit espace d'étiquettes : un modèle TF-IDF + régression
+logistique, entraîné hors ligne sur les sorties de `classify` journalisées
+(data/.cache/classify_log.jsonl), y répond en bien moins d'une milliseconde.
+
+classify() ne se replie sur Claude que si la confiance locale (probabilité
+minimale sur les champs) est sous LOCAL_CLASSIFIER_THRESHOLD.
+
+Limite : la confiance ne porte que sur les champs à enum. Les champs libres sont
+obtenus par règles, moins riches que ceux du modèle : resume_1_phrase est la
+première phrase utile de la demande (formules de politesse écartées) et
+infos_a_collecter les éléments manquants d'une demande de remboursement
+(extraction_demande). Le rapport de calibration mesure l'écart avec le journal.
+
+Usage :
+    python local_classifier.py train [log.jsonl]   # entraîne, affiche le rapport de calibration, sauvegarde
+    python local_classifier.py report [log.jsonl]  # rapport du modèle sauvegardé sur un journal
+"""
+from __future__ import annotations
+
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+from collections import Counter
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from extraction_demande import extraire_demande
+from passage_index import normalize_tokens
+
+ROOT_FOLDER = Path(__file__).resolve().parent
+
+CLASSIFY_LOG_PATH = Path(os.getenv("CLASSIFY_LOG_PATH", str(ROOT_FOLDER / "data" / ".cache" / "classify_log.jsonl")))
+MODEL_PATH = Path(os.getenv("LOCAL_CLASSIFIER_PATH", str(ROOT_FOLDER / "data" / ".cache" / "local_classifier.json")))
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.85"))
+MODEL_VERSION = 1
+
+FIELDS = ("motif", "domaine", "intention", "priorite", "ton_client")
+ACTIONS_FIELD = "actions_recommandees"
+
+RE_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+RE_SALUTATION = re.compile(r"^(?:(?:bonjour|bonsoir|salut|madame|monsieur|mesdames|messieurs)\b[\s,;:!.]*)+", re.IGNORECASE)
+# phrase qui n'est qu'une formule de politesse, suivie au plus d'un nom ou d'un placeholder
+RE_FORMULE = re.compile(
+    r"^(?:merci(?: d'avance| par avance| beaucoup| pour votre (?:aide|retour|réponse))?|cordialement|bien [àa] vous"
+    r"|salutations(?: distinguées)?|bonne (?:journée|soirée))(?:\s*[,.!]?\s*(?:\[[A-Z_0-9]+\]|[A-ZÀ-Ý][\w'-]*)){0,3}\s*[.!?]*$",
+    re.IGNORECASE,
+)
+
+Features = Dict[str, float]
+
+
+def request_part(text_to_classify: str) -> str:
+    """Partie 'demande client' du texte envoyé à classify (sans la réponse de l'assistant)."""
+    text = text_to_classify.split("\n\nREPONSE ASSISTANT:", 1)[0]
+    return text.removeprefix("DEMANDE CLIENT:\n")
+
+
+def summary_sentence(request: str, max_len: int = 160) -> str:
+    """Première phrase utile de la demande : salutation d'ouverture et formules de politesse écartées."""
+    sentences = [RE_SALUTATION.sub("", s) for s in RE_SENTENCE.split(" ".join(request.split()))]
+    useful = [s for s in sentences if s and not RE_FORMULE.match(s)]
+    first = useful[0] if useful else " ".join(request.split())
+    first = first[:1].upper() + first[1:]
+    return first if len(first) <= max_len else first[:max_len - 3] + "..."
+
+
+def features(text: str) -> List[str]:
+    """Unigrammes normalisés + bigrammes."""
+    tokens = normalize_tokens(text)
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def _softmax(scores: List[float]) -> List[float]:
+    top = max(scores)
+    exps = [math.exp(s - top) for s in scores]
+    total = sum(exps)
+    return [e / total for e in exps]
+
+
+def _sigmoid(x: float) -> float:
+    return 1.0 / (1.0 + math.exp(-x)) if x >= 0 else math.exp(x) / (1.0 + math.exp(x))
+
+
+class SoftmaxRegression:
+    """Régression logistique multinomiale sur vecteurs creux (dict terme -> poids)."""
+
+    def __init__(self, labels: List[str], weights: Optional[List[Dict[str, float]]] = None, bias: Optional[List[float]] = None):
+        self.labels = labels
+        self.weights = weights or [{} for _ in labels]
+        self.bias = bias or [0.0] * len(labels)
+
+    def predict_proba(self, x: Features) -> List[float]:
+        return _softmax([
+            b + sum(w.get(term, 0.0) * v for term, v in x.items())
+            for w, b in zip(self.weights, self.bias)
+        ])
+
+    def fit(self, xs: List[Features], ys: List[str], epochs: int = 30, lr: float = 0.5, l2: float = 1e-4, seed: int = 0) -> None:
+        index = {label: i for i, label in enumerate(self.labels)}
+        order = list(range(len(xs)))
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            step = lr / (1 + epoch * 0.1)
+            for n in order:
+                x, target = xs[n], index[ys[n]]
+                probs = self.predict_proba(x)
+                for k, p in enumerate(probs):
+                    grad = p - (1.0 if k == target else 0.0)
+                    if abs(grad) < 1e-6:
+                        continue
+                    w = self.weights[k]
+                    for term, v in x.items():
+                        w[term] = w.get(term, 0.0) * (1 - step * l2) - step * grad * v
+                    self.bias[k] -= step * grad
+
+    def to_dict(self) -> Dict:
+        return {"labels": self.labels, "weights": self.weights, "bias": self.bias}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SoftmaxRegression":
+        return cls(data["labels"], data["weights"], data["bias"])
+
+
+@dataclass
+class ClassifierStats:
+    local: int = 0
+    fallbacks: int = 0
+
+    @property
+    def avoided_rate(self) -> float:
+        total = self.local + self.fallbacks
+        return self.local / total if total else 0.0
+
+    def as_dict(self) -> Dict:
+        return {**asdict(self), "avoided_rate": round(self.avoided_rate, 3)}
+
+
+class LocalClassifier:
+    def __init__(self, idf: Dict[str, float], heads: Dict[str, SoftmaxRegression], actions: Dict[str, SoftmaxRegression]):
+        self.idf = idf
+        self.heads = heads
+        self.actions = actions  # une tête binaire ["non", "oui"] par action recommandée
+        self.stats = ClassifierStats()
+        self._lock = threading.Lock()
+
+    def vectorize(self, text: str) -> Features:
+        """TF-IDF normalisé L2 ; les termes absents du vocabulaire sont ignorés."""
+        counts = Counter(t for t in features(text) if t in self.idf)
+        x = {t: tf * self.idf[t] for t, tf in counts.items()}
+        norm = math.sqrt(sum(v * v for v in x.values())) or 1.0
+        return {t: v / norm for t, v in x.items()}
+
+    def predict(self, text_to_classify: str) -> Tuple[Dict, float]:
+        """Classification au format de CLASSIFICATION_SCHEMA et confiance (min des probabilités par champ)."""
+        request = request_part(text_to_classify)
+        x = self.vectorize(request)
+        result: Dict = {}
+        confidence = 1.0
+        for field, head in self.heads.items():
+            probs = head.predict_proba(x)
+            best = max(range(len(probs)), key=probs.__getitem__)
+            result[field] = head.labels[best]
+            confidence = min(confidence, probs[best])
+        result[ACTIONS_FIELD] = [a for a, head in self.actions.items() if head.predict_proba(x)[1] >= 0.5]
+        # champs libres par règles (hors confiance, voir le docstring du module)
+        result["infos_a_collecter"] = extraire_demande(request).manquants if result.get("motif") == "REMBOURSEMENT_SANTE" else []
+        result["resume_1_phrase"] = summary_sentence(request)
+        result["confiance"] = round(confidence, 3)
+        return result, confidence
+
+    def classify(self, text_to_classify: str, threshold: float = LOCAL_CLASSIFIER_THRESHOLD) -> Optional[Dict]:
+        """Classification locale si la confiance atteint le seuil, sinon None (repli sur Claude)."""
+        result, confidence = self.predict(text_to_classify)
+        with self._lock:
+            if confidence >= threshold:
+                self.stats.local += 1
+                return result
+            self.stats.fallbacks += 1
+            return None
+
+    # ---------- persistance ----------
+    def to_dict(self) -> Dict:
+        return {
+            "version": MODEL_VERSION,
+            "idf": self.idf,
+            "heads": {f: h.to_dict() for f, h in self.heads.items()},
+            "actions": {a: h.to_dict() for a, h in self.actions.items()},
+        }
+
+    def save(self, path: Path = MODEL_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # nom temporaire unique : deux process peuvent écrire en même temps
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, suffix=".tmp", delete=False) as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        try:
+            os.replace(f.name, path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+
+    @classmethod
+    def load(cls, path: Path = MODEL_PATH) -> Optional["LocalClassifier"]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != MODEL_VERSION:
+            return None
+        return cls(
+            data["idf"],
+            {f: SoftmaxRegression.from_dict(h) for f, h in data["heads"].items()},
+            {a: SoftmaxRegression.from_dict(h) for a, h in data["actions"].items()},
+        )
+
+
+def load_log(path: Path = CLASSIFY_LOG_PATH) -> List[Dict]:
+    """Enregistrements {"text": ..., "classification": {...}} du journal de classify."""
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def train(records: List[Dict], min_df: int = 1, epochs: int = 30) -> LocalClassifier:
+    docs = [features(request_part(r["text"])) for r in records]
+    df = Counter(t for doc in docs for t in set(doc))
+    n = len(docs)
+    idf = {t: math.log((1 + n) / (1 + c)) + 1.0 for t, c in df.items() if c >= min_df}
+
+    model = LocalClassifier(idf, {}, {})
+    xs = [model.vectorize(request_part(r["text"])) for r in records]
+    for field in FIELDS:
+        ys = [r["classification"][field] for r in records]
+        head = SoftmaxRegression(sorted(set(ys)))
+        head.fit(xs, ys, epochs=epochs)
+        model.heads[field] = head
+    for action in sorted({a for r in records for a in r["classification"].get(ACTIONS_FIELD, [])}):
+        ys = ["oui" if action in r["classification"].get(ACTIONS_FIELD, []) else "non" for r in records]
+        head = SoftmaxRegression(["non", "oui"])
+        head.fit(xs, ys, epochs=epochs)
+        model.actions[action] = head
+    return model
+
+
+def calibration_report(model: LocalClassifier, records: Iterable[Dict], bins: int = 10) -> Dict:
+    """
+    Fiabilité de la confiance sur des enregistrements de validation :
+    précision par tranche de confiance, ECE, et couverture / précision à plusieurs seuils.
+    Champs libres (hors confiance) : recouvrement moyen des mots du résumé avec celui
+    du journal, et part des demandes où le journal liste des infos à collecter que
+    la réponse locale n'a pas.
+    """
+    samples: List[Tuple[float, bool]] = []
+    overlaps: List[float] = []
+    infos_missed: List[bool] = []
+    for r in records:
+        result, confidence = model.predict(r["text"])
+        expected = r["classification"]
+        exact = all(result[f] == expected[f] for f in FIELDS)
+        samples.append((confidence, exact))
+        if expected.get("resume_1_phrase"):
+            ours, theirs = set(normalize_tokens(result["resume_1_phrase"])), set(normalize_tokens(expected["resume_1_phrase"]))
+            overlaps.append(len(ours & theirs) / len(ours | theirs) if ours | theirs else 1.0)
+        if expected.get("infos_a_collecter"):
+            infos_missed.append(not result["infos_a_collecter"])
+
+    table = []
+    ece = 0.0
+    for b in range(bins):
+        lo, hi = b / bins, (b + 1) / bins
+        in_bin = [(c, ok) for c, ok in samples if lo <= c < hi or (b == bins - 1 and c == 1.0)]
+        if not in_bin:
+            continue
+        conf = sum(c for c, _ in in_bin) / len(in_bin)
+        acc = sum(ok for _, ok in in_bin) / len(in_bin)
+        ece += len(in_bin) / len(samples) * abs(conf - acc)
+        table.append({"bin": f"{lo:.1f}-{hi:.1f}", "n": len(in_bin), "confiance": round(conf, 3), "precision": round(acc, 3)})
+
+    thresholds = []
+    for t in (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95):
+        kept = [ok for c, ok in samples if c >= t]
+        thresholds.append({
+            "seuil": t,
+            "couverture": round(len(kept) / len(samples), 3) if samples else 0.0,
+            "precision": round(sum(kept) / len(kept), 3) if kept else None,
+        })
+
+    return {
+        "n": len(samples),
+        "precision_globale": round(sum(ok for _, ok in samples) / len(samples), 3) if samples else None,
+        "ece": round(ece, 4),
+        "bins": table,
+        "seuils": thresholds,
+        "resume_recouvrement": round(sum(overlaps) / len(overlaps), 3) if overlaps else None,
+        "infos_manquees": round(sum(infos_missed) / len(infos_missed), 3) if infos_missed else None,
+    }
+
+
+def print_report(report: Dict) -> None:
+    print(f"[CALIBRATION] n={report['n']} | précision (5 champs exacts)={report['precision_globale']} | ECE={report['ece']}")
+    for row in report["bins"]:
+        print(f"  {row['bin']} | n={row['n']:>4} | confiance={row['confiance']:.3f} | précision={row['precision']:.3f}")
+    for row in report["seuils"]:
+        print(f"  seuil {row['seuil']:.2f} | appels évités={row['couverture']:.1%} | précision={row['precision']}")
+    print(f"  champs libres (règles) | recouvrement du résumé={report['resume_recouvrement']} "
+          f"| infos à collecter manquées={report['infos_manquees']}")
+
+
+_MODEL: Optional[LocalClassifier] = None
+_MODEL_MTIME: Optional[int] = None
+
+
+def get_local_classifier(path: Path = MODEL_PATH) -> Optional[LocalClassifier]:
+    """Modèle partagé (rechargé si le fichier change), ou None s'il n'a pas été entraîné."""
+    global _MODEL, _MODEL_MTIME
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    if _MODEL is None or _MODEL_MTIME != mtime:
+        _MODEL = LocalClassifier.load(path)
+        _MODEL_MTIME = mtime
+    return _MODEL
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    log_path = Path(sys.argv[2]) if len(sys.argv) > 2 else CLASSIFY_LOG_PATH
+    records = load_log(log_path)
+
+    if command == "train":
+        random.Random(0).shuffle(records)
+        split = max(1, int(len(records) * 0.8))
+        t0 = time.perf_counter()
+        model = train(records[:split])
+        print(f"[TRAIN] {len(records[:split])} enregistrements | {time.perf_counter() - t0:.1f}s | vocabulaire={len(model.idf)}")
+        print_report(calibration_report(model, records[split:]))
+        model = train(records)  # modèle final sur tout le journal
+        model.save()
+        print(f"[TRAIN] modèle sauvegardé : {MODEL_PATH}")
+    else:
+        model = get_local_classifier()
+        if model is None:
+            print("[LOCAL] aucun modèle : lancer `python local_classifier.py train`")
+            sys.exit(1)
+        print_report(calibration_report(model, records))
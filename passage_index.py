@@ -0,0 +1,328 @@
+# passage_index.py
+"""
+Recherche locale de passages dans les documents de l'espace client.
+
+Les documents de DOCUMENT_PATHS sont découpés en passages (page + section),
+indexés dans un index inversé BM25 avec normalisation française (accents,
+mots vides), puis persistés sur disque. L'agent peut ainsi récupérer
+uniquement les extraits utiles au lieu du document entier. Un adhérent qui a
+ses propres documents (magasin de documents) a son propre index, en mémoire.
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import os
+import re
+import tempfile
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from corpus_snapshot import get_snapshot
+from document_cache import get_document_cache
+from document_store import get_document_store
+from project_types import TypeDocument
+from retrieve_document import ROOT_FOLDER, DOCUMENT_PATHS, extract_document_pages
+
+INDEX_PATH = Path(os.getenv("PASSAGE_INDEX_PATH", str(ROOT_FOLDER / "data" / ".cache" / "passage_index.json")))
+INDEX_VERSION = 1
+# Index en mémoire des adhérents qui ont des documents propres (LRU)
+MEMBER_INDEX_ENTRIES = int(os.getenv("MEMBER_INDEX_ENTRIES", "32"))
+
+PASSAGE_MAX_WORDS = 120
+PASSAGE_OVERLAP_WORDS = 30
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Mots vides FR (forme sans accents, après normalisation)
+STOPWORDS_FR = frozenset("""
+a ai aie au aux avec c ca ce ceci cela celle celles celui ces cet cette ceux chez d dans de des du
+elle elles en entre est et etaient etait ete etre eu eux il ils j je l la le les leur leurs lui m ma
+mais me meme mes moi mon n ne ni nos notre nous on ont ou par pas pour qu que quel quelle quelles
+quels qui s sa sans se ses si son sont sur t ta te tes toi ton tu un une vos votre vous y
+""".split())
+
+RE_TOKEN = re.compile(r"[a-z0-9]+")
+# Titres de section des notices / conditions (ARTICLE 2.4, TITRE 4, CHAPITRE II...)
+RE_SECTION = re.compile(r"^\s*(ARTICLE|TITRE|CHAPITRE|SECTION)\s+[0-9IVXL]+(?:[.\-][0-9]+)*\b", re.IGNORECASE)
+
+
+def strip_accents(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Minuscules, sans accents, sans mots vides, pluriels simples ramenés au singulier."""
+    tokens = []
+    for tok in RE_TOKEN.findall(strip_accents(text.lower())):
+        if tok in STOPWORDS_FR:
+            continue
+        if len(tok) > 4 and tok.endswith(("s", "x")):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+@dataclass
+class Passage:
+    doc_type: str
+    page: int  # numéro de page (1-based)
+    section: Optional[str]
+    text: str
+
+
+def chunk_pages(doc_type: TypeDocument, pages: List[str]) -> List[Passage]:
+    """
+    Découpe les pages en passages : une coupure à chaque titre de section,
+    puis des fenêtres glissantes de PASSAGE_MAX_WORDS mots au sein d'une section.
+    """
+    passages: List[Passage] = []
+    section: Optional[str] = None
+
+    def flush(lines: List[str], page_no: int) -> None:
+        words = " ".join(lines).split()
+        if not words:
+            return
+        step = PASSAGE_MAX_WORDS - PASSAGE_OVERLAP_WORDS
+        for start in range(0, max(len(words) - PASSAGE_OVERLAP_WORDS, 1), step):
+            passages.append(Passage(
+                doc_type=doc_type.value,
+                page=page_no,
+                section=section,
+                text=" ".join(words[start:start + PASSAGE_MAX_WORDS]),
+            ))
+
+    for page_no, page_text in enumerate(pages, start=1):
+        buffer: List[str] = []
+        for line in page_text.splitlines():
+            m = RE_SECTION.match(line)
+            if m:
+                flush(buffer, page_no)
+                buffer = []
+                section = m.group(0).strip()
+            buffer.append(line)
+        flush(buffer, page_no)
+
+    return passages
+
+
+class PassageIndex:
+    """Index inversé BM25 : terme -> [(id passage, fréquence)]."""
+
+    def __init__(
+        self,
+        passages: List[Passage],
+        fingerprints: Optional[Dict[str, str]] = None,
+        postings: Optional[Dict[str, List[Tuple[int, int]]]] = None,
+        doc_len: Optional[List[int]] = None,
+    ):
+        self.passages = passages
+        self.fingerprints = fingerprints or {}
+
+        if postings is not None and doc_len is not None:
+            # index rechargé depuis le disque : pas de re-tokenisation
+            self.postings = postings
+            self.doc_len = doc_len
+        else:
+            self.postings = defaultdict(list)
+            self.doc_len = []
+            for pid, passage in enumerate(passages):
+                counts = Counter(normalize_tokens(passage.text))
+                self.doc_len.append(sum(counts.values()))
+                for term, tf in counts.items():
+                    self.postings[term].append((pid, tf))
+
+        self.avgdl = (sum(self.doc_len) / len(self.doc_len)) if self.doc_len else 0.0
+
+    def idf(self, term: str) -> float:
+        n = len(self.passages)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        doc_types: Optional[Iterable[TypeDocument]] = None,
+    ) -> List[Tuple[float, Passage]]:
+        """Top-k passages pour la requête (score BM25 décroissant)."""
+        allowed = {TypeDocument(d).value for d in doc_types} if doc_types else None
+        scores: Dict[int, float] = defaultdict(float)
+
+        for term in set(normalize_tokens(query)):
+            plist = self.postings.get(term)
+            if not plist:
+                continue
+            idf = self.idf(term)
+            for pid, tf in plist:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[pid] / (self.avgdl or 1.0))
+                scores[pid] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        if allowed is not None:
+            scores = {pid: s for pid, s in scores.items() if self.passages[pid].doc_type in allowed}
+
+        best = heapq.nlargest(k, scores.items(), key=lambda kv: kv[1])
+        return [(round(score, 4), self.passages[pid]) for pid, score in best]
+
+    # ---------- persistance ----------
+    def to_dict(self) -> Dict:
+        return {
+            "version": INDEX_VERSION,
+            "fingerprints": self.fingerprints,
+            "passages": [asdict(p) for p in self.passages],
+            "doc_len": self.doc_len,
+            "postings": self.postings,
+        }
+
+    def save(self, path: Path = INDEX_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # nom temporaire unique : deux process peuvent écrire en même temps
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=path.parent, suffix=".tmp", delete=False) as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        try:
+            os.replace(f.name, path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "PassageIndex":
+        passages = [Passage(**p) for p in data["passages"]]
+        postings = {term: [tuple(e) for e in plist] for term, plist in data["postings"].items()}
+        return cls(passages, fingerprints=data.get("fingerprints"), postings=postings, doc_len=data["doc_len"])
+
+    @classmethod
+    def load(cls, path: Path = INDEX_PATH) -> Optional["PassageIndex"]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_VERSION:
+            return None
+        return cls.from_dict(data)
+
+
+def corpus_fingerprints() -> Dict[str, str]:
+    """Empreinte SHA-256 de chaque document présent sur disque."""
+    cache = get_document_cache()
+    return {
+        doc_type.value: cache.fingerprint(path)
+        for doc_type, path in DOCUMENT_PATHS.items()
+        if path.exists()
+    }
+
+
+def build_index() -> PassageIndex:
+    passages: List[Passage] = []
+    for doc_type, path in DOCUMENT_PATHS.items():
+        if not path.exists():
+            continue
+        passages.extend(chunk_pages(doc_type, extract_document_pages(doc_type)))
+    return PassageIndex(passages, fingerprints=corpus_fingerprints())
+
+
+_INDEX: Optional[PassageIndex] = None
+
+
+def get_index(path: Path = INDEX_PATH) -> PassageIndex:
+    """
+    Index partagé : pris dans le snapshot du corpus ou chargé depuis le disque
+    s'il correspond encore aux documents, sinon reconstruit puis persisté.
+    """
+    global _INDEX
+    fingerprints = corpus_fingerprints()
+    if _INDEX is not None and _INDEX.fingerprints == fingerprints:
+        return _INDEX
+
+    index = None
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        data = snapshot.index_data()
+        if data and data.get("version") == INDEX_VERSION and data.get("fingerprints") == fingerprints:
+            index = PassageIndex.from_dict(data)
+    if index is None:
+        index = PassageIndex.load(path)
+    if index is None or index.fingerprints != fingerprints:
+        index = build_index()
+        index.save(path)
+    _INDEX = index
+    return index
+
+
+def member_documents(user_id: str) -> Dict[TypeDocument, Path]:
+    """PDF lus pour l'adhérent : les siens, sinon les documents communs."""
+    store = get_document_store()
+    paths = {}
+    for doc_type in DOCUMENT_PATHS:
+        try:
+            paths[doc_type] = store.locate(user_id, doc_type)
+        except FileNotFoundError:
+            continue
+    return paths
+
+
+_MEMBER_INDEXES: "OrderedDict[str, PassageIndex]" = OrderedDict()
+
+
+def get_member_index(user_id: str) -> PassageIndex:
+    """
+    Index de l'adhérent. Sans document propre (mêmes empreintes que le corpus
+    commun), c'est l'index partagé ; sinon un index en mémoire sur ses documents,
+    reconstruit quand l'un d'eux change.
+    """
+    cache = get_document_cache()
+    paths = member_documents(user_id)
+    fingerprints = {doc_type.value: cache.fingerprint(path) for doc_type, path in paths.items()}
+    if fingerprints == corpus_fingerprints():
+        return get_index()
+
+    index = _MEMBER_INDEXES.get(user_id)
+    if index is None or index.fingerprints != fingerprints:
+        store = get_document_store()
+        passages: List[Passage] = []
+        for doc_type in paths:
+            passages.extend(chunk_pages(doc_type, list(store.get_pages(user_id, doc_type))))
+        index = PassageIndex(passages, fingerprints=fingerprints)
+    _MEMBER_INDEXES[user_id] = index
+    _MEMBER_INDEXES.move_to_end(user_id)
+    while len(_MEMBER_INDEXES) > MEMBER_INDEX_ENTRIES:
+        _MEMBER_INDEXES.popitem(last=False)
+    return index
+
+
+def search_passages(
+    query: str,
+    k: int = 5,
+    doc_types: Optional[Iterable[TypeDocument]] = None,
+    user_id: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Recherche top-k sous forme de dictionnaires sérialisables (outil agent), dans
+    les documents de l'adhérent si user_id est donné, sinon dans le corpus commun.
+    """
+    index = get_index() if user_id is None else get_member_index(user_id)
+    return [
+        {"score": score, "document": p.doc_type, "page": p.page, "section": p.section, "texte": p.text}
+        for score, p in index.search(query, k=k, doc_types=doc_types)
+    ]
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    query = " ".join(sys.argv[1:]) or "capital décès bénéficiaires"
+    t0 = time.perf_counter()
+    idx = get_index()
+    t1 = time.perf_counter()
+    hits = search_passages(query, k=5)
+    t2 = time.perf_counter()
+    print(f"[INDEX] passages={len(idx.passages)} termes={len(idx.postings)} load={1000*(t1-t0):.1f}ms query={1000*(t2-t1):.2f}ms")
+    for h in hits:
+        print(f"- {h['score']:.2f} | {h['document']} p.{h['page']} | {h['section']} | {h['texte'][:120]}")
@@ -2,12 +2,11 @@ import os
 import random
 from dotenv import load_dotenv
 import anthropic
+from llm_client import get_client
 
 load_dotenv()
 
-API_KEY = os.getenv("ANTHROPIC_API_KEY")
-
-client = anthropic.Anthropic(api_key=API_KEY)
+client = get_client()
 
 MODEL = os.getenv("ANTHROPIC_MODEL") or os.getenv("CLAUDE_MODEL") or "claude-2"
 
@@ -0,0 +1,354 @@
+# rate_limiter.py
+"""
+Régulateur des appels au modèle, partagé par tout le process.
+
+Branché sur les transports HTTP des clients partagés (llm_client) : chaque
+tentative vers /v1/messages passe par lui, y compris les retries du SDK, l'agent
+pydantic-ai, prevision.demander_claude et front_assureur.
+
+- seaux à jetons : requêtes / minute (LLM_RPM) et tokens / minute (LLM_TPM,
+  estimés à l'admission : taille du corps / 4 + max_tokens) ; 0 = pas de limite ;
+- voies de priorité (high > normal > low, FIFO dans une voie, priorité stricte) :
+  `with priority(lane_for(classification["priorite"])): ...` ;
+- concurrence adaptative AIMD : +LLM_AIMD_INCREASE / limite par succès,
+  x LLM_AIMD_DECREASE sur 429 / 529 (une réduction par fenêtre LLM_AIMD_COOLDOWN),
+  et pause des admissions pendant le retry-after renvoyé par le fournisseur :
+  les retries de toutes les sessions repartent ensemble au lieu de se marcher dessus ;
+- métriques : profondeur de file par voie, attente (histogramme par voie),
+  requêtes en vol, limite courante, 429 / 529 (governor_stats, /metrics de tracing).
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from tracing import Histogram, register_collector
+
+LLM_RATE_LIMITER = os.getenv("LLM_RATE_LIMITER", "1") not in ("0", "false", "False")
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", os.getenv("LLM_MAX_CONNECTIONS", "10")))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_AIMD_INCREASE = float(os.getenv("LLM_AIMD_INCREASE", "1"))
+LLM_AIMD_DECREASE = float(os.getenv("LLM_AIMD_DECREASE", "0.5"))
+LLM_AIMD_COOLDOWN = float(os.getenv("LLM_AIMD_COOLDOWN", "2"))
+
+LANES = ("high", "normal", "low")
+THROTTLE_STATUSES = (429, 529)
+
+_LANE: ContextVar[str] = ContextVar("llm_lane", default="normal")
+
+
+@contextmanager
+def priority(lane: str) -> Iterator[None]:
+    """Voie de priorité des appels au modèle lancés dans ce bloc (threads et tâches asyncio compris)."""
+    if lane not in LANES:
+        raise ValueError(f"Unknown priority lane: {lane}")
+    token = _LANE.set(lane)
+    try:
+        yield
+    finally:
+        _LANE.reset(token)
+
+
+def current_lane() -> str:
+    return _LANE.get()
+
+
+def lane_for(priorite: Optional[str]) -> str:
+    """Voie correspondant au champ priorite d'une classification."""
+    return {"HAUTE": "high", "BASSE": "low"}.get(priorite or "", "normal")
+
+
+def estimate_tokens(body: bytes) -> int:
+    """Tokens réservés pour une requête : entrée estimée (octets / 4) + max_tokens."""
+    if not body:
+        return 0
+    try:
+        max_tokens = int(json.loads(body).get("max_tokens", 0))
+    except (ValueError, TypeError, AttributeError):
+        max_tokens = 0
+    return len(body) // 4 + max_tokens
+
+
+def retry_after(headers: Any) -> Optional[float]:
+    """Délai demandé par le fournisseur (retry-after-ms ou retry-after en secondes)."""
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class TokenBucket:
+    """Seau rempli en continu (per_minute / 60 par seconde), capacité = une minute."""
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.level = per_minute
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Secondes avant de pouvoir prélever `amount` (0 : disponible)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)  # une requête plus grosse que le seau passe seau plein
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        if self.rate > 0:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+
+@dataclass
+class GovernorStats:
+    admitted: int = 0
+    throttled: int = 0  # 429
+    overloaded: int = 0  # 529
+    decreases: int = 0
+    paused_seconds: float = 0.0
+    wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+
+class _Waiter:
+    __slots__ = ("rank", "seq", "lane", "tokens", "event", "loop")
+
+    def __init__(self, lane: str, seq: int, tokens: int, loop: Optional[asyncio.AbstractEventLoop]):
+        self.rank = LANES.index(lane)
+        self.seq = seq
+        self.lane = lane
+        self.tokens = tokens
+        self.loop = loop
+        self.event = threading.Event() if loop is None else asyncio.Event()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.event.set)
+
+
+class Governor:
+    """
+    File d'admission unique (appels synchrones et asynchrones mélangés) : seule la
+    tête de file (voie la plus prioritaire, puis ordre d'arrivée) peut être admise.
+    """
+
+    def __init__(
+        self,
+        rpm: float = LLM_RPM,
+        tpm: float = LLM_TPM,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        min_concurrency: int = LLM_MIN_CONCURRENCY,
+        increase: float = LLM_AIMD_INCREASE,
+        decrease: float = LLM_AIMD_DECREASE,
+        cooldown: float = LLM_AIMD_COOLDOWN,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.clock = clock
+        self.requests = TokenBucket(rpm, clock)
+        self.tokens = TokenBucket(tpm, clock)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.limit = float(max_concurrency)
+        self.inflight = 0
+        self.paused_until = 0.0
+        self.stats = GovernorStats()
+        self.waits = {lane: Histogram() for lane in LANES}
+        self._last_decrease = -math.inf
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    # ---------- admission ----------
+    def _enqueue(self, tokens: int, lane: Optional[str], loop) -> _Waiter:
+        waiter = _Waiter(lane or current_lane(), next(self._seq), tokens, loop)
+        with self._lock:
+            heapq.heappush(self._queue, waiter)
+        return waiter
+
+    def _try_admit(self, waiter: _Waiter) -> Optional[float]:
+        """None si admis ; sinon secondes à attendre avant de réessayer (inf : jusqu'au prochain réveil)."""
+        with self._lock:
+            if self._queue[0] is not waiter or self.inflight >= int(self.limit):
+                return math.inf
+            now = self.clock()
+            wait = max(
+                self.paused_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(waiter.tokens, now),
+            )
+            if wait > 0:
+                return wait
+            heapq.heappop(self._queue)
+            self.requests.take(1, now)
+            self.tokens.take(waiter.tokens, now)
+            self.inflight += 1
+            self.stats.admitted += 1
+            head = self._queue[0] if self._queue else None
+        if head is not None:
+            head.wake()  # la suivante peut être admissible tout de suite
+        return None
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter in self._queue:
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+            head = self._queue[0] if self._queue else None
+        if head is not None:
+            head.wake()
+
+    def _waited(self, waiter: _Waiter, seconds: float) -> float:
+        with self._lock:
+            self.waits[waiter.lane].observe(seconds)
+            self.stats.wait_seconds += seconds
+            self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, seconds)
+        return seconds
+
+    def acquire(self, tokens: int = 0, lane: Optional[str] = None) -> float:
+        """Bloque jusqu'à l'admission ; renvoie le temps passé en file."""
+        t0 = self.clock()
+        waiter = self._enqueue(tokens, lane, None)
+        try:
+            while (wait := self._try_admit(waiter)) is not None:
+                waiter.event.wait(None if wait == math.inf else wait)
+                waiter.event.clear()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        return self._waited(waiter, self.clock() - t0)
+
+    async def aacquire(self, tokens: int = 0, lane: Optional[str] = None) -> float:
+        """Version asynchrone de acquire (n'occupe pas la boucle pendant l'attente)."""
+        t0 = self.clock()
+        waiter = self._enqueue(tokens, lane, asyncio.get_running_loop())
+        try:
+            while (wait := self._try_admit(waiter)) is not None:
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), None if wait == math.inf else wait)
+                except asyncio.TimeoutError:
+                    pass
+                waiter.event.clear()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        return self._waited(waiter, self.clock() - t0)
+
+    # ---------- retour du fournisseur ----------
+    def release(self, status: Optional[int] = None, retry_after_s: Optional[float] = None) -> None:
+        """Fin d'une requête admise ; status None : erreur réseau (pas d'ajustement)."""
+        with self._lock:
+            self.inflight -= 1
+            now = self.clock()
+            if status in THROTTLE_STATUSES:
+                if status == 429:
+                    self.stats.throttled += 1
+                else:
+                    self.stats.overloaded += 1
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(float(self.min_concurrency), self.limit * self.decrease)
+                    self._last_decrease = now
+                    self.stats.decreases += 1
+                if retry_after_s and now + retry_after_s > self.paused_until:
+                    self.stats.paused_seconds += now + retry_after_s - max(now, self.paused_until)
+                    self.paused_until = now + retry_after_s
+            elif status is not None and status < 400:
+                self.limit = min(float(self.max_concurrency), self.limit + self.increase / self.limit)
+            head = self._queue[0] if self._queue else None
+        if head is not None:
+            head.wake()
+
+    # ---------- métriques ----------
+    def queue_depth(self) -> Dict[str, int]:
+        with self._lock:
+            depth = {lane: 0 for lane in LANES}
+            for waiter in self._queue:
+                depth[waiter.lane] += 1
+            return depth
+
+    def snapshot(self) -> Dict[str, Any]:
+        depth = self.queue_depth()
+        with self._lock:
+            return {
+                **asdict(self.stats),
+                "limit": round(self.limit, 2),
+                "inflight": self.inflight,
+                "queue_depth": depth,
+                "paused_for_s": round(max(0.0, self.paused_until - self.clock()), 3),
+                "wait_p95_le_s": {lane: h.quantile(0.95) for lane, h in self.waits.items() if h.count},
+            }
+
+    def prometheus_lines(self) -> List[str]:
+        depth = self.queue_depth()
+        lines = ["# TYPE assurai_llm_queue_depth gauge"]
+        lines += [f'assurai_llm_queue_depth{{lane="{lane}"}} {n}' for lane, n in depth.items()]
+        with self._lock:
+            lines += [
+                "# TYPE assurai_llm_inflight gauge", f"assurai_llm_inflight {self.inflight}",
+                "# TYPE assurai_llm_concurrency_limit gauge", f"assurai_llm_concurrency_limit {self.limit:.2f}",
+                "# TYPE assurai_llm_admitted_total counter", f"assurai_llm_admitted_total {self.stats.admitted}",
+                "# TYPE assurai_llm_throttled_total counter",
+                f'assurai_llm_throttled_total{{status="429"}} {self.stats.throttled}',
+                f'assurai_llm_throttled_total{{status="529"}} {self.stats.overloaded}',
+                "# TYPE assurai_llm_queue_wait_seconds histogram",
+            ]
+            for lane, h in self.waits.items():
+                seen = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    seen += n
+                    lines.append(f'assurai_llm_queue_wait_seconds_bucket{{lane="{lane}",le="{bound}"}} {seen}')
+                lines.append(f'assurai_llm_queue_wait_seconds_bucket{{lane="{lane}",le="+Inf"}} {h.count}')
+                lines.append(f'assurai_llm_queue_wait_seconds_sum{{lane="{lane}"}} {h.sum:.6f}')
+                lines.append(f'assurai_llm_queue_wait_seconds_count{{lane="{lane}"}} {h.count}')
+        return lines
+
+
+_GOVERNOR: Optional[Governor] = None
+_GOVERNOR_LOCK = threading.Lock()
+
+
+def get_governor() -> Optional[Governor]:
+    """Régulateur partagé par le process, ou None si LLM_RATE_LIMITER=0."""
+    global _GOVERNOR
+    if not LLM_RATE_LIMITER:
+        return None
+    if _GOVERNOR is None:
+        with _GOVERNOR_LOCK:
+            if _GOVERNOR is None:
+                _GOVERNOR = Governor()
+                register_collector(_GOVERNOR.prometheus_lines)
+    return _GOVERNOR
+
+
+def governor_stats() -> Dict[str, Any]:
+    governor = get_governor()
+    return governor.snapshot() if governor is not None else {}
@@ -0,0 +1,193 @@
+# response_cache.py
+"""
+Cache des réponses du modèle (réponse client, classification).
+
+Clé = SHA-256 de (étape, modèle, version du prompt, texte normalisé). Le texte
+est celui de SafePayload.text : déjà rédigé / pseudonymisé, aucune PII brute
+n'arrive dans le cache.
+
+Deux niveaux :
+- mémoire : LRU borné en nombre d'entrées ;
+- disque : SQLite (data/.cache/responses.sqlite), partagé entre processus.
+Chaque entrée expire après RESPONSE_CACHE_TTL secondes.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+ROOT_FOLDER = Path(__file__).resolve().parent
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") not in ("0", "false", "False")
+RESPONSE_CACHE_PATH = Path(os.getenv("RESPONSE_CACHE_PATH", str(ROOT_FOLDER / "data" / ".cache" / "responses.sqlite")))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+RESPONSE_CACHE_ENTRIES = int(os.getenv("RESPONSE_CACHE_ENTRIES", "512"))
+
+_RE_SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Forme canonique : NFC, minuscules, espaces compactés."""
+    return _RE_SPACES.sub(" ", unicodedata.normalize("NFC", text).lower()).strip()
+
+
+def prompt_version(*parts: Any) -> str:
+    """Empreinte courte d'un prompt et de ses paramètres : changer le prompt invalide le cache."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def cache_key(stage: str, model: str, version: str, text: str) -> str:
+    raw = "\x1f".join((stage, model, version, normalize_text(text)))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ResponseCacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    puts: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "hit_rate": round(self.hit_rate, 3)}
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: Optional[Path] = RESPONSE_CACHE_PATH,
+        ttl: float = RESPONSE_CACHE_TTL,
+        max_entries: int = RESPONSE_CACHE_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.stats = ResponseCacheStats()
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # clé -> (expiration, JSON)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, stage TEXT NOT NULL, value TEXT NOT NULL, "
+                "created REAL NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def get(self, stage: str, model: str, version: str, text: str) -> Optional[Any]:
+        """Valeur désérialisée (une copie neuve à chaque appel), ou None."""
+        key = cache_key(stage, model, version, text)
+        now = self.clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.stats.memory_hits += 1
+                    return json.loads(entry[1])
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if row[1] > now:
+                        self._remember(key, row[1], row[0])
+                        self.stats.disk_hits += 1
+                        return json.loads(row[0])
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.stats.expired += 1
+            self.stats.misses += 1
+            return None
+
+    def put(self, stage: str, model: str, version: str, text: str, value: Any) -> None:
+        key = cache_key(stage, model, version, text)
+        now = self.clock()
+        raw = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, now + self.ttl, raw)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, stage, value, created, expires) VALUES (?, ?, ?, ?, ?)",
+                    (key, stage, raw, now, now + self.ttl),
+                )
+            self.stats.puts += 1
+
+    def _remember(self, key: str, expires: float, raw: str) -> None:
+        self._memory[key] = (expires, raw)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def purge(self) -> int:
+        """Supprime les entrées expirées ; renvoie le nombre de lignes supprimées sur disque."""
+        now = self.clock()
+        with self._lock:
+            for key in [k for k, (exp, _) in self._memory.items() if exp <= now]:
+                del self._memory[key]
+            if self._db is None:
+                return 0
+            return self._db.execute("DELETE FROM responses WHERE expires <= ?", (now,)).rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+
+    def disk_entries(self) -> int:
+        if self._db is None:
+            return 0
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+_CACHE: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Cache partagé par le process, ou None si RESPONSE_CACHE_ENABLED=0."""
+    global _CACHE
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+    if _CACHE is None:
+        _CACHE = ResponseCache()
+    return _CACHE
+
+
+if __name__ == "__main__":
+    import sys
+
+    cache = ResponseCache()
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "purge":
+        print(f"[CACHE] expirées supprimées : {cache.purge()}")
+    elif command == "clear":
+        cache.clear()
+        print("[CACHE] vidé")
+    else:
+        print(f"[CACHE] {RESPONSE_CACHE_PATH} | entrées={cache.disk_entries()} | ttl={RESPONSE_CACHE_TTL:.0f}s")
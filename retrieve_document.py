@@ -1,6 +1,12 @@
+import os
 import pdfplumber
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple, Union
 from project_types import TypeDocument
+from document_cache import get_document_cache
+from extraction_engine import DOCUMENT_PDF_BACKEND, get_extraction_engine
+from corpus_snapshot import CorpusSnapshot, get_snapshot
 
 ROOT_FOLDER = Path(__file__).resolve().parent
 
@@ -14,28 +20,144 @@ DOCUMENT_PATHS = {
     TypeDocument.NOTICE_INFORMATION: ROOT_FOLDER / "data" / "espace_client" / "notice_information.pdf",
 }
 
+# Below this page count, a process pool costs more than it saves.
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))
+PARALLEL_WORKERS = int(os.getenv("PDF_PARALLEL_WORKERS", "0")) or (os.cpu_count() or 1)
+
+# Rough chars-per-token ratio used to turn a token budget into a char budget.
+CHARS_PER_TOKEN = 4
+
+
+def extract_pages_from_pdf(pdf_path: Path) -> List[str]:
+    """
+    Extracts text from a PDF file with the document backend (pdfplumber by default).
+    Returns one string per page (empty string for pages without text).
+    """
+    return list(get_extraction_engine().iter_raw_pages(pdf_path, DOCUMENT_PDF_BACKEND))
+
+
+def count_pdf_pages(pdf_path: Path) -> int:
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def _extract_page_range(job: Tuple[str, int, int]) -> List[str]:
+    """
+    Worker: extracts pages [start, stop) of a PDF.
+    Each worker opens its own handle, pdfplumber objects are not picklable.
+    """
+    pdf_path, start, stop = job
+    with pdfplumber.open(pdf_path) as pdf:
+        return [pdf.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def extract_pages_parallel(
+    pdf_path: Path,
+    workers: Optional[int] = None,
+    min_pages: int = PARALLEL_MIN_PAGES,
+) -> List[str]:
+    """
+    Extracts pages across a process pool, one contiguous page range per worker,
+    and reassembles them in document order.
+    Small PDFs (fewer than `min_pages` pages) stay single-process.
+    Page-range workers rely on pdfplumber; other backends always run serially.
+    """
+    workers = workers or PARALLEL_WORKERS
+    if DOCUMENT_PDF_BACKEND != "pdfplumber" or workers < 2:
+        return extract_pages_from_pdf(pdf_path)
+    n_pages = count_pdf_pages(pdf_path)
+    if n_pages < min_pages:
+        return extract_pages_from_pdf(pdf_path)
+
+    workers = min(workers, n_pages)
+    bounds = [round(i * n_pages / workers) for i in range(workers + 1)]
+    jobs = [(str(pdf_path), bounds[i], bounds[i + 1]) for i in range(workers)]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = pool.map(_extract_page_range, jobs)  # map preserves job order
+        return [page for chunk in chunks for page in chunk]
+
 
 def extract_text_from_pdf(pdf_path: Path) -> str:
     """
-    Extracts text from a PDF file using pdfplumber.
+    Extracts text from a PDF file.
     Returns full text as a single string.
     """
-    text_content = []
+    return "\n".join(p for p in extract_pages_from_pdf(pdf_path) if p)
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text_content.append(page_text)
 
-    return "\n".join(text_content)
+def apply_budget(
+    pages: Iterable[str],
+    max_pages: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Re-yields pages until the page, char or token budget is reached.
+    The last page is truncated to fit; the upstream generator is closed
+    as soon as the budget is spent, which stops parsing.
+    """
+    budgets = [b for b in (max_chars, max_tokens * CHARS_PER_TOKEN if max_tokens else None) if b is not None]
+    char_budget = min(budgets) if budgets else None
+    used = 0
 
+    for page_no, text in enumerate(pages):
+        if max_pages is not None and page_no >= max_pages:
+            return
+        if char_budget is not None:
+            text = text[:char_budget - used]
+            used += len(text)
+        yield text
+        if char_budget is not None and used >= char_budget:
+            return
 
 
-def extract_document(doc_type: TypeDocument) -> str:
+def iter_pages(
+    source: Union[Path, BinaryIO],
+    max_pages: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> Iterator[str]:
     """
-    Extracts text from a health insurance document
-    based on its document type.
+    Yields page texts of a PDF (path or binary stream) as they are parsed
+    by the shared extraction engine, stopping early once the page / char /
+    token budget is reached.
+    """
+    pages = get_extraction_engine().iter_raw_pages(source, DOCUMENT_PDF_BACKEND)
+    try:
+        yield from apply_budget(pages, max_pages=max_pages, max_chars=max_chars, max_tokens=max_tokens)
+    finally:
+        pages.close()
+
+
+def iter_chunks(
+    source: Union[Path, BinaryIO],
+    chunk_chars: int = 2000,
+    max_pages: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Yields the text of a PDF in chunks of at most `chunk_chars` characters,
+    cut on line boundaries when possible, under the same budgets as iter_pages.
+    """
+    buffer = ""
+    for page_text in iter_pages(source, max_pages=max_pages, max_chars=max_chars, max_tokens=max_tokens):
+        if not page_text:
+            continue
+        buffer = f"{buffer}\n{page_text}" if buffer else page_text
+        while len(buffer) >= chunk_chars:
+            cut = buffer.rfind("\n", 0, chunk_chars)
+            cut = cut if cut > 0 else chunk_chars
+            yield buffer[:cut]
+            buffer = buffer[cut:].lstrip("\n")
+    if buffer:
+        yield buffer
+
+
+def document_path(doc_type: TypeDocument) -> Path:
+    """
+    Returns the on-disk path of a document type, checking it exists.
     """
     if doc_type not in DOCUMENT_PATHS:
         raise ValueError(f"Unsupported document type: {doc_type}")
@@ -45,5 +167,73 @@ def extract_document(doc_type: TypeDocument) -> str:
     if not pdf_path.exists():
         raise FileNotFoundError(f"Document not found at: {pdf_path}")
 
-    return extract_text_from_pdf(pdf_path)
+    return pdf_path
+
+
+def _fresh_snapshot(doc_type: TypeDocument, pdf_path: Path) -> Optional[CorpusSnapshot]:
+    """
+    Returns the prebuilt corpus snapshot if it holds this document
+    and the PDF has not changed since it was built.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None or snapshot.fingerprint(doc_type.value) is None:
+        return None
+    if snapshot.fingerprint(doc_type.value) != get_document_cache().fingerprint(pdf_path):
+        return None
+    return snapshot
+
+
+def extract_document_pages(doc_type: TypeDocument, use_cache: bool = True) -> List[str]:
+    """
+    Extracts the pages of a health insurance document
+    based on its document type.
+    Pages are served from the on-disk extraction cache unless the PDF changed.
+    """
+    pdf_path = document_path(doc_type)
+
+    if not use_cache:
+        return extract_pages_parallel(pdf_path)
+
+    snapshot = _fresh_snapshot(doc_type, pdf_path)
+    if snapshot is not None:
+        return snapshot.pages(doc_type.value)
+
+    return get_document_cache().get_or_extract(pdf_path, extract_pages_parallel)
+
+
+def iter_document_pages(
+    doc_type: TypeDocument,
+    max_pages: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Streams the pages of a health insurance document under a budget.
+    Documents in the snapshot or the cache are read from there, others are parsed lazily.
+    """
+    pdf_path = document_path(doc_type)
+
+    snapshot = _fresh_snapshot(doc_type, pdf_path)
+    if snapshot is not None:
+        pages = (snapshot.page_text(doc_type.value, i) for i in range(snapshot.num_pages(doc_type.value)))
+        yield from apply_budget(pages, max_pages=max_pages, max_chars=max_chars, max_tokens=max_tokens)
+        return
+
+    cache = get_document_cache()
+    sha = cache.fingerprint(pdf_path)
+
+    if cache.num_pages(sha) is not None:
+        pages = (cache.get_page(sha, i) or "" for i in range(cache.num_pages(sha)))
+        yield from apply_budget(pages, max_pages=max_pages, max_chars=max_chars, max_tokens=max_tokens)
+        return
+
+    yield from iter_pages(pdf_path, max_pages=max_pages, max_chars=max_chars, max_tokens=max_tokens)
+
+
+def extract_document(doc_type: TypeDocument, use_cache: bool = True) -> str:
+    """
+    Extracts text from a health insurance document
+    based on its document type.
+    """
+    return "\n".join(p for p in extract_document_pages(doc_type, use_cache=use_cache) if p)
 
@@ -1,14 +1,22 @@
 # security_layer.py
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Optional, List, Tuple
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, List, Sequence, Tuple, Iterator, Iterable, Union
+from multiprocessing import Pool
+import codecs
+import json
+import logging
+import os
+import time
 import re
 import io
+from itertools import chain as _chain
 
-try:
-    from PyPDF2 import PdfReader
-except Exception:
-    PdfReader = None
+from extraction_engine import ATTACHMENT_PDF_BACKEND, get_extraction_engine
+from tracing import span, traced
+
+# traces de debug (ex-print [SEC]) : désactivées par défaut, logging.DEBUG pour les voir
+log = logging.getLogger("assurai.security")
 
 
 # --- Regex PII FR utiles (hackathon) ---
@@ -19,15 +27,236 @@ RE_NIR_FR = re.compile(r"\b[12]\d{2}(?:0[1-9]|1[0-2])(?:\d{2}|2[ABab])\d{3}\d{3}
 RE_CARD = re.compile(r"\b(?:\d[ -]*?){13,19}\b")
 RE_POSTCODE_FR = re.compile(r"\b\d{5}\b")
 
-# Nom / prénom (patterns structurés, faibles faux positifs)
-RE_NOM_LABEL = re.compile(r"(?im)\bnom\s*:\s*[A-ZÀ-ÖØ-Ý][A-Za-zÀ-ÖØ-öø-ÿ' -]{1,40}\b")
-RE_PRENOM_LABEL = re.compile(r"(?im)\bpr[ée]nom\s*:\s*[A-ZÀ-ÖØ-Ý][A-Za-zÀ-ÖØ-öø-ÿ' -]{1,40}\b")
+# Nom / prénom (patterns structurés, faibles faux positifs). Le nom se termine
+# toujours par une lettre : jamais d'espace final avalé devant la PII suivante.
+RE_NOM_LABEL = re.compile(r"(?im)\bnom\s*:\s*[A-ZÀ-ÖØ-Ý][A-Za-zÀ-ÖØ-öø-ÿ' -]{0,39}[A-Za-zÀ-ÖØ-öø-ÿ]\b")
+RE_PRENOM_LABEL = re.compile(r"(?im)\bpr[ée]nom\s*:\s*[A-ZÀ-ÖØ-Ý][A-Za-zÀ-ÖØ-öø-ÿ' -]{0,39}[A-Za-zÀ-ÖØ-öø-ÿ]\b")
 
 # Civilités + Nom (ex: "Monsieur Dupont", "Mme Martin")
-RE_CIVILITE_NOM = re.compile(r"(?i)\b(m\.|mr|monsieur|mme|madame|mlle|mademoiselle)\s+[A-ZÀ-ÖØ-Ý][A-Za-zÀ-ÖØ-öø-ÿ' -]{1,40}\b")
+RE_CIVILITE_NOM = re.compile(r"(?i)\b(m\.|mr|monsieur|mme|madame|mlle|mademoiselle)\s+[A-ZÀ-ÖØ-Ý][A-Za-zÀ-ÖØ-öø-ÿ' -]{0,39}[A-Za-zÀ-ÖØ-öø-ÿ]\b")
 
 # "Je m'appelle Prénom Nom" (assez fiable)
-RE_JE_MAPPELLE = re.compile(r"(?i)\bje\s+m[' ]appelle\s+[A-ZÀ-ÖØ-Ý][A-Za-zÀ-ÖØ-öø-ÿ' -]{1,40}(?:\s+[A-ZÀ-ÖØ-Ý][A-Za-zÀ-ÖØ-öø-ÿ' -]{1,40})?\b")
+RE_JE_MAPPELLE = re.compile(r"(?i)\bje\s+m[' ]appelle\s+[A-ZÀ-ÖØ-Ý][A-Za-zÀ-ÖØ-öø-ÿ' -]{0,39}[A-Za-zÀ-ÖØ-öø-ÿ](?:\s+[A-ZÀ-ÖØ-Ý][A-Za-zÀ-ÖØ-öø-ÿ' -]{0,39}[A-Za-zÀ-ÖØ-öø-ÿ])?\b")
+
+
+# Règles dans l'ordre de priorité historique des substitutions : (label, regex, placeholder)
+PII_RULES: List[Tuple[str, re.Pattern, str]] = [
+    ("email", RE_EMAIL, "[EMAIL]"),
+    ("telephone", RE_PHONE_FR, "[TEL]"),
+    ("iban", RE_IBAN, "[IBAN]"),
+    ("nir", RE_NIR_FR, "[NIR]"),
+    ("carte_bancaire", RE_CARD, "[NUM_CARTE]"),
+    ("code_postal", RE_POSTCODE_FR, "[CODE_POSTAL]"),
+    ("nom", RE_NOM_LABEL, "Nom : [NOM]"),
+    ("prenom", RE_PRENOM_LABEL, "Prénom : [PRENOM]"),
+    ("nom", RE_CIVILITE_NOM, "[CIVILITE] [NOM]"),
+    ("nom_prenom", RE_JE_MAPPELLE, "Je m'appelle [PRENOM] [NOM]"),
+]
+
+# Longueur max raisonnable d'une PII : fenêtre de recherche des conflits de priorité
+PII_MAX_SPAN = 128
+
+
+def _scoped(pattern: re.Pattern) -> str:
+    """
+    Source de la regex avec ses flags globaux ramenés en flags locaux (?i:...),
+    sans le \\b de tête (commun à toutes les règles, factorisé plus bas).
+    """
+    src = pattern.pattern
+    m = re.match(r"\(\?([aiLmsux]+)\)", src)
+    flags = set(m.group(1)) if m else set()
+    if m:
+        src = src[m.end():]
+    if pattern.flags & re.IGNORECASE:
+        flags.add("i")
+    flags &= {"i", "s", "x"}  # 'm' sans effet : aucune règle n'utilise ^ ou $
+    if not src.startswith(r"\b"):
+        raise ValueError(f"PII rule must start with \\b: {pattern.pattern}")
+    src = src[2:]
+    return f"(?{''.join(sorted(flags))}:{src})" if flags else f"(?:{src})"
+
+
+# Premier caractère possible de chaque règle (après le \b). Deux règles de classes
+# disjointes ne peuvent pas matcher à la même position : on peut donc les regrouper
+# derrière un seul test de caractère sans changer la priorité. Absente = tout caractère.
+_CHIFFRE = r"[\d+]"
+_LETTRE = r"[^\W\d_]"
+PII_FIRST_CHAR = {
+    RE_PHONE_FR: _CHIFFRE,
+    RE_NIR_FR: _CHIFFRE,
+    RE_CARD: _CHIFFRE,
+    RE_POSTCODE_FR: _CHIFFRE,
+    RE_IBAN: _LETTRE,
+    RE_NOM_LABEL: _LETTRE,
+    RE_PRENOM_LABEL: _LETTRE,
+    RE_CIVILITE_NOM: _LETTRE,
+    RE_JE_MAPPELLE: _LETTRE,
+}
+
+
+def _alternation(rules: List[Tuple[str, re.Pattern, str]]) -> re.Pattern:
+    """
+    Alternance nommée (r0, r1, ...) des règles, avec le \b commun factorisé
+    (les positions en milieu de mot sont rejetées en un seul test).
+    """
+    blocks: List[Tuple[Optional[str], List[str]]] = []
+    open_groups: dict = {}
+    for i, (_, rx, _) in enumerate(rules):
+        alt = f"(?P<r{i}>{_scoped(rx)})"
+        first = PII_FIRST_CHAR.get(rx)
+        if first is None:
+            open_groups = {}  # on ne regroupe pas par-dessus une règle "tout caractère"
+            blocks.append((None, [alt]))
+        elif first in open_groups:
+            open_groups[first].append(alt)
+        else:
+            open_groups[first] = [alt]
+            blocks.append((first, open_groups[first]))
+    body = "|".join(alts[0] if first is None else f"(?={first})(?:{'|'.join(alts)})" for first, alts in blocks)
+    return re.compile(r"\b(?:" + body + ")")
+
+
+# Une seule regex : une alternative nommée par règle, dans l'ordre de priorité
+RE_PII_ALL = _alternation(PII_RULES)
+# RE_PII_PRIORITAIRES[k] : uniquement les règles plus prioritaires que la règle k
+RE_PII_PRIORITAIRES = [None] + [_alternation(PII_RULES[:k]) for k in range(1, len(PII_RULES))]
+
+
+def scan_pii(text: str, pos: int = 0, endpos: Optional[int] = None) -> List[Tuple[int, int, int]]:
+    """
+    Trouve toutes les PII en une passe : liste de (début, fin, index de règle).
+
+    À une position donnée, l'alternance essaie les règles dans l'ordre de
+    priorité. Si une règle moins prioritaire l'emporte parce qu'elle commence
+    plus tôt, mais qu'une règle prioritaire démarre à l'intérieur de son match,
+    on coupe : la règle prioritaire gagne (comme avec les substitutions
+    successives) et le début est ré-analysé seul.
+    """
+    endpos = len(text) if endpos is None else endpos
+    spans: List[Tuple[int, int, int]] = []
+    while pos < endpos:
+        m = RE_PII_ALL.search(text, pos, endpos)
+        if m is None:
+            break
+        rule = int(m.lastgroup[1:])
+        start, end = m.span()
+
+        cut = end
+        if rule:
+            h = RE_PII_PRIORITAIRES[rule].search(text, start + 1, min(endpos, end + PII_MAX_SPAN))
+            if h is not None and h.start() < end:
+                cut = h.start()
+
+        if cut < end:
+            spans.extend(scan_pii(text, start, cut))
+            pos = cut
+        else:
+            spans.append((start, end, rule))
+            pos = end
+    return spans
+
+
+# Pseudonymisation réversible : type de jeton par règle, et préfixe laissé en clair
+# (libellé "Nom :", civilité, "je m'appelle") devant la valeur mise au coffre.
+PSEUDO_RULES: List[Tuple[str, Optional[re.Pattern]]] = [
+    ("EMAIL", None),
+    ("TEL", None),
+    ("IBAN", None),
+    ("NIR", None),
+    ("NUM_CARTE", None),
+    ("CODE_POSTAL", None),
+    ("NOM", re.compile(r"(?i)nom\s*:\s*")),
+    ("PRENOM", re.compile(r"(?i)pr[ée]nom\s*:\s*")),
+    ("NOM", re.compile(r"(?i)(?:m\.|mr|monsieur|mme|madame|mlle|mademoiselle)\s+")),
+    ("NOM", re.compile(r"(?i)je\s+m[' ]appelle\s+")),
+]
+PSEUDO_TOKEN_MAX_LEN = 24
+RE_PSEUDO_TOKEN = re.compile(r"\[(?:EMAIL|TEL|IBAN|NIR|NUM_CARTE|CODE_POSTAL|NOM|PRENOM)_\d+\]")
+
+
+class PseudonymVault:
+    """
+    Coffre de pseudonymisation d'une session : jeton indexé ([EMAIL_1], [NOM_2]...)
+    <-> valeur d'origine, dans les deux sens en O(1). Une même valeur garde le même
+    jeton pendant toute la session.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, str] = {}
+        self._tokens: Dict[Tuple[str, str], str] = {}
+        self._counters: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def token_for(self, kind: str, value: str) -> str:
+        token = self._tokens.get((kind, value))
+        if token is None:
+            self._counters[kind] = self._counters.get(kind, 0) + 1
+            token = f"[{kind}_{self._counters[kind]}]"
+            self._tokens[(kind, value)] = token
+            self._values[token] = value
+        return token
+
+    def get(self, token: str) -> Optional[str]:
+        return self._values.get(token)
+
+    def rehydrate(self, text: str) -> str:
+        """Remet les valeurs d'origine, en une seule passe linéaire sur le texte."""
+        if not self._values or not text:
+            return text
+        return RE_PSEUDO_TOKEN.sub(lambda m: self._values.get(m.group(0), m.group(0)), text)
+
+    def rehydrate_stream(self, deltas: Iterable[str]) -> Iterator[str]:
+        """
+        rehydrate() sur un flux de deltas : un jeton coupé entre deux deltas
+        ("[NO" puis "M_1]") est retenu jusqu'à ce qu'il soit complet.
+        """
+        pending = ""
+        for delta in deltas:
+            pending += delta
+            cut = pending.rfind("[")
+            if cut != -1 and "]" not in pending[cut:] and len(pending) - cut <= PSEUDO_TOKEN_MAX_LEN:
+                ready, pending = pending[:cut], pending[cut:]
+            else:
+                ready, pending = pending, ""
+            if ready:
+                yield self.rehydrate(ready)
+        if pending:
+            yield self.rehydrate(pending)
+
+
+def _replacement(rule: int, matched: str, vault: Optional[PseudonymVault]) -> str:
+    if vault is None:
+        return PII_RULES[rule][2]
+    kind, prefix = PSEUDO_RULES[rule]
+    m = prefix.match(matched) if prefix else None
+    head = matched[:m.end()] if m else ""
+    return head + vault.token_for(kind, matched[len(head):])
+
+
+def _redact_counts(text: str, vault: Optional[PseudonymVault] = None) -> Tuple[str, Dict[str, int]]:
+    """
+    Un scan, puis une reconstruction ; renvoie aussi le nombre d'occurrences par label.
+    Avec un coffre, les PII sont remplacées par des jetons indexés réversibles.
+    """
+    parts: List[str] = []
+    counts: Dict[str, int] = {}
+    last = 0
+    for start, end, rule in scan_pii(text):
+        label = PII_RULES[rule][0]
+        parts.append(text[last:start])
+        parts.append(_replacement(rule, text[start:end], vault))
+        counts[label] = counts.get(label, 0) + 1
+        last = end
+    parts.append(text[last:])
+    return "".join(parts), counts
+
+
+def _redact(text: str) -> Tuple[str, List[str]]:
+    """Cœur de redact_pii (sans log)."""
+    redacted, counts = _redact_counts(text)
+    return redacted, sorted(counts)
 
 
 @dataclass
@@ -39,29 +268,115 @@ class SafePayload:
 
 
 def redact_pii(text: str) -> Tuple[str, List[str]]:
-    found: List[str] = []
+    t, found = _redact(text)
+    log.debug("redact_pii | found=%s", found)
+    return t, found
 
-    def sub(pattern: re.Pattern, repl: str, label: str, s: str) -> str:
-        if pattern.search(s):
-            found.append(label)
-        return pattern.sub(repl, s)
 
+def pseudonymize_pii(text: str, vault: PseudonymVault) -> Tuple[str, List[str]]:
+    """Comme redact_pii, avec des jetons indexés enregistrés dans le coffre."""
+    t, counts = _redact_counts(text, vault)
+    return t, sorted(counts)
+
+
+def _redact_pii_sequential(text: str) -> Tuple[str, List[str]]:
+    """
+    Implémentation historique (une search + une sub par règle), conservée comme
+    référence pour vérifier l'équivalence et mesurer le gain du scan unique.
+    """
+    found: List[str] = []
     t = text
-    t = sub(RE_EMAIL, "[EMAIL]", "email", t)
-    t = sub(RE_PHONE_FR, "[TEL]", "telephone", t)
-    t = sub(RE_IBAN, "[IBAN]", "iban", t)
-    t = sub(RE_NIR_FR, "[NIR]", "nir", t)
-    t = sub(RE_CARD, "[NUM_CARTE]", "carte_bancaire", t)
-    t = sub(RE_POSTCODE_FR, "[CODE_POSTAL]", "code_postal", t)
+    for label, pattern, repl in PII_RULES:
+        if pattern.search(t):
+            found.append(label)
+        t = pattern.sub(repl, t)
+    return t, sorted(set(found))
 
-    t = sub(RE_NOM_LABEL, "Nom : [NOM]", "nom", t)
-    t = sub(RE_PRENOM_LABEL, "Prénom : [PRENOM]", "prenom", t)
-    t = sub(RE_CIVILITE_NOM, "[CIVILITE] [NOM]", "nom", t)
-    t = sub(RE_JE_MAPPELLE, "Je m'appelle [PRENOM] [NOM]", "nom_prenom", t)
 
+# Rédaction en flux : taille des morceaux lus et fenêtre gardée entre deux morceaux
+STREAM_CHUNK_CHARS = 4096
+STREAM_OVERLAP = 2 * PII_MAX_SPAN
 
-    print(f"[SEC] redact_pii | found={sorted(set(found))}")
-    return t, sorted(set(found))
+
+class StreamingRedactor:
+    """
+    Rédaction en flux, morceau par morceau, à mémoire bornée.
+
+    La fin de chaque tampon (STREAM_OVERLAP caractères) est gardée pour le
+    morceau suivant, ainsi qu'une PII qui chevaucherait la coupure (IBAN,
+    téléphone...) : elle est rédigée une fois entière. La coupure se fait sur
+    un espace pour ne pas créer de fausse frontière de mot.
+    """
+
+    def __init__(self, overlap: int = STREAM_OVERLAP, vault: Optional[PseudonymVault] = None):
+        self.overlap = overlap
+        self.vault = vault
+        self.pii_found: set = set()
+        self._carry = ""
+
+    def feed(self, chunk: str) -> str:
+        """Ajoute un morceau ; renvoie la partie rédigée désormais définitive."""
+        buf = self._carry + chunk
+        limit = len(buf) - self.overlap
+        if limit <= 0:
+            self._carry = buf
+            return ""
+
+        cut = max(buf.rfind(" ", 0, limit), buf.rfind("\n", 0, limit))
+        if cut <= 0:
+            cut = limit
+
+        parts: List[str] = []
+        last = 0
+        for start, end, rule in scan_pii(buf):
+            if end > cut:
+                cut = min(cut, start)  # PII à cheval : reportée entière au tour suivant
+                break
+            parts.append(buf[last:start])
+            parts.append(_replacement(rule, buf[start:end], self.vault))
+            self.pii_found.add(PII_RULES[rule][0])
+            last = end
+        parts.append(buf[last:cut])
+        self._carry = buf[cut:]
+        return "".join(parts)
+
+    def flush(self) -> str:
+        """Rédige et renvoie ce qui reste en tampon."""
+        redacted, counts = _redact_counts(self._carry, self.vault)
+        self.pii_found.update(counts)
+        self._carry = ""
+        return redacted
+
+
+def iter_redact_chunks(chunks: Iterable[str], redactor: Optional[StreamingRedactor] = None) -> Iterator[str]:
+    """Émet les morceaux rédigés au fil de l'eau (labels trouvés dans redactor.pii_found)."""
+    redactor = redactor or StreamingRedactor()
+    for chunk in chunks:
+        out = redactor.feed(chunk)
+        if out:
+            yield out
+    tail = redactor.flush()
+    if tail:
+        yield tail
+
+
+def iter_text_chunks(text: str, size: int = STREAM_CHUNK_CHARS) -> Iterator[str]:
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+def take_chars(chunks: Iterable[str], max_chars: int) -> str:
+    """Concatène les morceaux jusqu'à max_chars, puis arrête de consommer le flux."""
+    out: List[str] = []
+    used = 0
+    for chunk in chunks:
+        out.append(chunk[:max_chars - used])
+        used += len(out[-1])
+        if used >= max_chars:
+            break
+    if hasattr(chunks, "close"):
+        chunks.close()
+    return "".join(out)
 
 
 def should_block(pii_found: List[str]) -> Tuple[bool, Optional[str]]:
@@ -74,27 +389,35 @@ def should_block(pii_found: List[str]) -> Tuple[bool, Optional[str]]:
     return False, None
 
 
+def iter_pdf_pages(file_bytes: bytes, max_pages: int = 2, max_chars: int = 3000) -> Iterator[str]:
+    """
+    Génère le texte des pages non vides d'un PDF, au fil du parsing.
+    S'arrête dès que `max_pages` pages sont lues ou que `max_chars` caractères
+    (hors espaces de tête) sont réunis : les pages suivantes ne sont pas parsées.
+    """
+    return get_extraction_engine().iter_pages(
+        file_bytes, ATTACHMENT_PDF_BACKEND, max_pages=max_pages, max_chars=max_chars
+    )
+
+
+@traced("attachment_extraction")
 def extract_text_from_file(file_bytes: bytes, file_name: str, max_pages: int = 2, max_chars: int = 3000) -> str:
     name = (file_name or "").lower()
-    print(f"[SEC] extract_text_from_file | file={name} | bytes={len(file_bytes)} | PdfReader={'OK' if PdfReader else 'None'}")
+    engine = get_extraction_engine()
+    backend_ok = engine.available(ATTACHMENT_PDF_BACKEND)
+    log.debug("extract_text_from_file | file=%s | bytes=%d | %s=%s", name, len(file_bytes), ATTACHMENT_PDF_BACKEND, "OK" if backend_ok else "None")
 
 
     if name.endswith(".txt"):
         return file_bytes.decode("utf-8", errors="ignore")[:max_chars]
 
     if name.endswith(".pdf"):
-        if PdfReader is None:
-            return "[PDF non lu: PyPDF2 non installé]"
+        if not backend_ok:
+            return f"[PDF non lu: {ATTACHMENT_PDF_BACKEND} non installé]"
         try:
-            reader = PdfReader(io.BytesIO(file_bytes))
-            chunks = []
-            for p in reader.pages[:max_pages]:
-                page_text = p.extract_text() or ""
-                if page_text.strip():
-                    chunks.append(page_text)
-            joined = "\n".join(chunks).strip()
-            print(f"[SEC] pdf_extract | chars={len(joined)} | pages_used={min(max_pages, len(reader.pages))}")
-            return joined[:max_chars] if joined else "[PDF lu mais texte vide]"
+            result = engine.extract_text(file_bytes, ATTACHMENT_PDF_BACKEND, max_pages=max_pages, max_chars=max_chars)
+            log.debug("pdf_extract | chars=%d | pages_used=%d | cached=%s", len(result.text), result.pages_used, result.cached)
+            return result.text if result.text else "[PDF lu mais texte vide]"
         except Exception:
             return "[PDF non lu: erreur extraction]"
 
@@ -105,21 +428,273 @@ def extract_text_from_file(file_bytes: bytes, file_name: str, max_pages: int = 2
     return "[Pièce jointe non supportée]"
 
 
+def iter_attachment_text(
+    file_bytes: bytes,
+    file_name: str,
+    max_pages: Optional[int] = None,
+    chunk_chars: int = STREAM_CHUNK_CHARS,
+) -> Iterator[str]:
+    """
+    Texte d'une pièce jointe, morceau par morceau (pages PDF, blocs de texte),
+    sans limite de taille : c'est au consommateur d'arrêter le flux.
+    """
+    name = (file_name or "").lower()
+
+    if name.endswith(".txt"):
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        for i in range(0, len(file_bytes), chunk_chars):
+            yield decoder.decode(file_bytes[i:i + chunk_chars])
+        yield decoder.decode(b"", final=True)
+        return
+
+    if name.endswith(".pdf"):
+        if not get_extraction_engine().available(ATTACHMENT_PDF_BACKEND):
+            yield f"[PDF non lu: {ATTACHMENT_PDF_BACKEND} non installé]"
+            return
+        try:
+            n = 0
+            for page_text in iter_pdf_pages(file_bytes, max_pages=max_pages or 10**9, max_chars=10**18):
+                yield page_text if n == 0 else "\n" + page_text
+                n += 1
+        except Exception:
+            yield "[PDF non lu: erreur extraction]"
+            return
+        if n == 0:
+            yield "[PDF lu mais texte vide]"
+        return
+
+    if name.endswith((".png", ".jpg", ".jpeg")):
+        yield "[Image fournie: OCR désactivé en démo]"
+        return
+
+    yield "[Pièce jointe non supportée]"
+
+
+@traced("redaction")
 def prepare_safe_payload(
     user_message: str,
     file_bytes: Optional[bytes] = None,
     file_name: Optional[str] = None,
     hard_block: bool = False,
     max_chars: int = 8000,
+    attachment_max_chars: int = 3000,
+    attachment_max_pages: int = 2,
+    vault: Optional[PseudonymVault] = None,
 ) -> SafePayload:
-    base = (user_message or "").strip()[:max_chars]
+    # Rédaction en flux puis troncature : une coupure ne peut plus tomber au
+    # milieu d'une PII encore en clair.
+    # Avec un coffre de session, les PII deviennent des jetons indexés réversibles.
+    redactor = StreamingRedactor(vault=vault)
+    redacted = take_chars(
+        iter_redact_chunks(iter_text_chunks((user_message or "").strip()), redactor),
+        max_chars,
+    )
 
     if file_bytes and file_name:
-        extracted = extract_text_from_file(file_bytes, file_name)
-        base = base + f"\n\n[EXTRAIT_PIECE_JOINTE: {file_name}]\n" + extracted
+        log.debug("attachment_stream | file=%s | bytes=%d", file_name.lower(), len(file_bytes))
+        header = f"\n\n[EXTRAIT_PIECE_JOINTE: {file_name}]\n"
+        attachment_redactor = StreamingRedactor(vault=vault)
+        with span("attachment_extraction", bytes=len(file_bytes)):  # extraction en flux + rédaction
+            redacted += take_chars(
+                iter_redact_chunks(
+                    _chain([header], iter_attachment_text(file_bytes, file_name, max_pages=attachment_max_pages)),
+                    attachment_redactor,
+                ),
+                len(header) + attachment_max_chars,
+            )
+        redactor.pii_found |= attachment_redactor.pii_found
 
-    redacted, pii = redact_pii(base)
+    pii = sorted(redactor.pii_found)
+    log.debug("redact_pii | found=%s", pii)
 
     blocked, reason = (should_block(pii) if hard_block else (False, None))
-    print(f"[SEC] prepare_safe_payload | pii_found={pii} | blocked={blocked} | text_len={len(redacted)}")
+    log.debug("prepare_safe_payload | pii_found=%s | blocked=%s | text_len=%d", pii, blocked, len(redacted))
     return SafePayload(text=redacted, pii_found=pii, blocked=blocked, block_reason=reason)
+
+
+# --- Rédaction par lots (exports historiques, JSONL) ---
+@dataclass
+class BatchStats:
+    records: int = 0
+    chars: int = 0
+    records_with_pii: int = 0
+    pii_counts: Dict[str, int] = field(default_factory=dict)
+    errors: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def records_per_sec(self) -> float:
+        return self.records / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (f"records={self.records} | with_pii={self.records_with_pii} | errors={self.errors} | chars={self.chars} | "
+                f"{self.records_per_sec:.0f} records/s | pii={dict(sorted(self.pii_counts.items()))}")
+
+
+Record = Union[str, Dict[str, Any]]
+
+# Clés d'identifiant (id, request_id, claim_no, dossierRef...) : laissées telles quelles
+# par défaut, sinon "75012" ou un numéro de sinistre deviennent [CODE_POSTAL] / [NUM_CARTE].
+# Une clé qui nomme aussi une coordonnée (phone_no, iban_ref...) reste rédigée.
+RE_ID_KEY = re.compile(r"(?i:(?:^|[_.-])(?:id|uuid|no|num|number|numero|ref|reference))$|[a-z](?:Id|Uuid|No|Num|Number|Ref)$")
+RE_PII_KEY = re.compile(r"(?i)tel|phone|mobile|portable|fax|iban|bic|rib|carte|card|nir|secu|ssn|mail|adresse|address")
+PII_FOUND_KEY = "pii_found"
+
+
+def is_id_key(key: Any) -> bool:
+    return isinstance(key, str) and bool(RE_ID_KEY.search(key)) and not RE_PII_KEY.search(key)
+
+
+def _redact_value(value: Any, counts: Dict[str, int]) -> Tuple[Any, int]:
+    """
+    Rédige une valeur JSON : textes, et récursivement objets et listes imbriqués
+    (sauf les clés d'identifiant, voir is_id_key).
+    """
+    if isinstance(value, str):
+        redacted, found = _redact_counts(value)
+        for label, n in found.items():
+            counts[label] = counts.get(label, 0) + n
+        return redacted, len(value)
+    if isinstance(value, dict):
+        out, chars = {}, 0
+        for key, item in value.items():
+            if is_id_key(key):
+                out[key] = item
+                continue
+            out[key], n = _redact_value(item, counts)
+            chars += n
+        return out, chars
+    if isinstance(value, (list, tuple)):
+        out, chars = [], 0
+        for item in value:
+            redacted, n = _redact_value(item, counts)
+            out.append(redacted)
+            chars += n
+        return out, chars
+    return value, 0
+
+
+def _redact_record(
+    job: Tuple[Record, Optional[Sequence[str]], str],
+) -> Tuple[Optional[Record], Dict[str, int], int, Optional[str]]:
+    """
+    Worker : rédige un message (str) ou les champs d'un enregistrement, objets et
+    listes imbriqués compris. Sans liste de champs, tous les champs sauf les
+    identifiants sont parcourus ; la liste des labels trouvés est ajoutée sous
+    `pii_key`. Renvoie (enregistrement, comptes, caractères, erreur) : un
+    enregistrement refusé vaut None, avec la raison (comptée par redact_batch).
+    """
+    record, text_fields, pii_key = job
+    counts: Dict[str, int] = {}
+    if isinstance(record, str):
+        redacted, chars = _redact_value(record, counts)
+        return redacted, counts, chars, None
+    if not isinstance(record, dict):
+        return None, {}, 0, "ni texte ni objet JSON"
+    if pii_key in record:
+        return None, {}, 0, f'champ "{pii_key}" déjà présent'
+
+    out = dict(record)
+    chars = 0
+    for key, value in record.items():
+        if key not in text_fields if text_fields is not None else is_id_key(key):
+            continue
+        out[key], n = _redact_value(value, counts)
+        chars += n
+    out[pii_key] = sorted(counts)
+    return out, counts, chars, None
+
+
+def redact_batch(
+    records: Iterable[Record],
+    text_fields: Optional[Sequence[str]] = None,
+    processes: Optional[int] = None,
+    chunksize: int = 64,
+    stats: Optional[BatchStats] = None,
+    pii_key: str = PII_FOUND_KEY,
+) -> Iterator[Record]:
+    """
+    Rédige un flux de messages ou d'enregistrements sur un pool de processus.
+    Les sorties sont émises dans l'ordre d'entrée ; `stats` est mis à jour au fil
+    de l'eau (comptes par label, débit). text_fields=None : tous les champs sauf
+    les identifiants (is_id_key). Un enregistrement qui n'est ni un texte ni un
+    objet, ou qui a déjà un champ `pii_key`, n'est pas émis : il est compté dans
+    stats.errors. processes=1 : pas de pool.
+    """
+    stats = stats if stats is not None else BatchStats()
+    processes = processes or os.cpu_count() or 1
+    jobs = ((r, text_fields, pii_key) for r in records)
+    t0 = time.perf_counter()
+
+    def account(result: Tuple[Optional[Record], Dict[str, int], int, Optional[str]]) -> Optional[Record]:
+        record, counts, chars, error = result
+        stats.elapsed = time.perf_counter() - t0
+        if record is None:
+            stats.errors += 1
+            log.warning("redact_batch | enregistrement ignoré : %s", error)
+            return None
+        stats.records += 1
+        stats.chars += chars
+        if counts:
+            stats.records_with_pii += 1
+        for label, n in counts.items():
+            stats.pii_counts[label] = stats.pii_counts.get(label, 0) + n
+        stats.elapsed = time.perf_counter() - t0
+        return record
+
+    if processes == 1:
+        for job in jobs:
+            record = account(_redact_record(job))
+            if record is not None:
+                yield record
+        return
+
+    with Pool(processes) as pool:
+        for result in pool.imap(_redact_record, jobs, chunksize=chunksize):
+            record = account(result)
+            if record is not None:
+                yield record
+
+
+def redact_jsonl(
+    in_path: str,
+    out_path: str,
+    text_fields: Optional[Sequence[str]] = None,
+    processes: Optional[int] = None,
+    pii_key: str = PII_FOUND_KEY,
+) -> BatchStats:
+    """
+    Rédige un fichier JSONL ligne à ligne vers un autre fichier JSONL. Les lignes
+    illisibles ou qui ne sont pas des objets sont écartées et comptées dans errors.
+    """
+    stats = BatchStats()
+
+    def parse(lines: Iterable[str]) -> Iterator[Any]:
+        for n, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                log.warning("redact_jsonl | ligne %d ignorée : JSON invalide", n)
+                yield None  # compté en erreur par redact_batch
+
+    with open(in_path, "r", encoding="utf-8") as src, open(out_path, "w", encoding="utf-8") as dst:
+        records = parse(src)
+        for record in redact_batch(records, text_fields=text_fields, processes=processes, stats=stats, pii_key=pii_key):
+            dst.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rédaction PII d'un export JSONL")
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--fields", nargs="*", default=None, help="champs à rédiger (défaut : tous sauf les identifiants)")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    result = redact_jsonl(args.input, args.output, text_fields=args.fields, processes=args.processes)
+    print(f"[SEC] redact_jsonl | {result.summary()}")
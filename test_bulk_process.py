@@ -0,0 +1,43 @@
+# test_bulk_process.py
+import asyncio
+import json
+import tempfile
+from pathlib import Path
+
+from bulk_process import run_bulk
+from local_backend import install
+
+if __name__ == "__main__":
+    install(latency=0.01)
+    with tempfile.TemporaryDirectory() as tmp:
+        src, out = Path(tmp) / "in.jsonl", Path(tmp) / "out.jsonl"
+        with open(src, "w", encoding="utf-8") as f:
+            for i in range(30):
+                f.write(json.dumps({"id": f"R{i}", "message": f"Demande {i} : je n'ai pas été remboursé."}) + "\n")
+
+        stats = asyncio.run(run_bulk(src, out, concurrency=4, mode="parallel", progress_every=0))
+        print(stats.summary())
+        assert stats.processed == 30
+
+        # arrêt brutal simulé : 10 lignes complètes + une ligne tronquée
+        lines = out.read_text(encoding="utf-8").splitlines(keepends=True)
+        out.write_text("".join(lines[:10]) + lines[10][:25], encoding="utf-8")
+
+        stats = asyncio.run(run_bulk(src, out, concurrency=4, progress_every=0))
+        print(stats.summary())
+        ids = [json.loads(line)["id"] for line in out.read_text(encoding="utf-8").splitlines()]
+        assert stats.skipped == 10 and stats.processed == 20
+        assert sorted(ids) == sorted(f"R{i}" for i in range(30))
+
+        # reprise après erreur : l'id en erreur est retenté, sa ligne d'erreur disparaît
+        lines = out.read_text(encoding="utf-8").splitlines(keepends=True)
+        failed = json.loads(lines[5])["id"]
+        lines[5] = json.dumps({"id": failed, "error": "RateLimitError: 429"}) + "\n"
+        out.write_text("".join(lines), encoding="utf-8")
+
+        stats = asyncio.run(run_bulk(src, out, concurrency=4, progress_every=0))
+        print(stats.summary())
+        records = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+        assert stats.skipped == 29 and stats.processed == 1
+        assert sorted(r["id"] for r in records) == sorted(f"R{i}" for i in range(30))
+        assert not any("error" in r for r in records)
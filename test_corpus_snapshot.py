@@ -0,0 +1,42 @@
+# test_corpus_snapshot.py
+import os
+import tempfile
+from pathlib import Path
+
+from corpus_snapshot import CorpusSnapshot, build_snapshot, get_snapshot
+from project_types import TypeDocument
+from retrieve_document import extract_document_pages
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "corpus.snap"
+        header = build_snapshot(path)
+        print("documents:", list(header["documents"]), "| bytes:", path.stat().st_size)
+
+        snap = CorpusSnapshot(path)
+        doc = TypeDocument.NOTICE_INFORMATION.value
+        view = snap.page_bytes(doc, 0)
+        print("page 0:", type(view).__name__, len(view), "octets")
+        assert isinstance(view, memoryview)
+        view.release()
+        assert snap.pages(doc) == extract_document_pages(TypeDocument.NOTICE_INFORMATION, use_cache=False)
+
+        index = snap.index_data()
+        print("passages indexés:", len(index["passages"]))
+        snap.close()
+
+        # reconstruction : le snapshot partagé est remplacé et l'ancien fermé
+        first = get_snapshot(path)
+        assert get_snapshot(path) is first
+        held = first.page_bytes(doc, 0)  # tranche encore détenue par un appelant
+        build_snapshot(path)
+        os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1_000_000))
+        second = get_snapshot(path)
+        assert second is not first and first._file.closed and not first._mm.closed
+        held.release()
+        build_snapshot(path)
+        os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 2_000_000))
+        third = get_snapshot(path)
+        assert third is not second and second._file.closed and second._mm.closed
+        print("snapshot reconstruit : ancien mmap fermé")
+        third.close()
@@ -0,0 +1,76 @@
+# test_document_cache.py
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from document_cache import DocumentCache
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        cache = DocumentCache(cache_dir=tmp / "cache", max_bytes=40)
+
+        doc_a = tmp / "a.pdf"
+        doc_b = tmp / "b.pdf"
+        doc_a.write_bytes(b"contenu A")
+        doc_b.write_bytes(b"contenu B")
+
+        calls = []
+
+        def fake_extract(path: Path):
+            calls.append(path.name)
+            return [f"{path.name} page 1", f"{path.name} page 2"]
+
+        # 1) miss puis hit sur le même fichier
+        print("pages:", cache.get_or_extract(doc_a, fake_extract))
+        cache.get_or_extract(doc_a, fake_extract)
+        print("calls:", calls, "| stats:", cache.stats.as_dict())
+        assert calls == ["a.pdf"]
+
+        # 2) fichier modifié => nouvelle extraction
+        time.sleep(0.01)
+        doc_a.write_bytes(b"contenu A modifie")
+        cache.get_or_extract(doc_a, fake_extract)
+        print("calls after change:", calls)
+        assert calls == ["a.pdf", "a.pdf"]
+
+        # 3) éviction LRU (max_bytes=40 => une seule entrée tient)
+        cache.get_or_extract(doc_b, fake_extract)
+        print("entries:", len(cache._index["entries"]), "| bytes:", cache.total_bytes(), "| stats:", cache.stats.as_dict())
+        assert cache.total_bytes() <= 40
+
+        # 4) le cache survit à un redémarrage
+        reopened = DocumentCache(cache_dir=tmp / "cache", max_bytes=40)
+        reopened.get_or_extract(doc_b, fake_extract)
+        print("reopened stats:", reopened.stats.as_dict())
+        assert reopened.stats.hits == 1
+
+        # 5) un hit n'écrit pas l'index ; l'ordre LRU est écrit à la fermeture
+        index_path = tmp / "cache" / "index.json"
+        before = index_path.read_bytes()
+        sha_b = reopened.fingerprint(doc_b)
+        reopened.get_or_extract(doc_b, fake_extract)
+        assert index_path.read_bytes() == before
+        reopened.close()
+        last_access = json.loads(index_path.read_text(encoding="utf-8"))["entries"][sha_b]["last_access"]
+        assert last_access == reopened._index["entries"][sha_b]["last_access"]
+
+        # 6) écritures concurrentes de l'index (deux instances, plusieurs threads) et compteurs
+        other = DocumentCache(cache_dir=tmp / "cache", max_bytes=40)
+
+        def hammer(c: DocumentCache):
+            for _ in range(50):
+                c.get_or_extract(doc_b, fake_extract)
+                c._save_index()
+
+        threads = [threading.Thread(target=hammer, args=(c,)) for c in (reopened, other) * 2]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        print("concurrent stats:", reopened.stats.as_dict(), other.stats.as_dict())
+        assert not list((tmp / "cache").glob("*.tmp"))
+        assert reopened.stats.hits + reopened.stats.misses == 2 + 100 and other.stats.hits == 100
+        assert json.loads(index_path.read_text(encoding="utf-8"))["version"] == 1
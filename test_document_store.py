@@ -0,0 +1,82 @@
+# test_document_store.py
+import os
+import tempfile
+from pathlib import Path
+
+TMP = tempfile.TemporaryDirectory()
+os.environ["GARANTIES_TABLE_PATH"] = str(Path(TMP.name) / "garanties.json")
+
+import document_store
+from document_store import DocumentStore, LocalFilesystemBackend
+from project_types import TypeDocument
+
+TABLEAU = """TABLEAU DES GARANTIES
+SOINS COURANTS
+Consultations et visites spécialistes 150 % BR
+"""
+
+
+class FakeBackend(LocalFilesystemBackend):
+    """Backend fichiers, mais sans parsing PDF : une page = le contenu du fichier (sauf vrais PDF)."""
+
+    def read_pages(self, path: Path):
+        if path.read_bytes().startswith(b"%PDF"):
+            return super().read_pages(path)
+        return [path.read_text()]
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        shared = {TypeDocument.CONTRAT: tmp / "commun" / "contrat.pdf"}
+        shared[TypeDocument.CONTRAT].parent.mkdir()
+        shared[TypeDocument.CONTRAT].write_text("contrat commun " * 50)
+
+        (tmp / "adherents" / "USER_002").mkdir(parents=True)
+        (tmp / "adherents" / "USER_002" / "contrat.pdf").write_text("contrat propre à USER_002 " * 50)
+
+        store = DocumentStore(FakeBackend(root=tmp / "adherents", shared=shared), max_bytes=2000)
+
+        # USER_001 et USER_003 n'ont pas de contrat propre => même PDF, une seule copie
+        a = store.get_pages("USER_001", TypeDocument.CONTRAT)
+        b = store.get_pages("USER_003", TypeDocument.CONTRAT)
+        print("dedup:", a is b, store.stats())
+        assert a is b and store.stats()["resident_blobs"] == 1
+
+        # USER_002 a son propre contrat ; le plafond mémoire évince le plus ancien
+        c = store.get_pages("USER_002", TypeDocument.CONTRAT)
+        print("own:", c[0][:30], "|", store.stats())
+        assert store.stats()["resident_bytes"] <= 2000
+
+        store.get_pages("USER_002", TypeDocument.CONTRAT)
+        print("hit:", store.stats())
+        assert store.stats()["hits"] == 1
+
+        # user_id qui sortirait du dossier des adhérents : refusé
+        for bad in ("../..", "..", "USER_002/../..", "", "/etc"):
+            try:
+                store.get_pages(bad, TypeDocument.CONTRAT)
+            except ValueError:
+                continue
+            raise AssertionError(f"user_id accepté : {bad!r}")
+
+    # recherche et estimation sur les documents propres de l'adhérent
+    from garanties import estimer_remboursement
+    from passage_index import get_index, search_passages
+
+    root = Path(TMP.name) / "adherents"
+    (root / "USER_010").mkdir(parents=True)
+    (root / "USER_010" / "contrat.pdf").write_text("Article 3 : la téléconsultation vétérinaire est couverte.")
+    (root / "USER_010" / "tableau_garantie.pdf").write_text(TABLEAU)
+    document_store._STORE = DocumentStore(FakeBackend(root=root))
+
+    own = search_passages("téléconsultation vétérinaire", k=1, user_id="USER_010")
+    print("own search:", own)
+    assert own and own[0]["document"] == TypeDocument.CONTRAT.value
+    assert not search_passages("vétérinaire", k=1)  # absent du corpus commun
+    assert search_passages("notice", k=3, user_id="USER_011") == search_passages("notice", k=3)
+
+    e = estimer_remboursement("consultation spécialiste", 60.0, base_remboursement=30.0, user_id="USER_010")
+    print("own table:", e)
+    assert e["garantie"] == "Consultations et visites spécialistes" and e["part_complementaire"] == 24.0
+    TMP.cleanup()
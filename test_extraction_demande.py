@@ -0,0 +1,97 @@
+# test_extraction_demande.py
+import json
+import os
+import tempfile
+from dataclasses import asdict
+from datetime import date
+from types import SimpleNamespace
+
+import agent
+from agent import AgentContext, DecisionRemboursement, _instructions, create_ticket, extraire_demande_remboursement, extraire_type_document
+from garanties import TableGaranties, estimer, parse_tableau
+from extraction_demande import detecter_acte, detecter_type_document, extraire_dates, extraire_demande, extraire_montants
+from project_types import TypeDocument
+
+REF = date(2026, 10, 18)
+
+if __name__ == "__main__":
+    demande = extraire_demande(
+        "Bonjour, j'ai vu un dermatologue le 12/09/2026, j'ai payé 60 € et la Sécu m'a remboursé 21 €.", REF
+    )
+    print(f"[EXTRACT] {demande}")
+    assert demande.acte == "consultation spécialiste" and demande.date == "2026-09-12"
+    assert demande.frais_engages == 60.0 and demande.deja_rembourse == 21.0 and not demande.manquants
+    assert demande.type_document == TypeDocument.TABLEAU_DES_GARANTIES
+
+    # dates : jj/mm sans année, en toutes lettres, relatives ; 12.50 € n'est pas une date
+    assert extraire_dates("séance de kiné le 3 mars, puis le 25/11", REF) == [date(2026, 3, 3), date(2025, 11, 25)]
+    assert extraire_dates("consultation hier", REF) == [date(2026, 10, 17)]
+    assert extraire_dates("pharmacie 12.50 €", REF) == []
+    assert extraire_montants("facture de 1 250,00 € pour ma couronne") == [(1250.0, "paye")]
+    # numéro de téléphone, quantité et année future : pas des dates
+    assert extraire_dates("Appelez-moi au 06.12.34.56.78 pour ma consultation", REF) == []
+    assert extraire_dates("séance de 1.5 heure le 3.5", REF) == [date(2026, 5, 3)]
+    assert extraire_dates("consultation du 12/09/2034", REF) == []
+    # rôle donné par le verbe qui suit le montant, sinon par le plus proche avant
+    assert extraire_montants("remboursé 30 € sur 60 € payés") == [(30.0, "rembourse"), (60.0, "paye")]
+    assert extraire_montants("j'ai payé 60 € et on m'a remboursé 21 €") == [(60.0, "paye"), (21.0, "rembourse")]
+    assert extraire_demande("dentiste : remboursé 30 € sur 60 € payés", REF).frais_engages == 60.0
+
+    assert detecter_acte("mes nouvelles lunettes") == "optique"
+    assert detecter_acte("pose d'une couronne chez le dentiste") == "prothèse dentaire"
+    assert detecter_acte("bonjour") is None
+    assert detecter_type_document("Je veux résilier mon contrat") == TypeDocument.CONTRAT
+    assert detecter_type_document("Quel est le délai de carence pour l'orthodontie ?") == TypeDocument.CONDITIONS_GENERALES
+    assert detecter_type_document("bonjour") == TypeDocument.TABLEAU_DES_GARANTIES
+
+    incomplet = extraire_demande("Je voudrais être remboursé de mes séances.", REF)
+    assert incomplet.acte is None and incomplet.date is None and incomplet.frais_engages is None
+    assert len(incomplet.manquants) == 3
+
+    # outils de l'agent : résultat immédiat, enregistré dans le contexte
+    ctx = SimpleNamespace(deps=AgentContext(user_id="u"))
+    decision = extraire_demande_remboursement(ctx, "Consultation chez l'ophtalmologue le 2 octobre, payé 50 euros.")
+    print(f"[EXTRACT] {decision}")
+    assert decision.acte == "consultation spécialiste" and decision.date.endswith("-10-02")
+    assert ctx.deps.decision_remboursement is decision
+    assert ctx.deps.doc_type == TypeDocument.TABLEAU_DES_GARANTIES
+    assert decision.instructions and "50" in decision.instructions
+
+    # BR inconnue : pas de montant, instructions pour la demander
+    table = TableGaranties(parse_tableau(["Consultations et visites spécialistes 150 % BR"]))
+    estimation = asdict(estimer(table, "consultation spécialiste", 60.0))
+    assert estimation["total_rembourse"] is None
+    assert "base de remboursement Sécurité sociale inconnue" in _instructions(demande, estimation)
+
+    # BR inconnue de bout en bout : décision sans montant, ticket créé en attente du décompte
+    estimer_remboursement = agent.estimer_remboursement
+    agent.estimer_remboursement = lambda acte, frais, base=None, user_id=None: asdict(estimer(table, acte, frais, base))
+    ctx = SimpleNamespace(deps=AgentContext(user_id="u"))
+    decision = extraire_demande_remboursement(ctx, "Dermatologue le 12/09/2026, j'ai payé 60 €.")
+    agent.estimer_remboursement = estimer_remboursement
+    assert decision.montant is None and decision.br_inconnue and "décompte Sécu" in decision.instructions
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        os.mkdir("data")
+        try:
+            ticket = create_ticket(ctx)
+            assert json.load(open("data/ticket.json", encoding="utf-8"))["statut"] == "en_attente_base_remboursement"
+            # sans BR inconnue, un montant absent bloque le ticket, avec la raison
+            ctx.deps.decision_remboursement = DecisionRemboursement(acte="optique", date=None, montant=None)
+            try:
+                create_ticket(ctx)
+                raise AssertionError("ticket sans montant accepté")
+            except RuntimeError as e:
+                assert "montant" in str(e)
+            ctx.deps.decision_remboursement = DecisionRemboursement(acte="optique", date=None, montant=0.0)
+            assert create_ticket(ctx)["statut"] == "estime"  # 0 € est un montant
+        finally:
+            os.chdir(cwd)
+    print(f"[EXTRACT] ticket BR inconnue : {ticket}")
+    assert ticket["montant"] is None and ticket["instructions"] == decision.instructions
+
+    ctx = SimpleNamespace(deps=AgentContext(user_id="u"))
+    assert extraire_type_document(ctx, "Où trouver mon attestation dans l'espace client ?") == TypeDocument.GUIDE_CLIENT
+    assert ctx.deps.doc_type == TypeDocument.GUIDE_CLIENT
+    print("[EXTRACT] OK")
@@ -0,0 +1,31 @@
+# test_extraction_engine.py
+from pathlib import Path
+
+from extraction_engine import ATTACHMENT_PDF_BACKEND, get_extraction_engine
+from security_layer import iter_attachment_text, prepare_safe_payload
+
+PDF = Path("data/espace_client/notice_information.pdf")
+
+if __name__ == "__main__":
+    engine = get_extraction_engine()
+    data = PDF.read_bytes()
+    engine.clear()
+
+    # rerun du front : même pièce jointe, même texte -> pages servies par le cache
+    first = prepare_safe_payload("Voici ma notice.", file_bytes=data, file_name=PDF.name)
+    assert engine.page_misses == 1 and engine.page_hits == 0
+    second = prepare_safe_payload("Voici ma notice.", file_bytes=data, file_name=PDF.name)
+    print(f"[EXTRACT] pages : hits={engine.page_hits} misses={engine.page_misses} | {len(second.text)} car.")
+    assert engine.page_hits == 1 and engine.page_misses == 1
+    assert first == second
+
+    # lecture partielle (1re page) puis complète : même texte que sans cache
+    full = "".join(iter_attachment_text(data, PDF.name))
+    engine.clear()
+    pages = engine.iter_pages(data, ATTACHMENT_PDF_BACKEND)
+    first_page = next(pages)
+    pages.close()
+    assert "".join(iter_attachment_text(data, PDF.name)) == full and full.startswith(first_page)
+    assert list(engine.iter_pages(data, ATTACHMENT_PDF_BACKEND, max_pages=1)) == [first_page]
+    assert engine.page_hits == 2 and engine.page_misses == 1
+    print("[EXTRACT] OK")
@@ -0,0 +1,78 @@
+# test_garanties.py
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+from garanties import TableGaranties, _save, estimer, parse_tableau
+
+TABLEAU = """TABLEAU DES GARANTIES
+SOINS COURANTS
+Consultations et visites généralistes 100 % BR
+Consultations et visites spécialistes 150 % BR
+Kinésithérapie 100 % BR (BR 16,13 €)
+Pharmacie remboursée à 65 % 100 % BR
+HOSPITALISATION
+Forfait journalier hospitalier 100 % FR
+Chambre particulière 50 € par jour dans la limite de 1 500 € par an
+DENTAIRE
+Prothèses dentaires 300 % BR dans la limite de 1 000 € par an
+OPTIQUE
+Monture et verres 150 € tous les deux ans
+"""
+
+if __name__ == "__main__":
+    garanties = parse_tableau([TABLEAU])
+    for g in garanties:
+        print(g)
+
+    table = TableGaranties(garanties)
+    print("lookup:", table.lookup("consultation chez un spécialiste"))
+
+    # Spécialiste à 60 € (BR 30 €) : Sécu 70 % x 30 = 21 €, garantie 150 % BR = 45 € => 24 € de complémentaire
+    e = estimer(table, "consultation spécialiste", frais_engages=60.0, base_remboursement=30.0)
+    print(e)
+    assert (e.part_secu, e.part_complementaire, e.reste_a_charge) == (21.0, 24.0, 15.0)
+
+    # Prothèse à 2 000 € (BR 120 €) : 300 % BR = 360 € au total, dont 288 € de complémentaire (sous le plafond)
+    e = estimer(table, "prothèse dentaire", frais_engages=2000.0, base_remboursement=120.0)
+    print(e)
+    assert e.part_complementaire == 288.0
+
+    # Optique : forfait de 150 €
+    e = estimer(table, "lunettes monture verres", frais_engages=400.0, base_remboursement=0.05)
+    print(e)
+    assert e.part_complementaire == 150.0
+
+    # BR lue sur la ligne du tableau, sans être prise pour un forfait
+    kine = table.lookup("kinésithérapie")
+    assert kine.base_remboursement == 16.13 and kine.forfait is None and kine.taux_br == 1.0
+    e = estimer(table, "kinésithérapie", frais_engages=25.0)
+    print(e)
+    assert (e.base_remboursement, e.part_secu, e.br_inconnue) == (16.13, 11.29, False)
+
+    # BR ni fournie ni dans le tableau : pas de montant deviné à partir des frais engagés
+    e = estimer(table, "consultation spécialiste", frais_engages=60.0)
+    print(e)
+    assert e.br_inconnue and e.total_rembourse is None and e.part_secu is None
+
+    # écritures concurrentes de la table : un fichier temporaire par écriture, aucun reste
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "garanties.json"
+        errors = []
+
+        def save_many():
+            try:
+                for _ in range(20):
+                    _save(table, path)
+            except OSError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=save_many) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        assert [f.name for f in Path(tmp).iterdir()] == ["garanties.json"]
+        assert TableGaranties.from_dict(json.loads(path.read_text(encoding="utf-8"))).lookup("kinésithérapie")
@@ -0,0 +1,147 @@
+# test_local_backend.py
+import os
+
+os.environ.setdefault("LOCAL_BACKEND_RETRY_AFTER", "0.05")
+os.environ.setdefault("LLM_MAX_RETRIES", "5")
+
+import asyncio
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+import anthropic
+
+import classification
+from classification import CLASSIFICATION_SCHEMA, aprocess, classify, process, process_stream, reply_and_classify, stream_customer_reply
+from llm_client import is_live_backend
+from local_backend import (
+    Behaviour,
+    FailureModel,
+    LatencyModel,
+    LocalAnthropic,
+    Recorder,
+    Replay,
+    conforms,
+    fake_message,
+    install,
+    serve,
+)
+from rate_limiter import current_lane, get_governor, governor_stats
+
+TEXTS = [
+    "Je n'ai pas été remboursé de ma consultation chez le dentiste.",
+    "Pouvez-vous m'envoyer une attestation de tiers payant ?",
+    "Je souhaite un devis pour une mutuelle familiale.",
+]
+
+if __name__ == "__main__":
+    install(latency=0.0)
+    assert not is_live_backend()
+
+    # JSON conforme au schéma, et déterministe
+    for text in TEXTS:
+        first, second = classify(text), classify(text)
+        print(json.dumps(first, ensure_ascii=False))
+        assert conforms(CLASSIFICATION_SCHEMA, first), first
+        assert first == second
+    assert classify(TEXTS[0])["motif"] == "REMBOURSEMENT_SANTE"
+
+    result = process(TEXTS[1])
+    assert result["reply"] and conforms(CLASSIFICATION_SCHEMA, result["classification"])
+
+    # mode un seul appel (PROCESS_MODE=single)
+    reply, data = reply_and_classify(TEXTS[0])
+    assert reply and conforms(CLASSIFICATION_SCHEMA, data)
+    single = asyncio.run(aprocess(TEXTS[2], mode="single"))
+    assert set(process(TEXTS[2], mode="single")["timings"]) == {"secure_s", "reply_classify_s"}
+    # mode inconnu (faute de frappe, PROCESS_MODE mal configuré) : erreur, pas de repli silencieux
+    for bad in ("paralel", "SINGLE"):
+        try:
+            process(TEXTS[2], mode=bad)
+            raise AssertionError(f"mode {bad} accepté")
+        except ValueError:
+            pass
+    process_mode, classification.PROCESS_MODE = classification.PROCESS_MODE, "paralel"
+    try:
+        process(TEXTS[2])
+        raise AssertionError("PROCESS_MODE invalide accepté")
+    except ValueError:
+        pass
+    classification.PROCESS_MODE = process_mode
+    assert set(single["timings"]) == {"secure_s", "reply_classify_s"}
+    assert single["classification"]["motif"] == "DEVIS"
+
+    # flux en processus
+    stream = stream_customer_reply(TEXTS[0])
+    assert "".join(stream) == stream.text and stream.ttft is not None
+
+    # process_stream : flux et classification dans la voie de la demande, comme process()
+    lane_hint, classification._lane_hint = classification._lane_hint, lambda text: "high"
+    high = get_governor().waits["high"].count
+    streamed = process_stream(TEXTS[0])
+    deltas = iter(streamed)
+    next(deltas)
+    assert current_lane() == "normal"  # voie non laissée active chez l'appelant
+    "".join(deltas)
+    timings = streamed.result()["timings"]
+    assert get_governor().waits["high"].count == high + 2
+    # process parallèle : les deux appels partent ensemble, dans la voie de la demande
+    parallel = process(TEXTS[1], mode="parallel")
+    classification._lane_hint = lane_hint
+    assert get_governor().waits["high"].count == high + 4
+    assert set(parallel["timings"]) == {"secure_s", "reply_s", "classify_s"} and parallel["reply"]
+    assert set(timings) == {"secure_s", "ttft_s", "reply_s", "classify_s"} and timings["secure_s"] is not None
+
+    # pannes injectées via install() : vrais clients SDK, donc retries et régulateur comme en production
+    behaviour = Behaviour(failures=FailureModel(rate=0.3, statuses={429: 1, 529: 1}), seed=5)
+    install(behaviour=behaviour)
+    for i in range(12):
+        assert conforms(CLASSIFICATION_SCHEMA, classify(f"{TEXTS[i % 3]} (demande {i})"))
+    result = asyncio.run(aprocess(TEXTS[1]))
+    assert result["reply"] and conforms(CLASSIFICATION_SCHEMA, result["classification"])
+    stats = governor_stats()
+    print(f"[LOCAL] install + pannes : {behaviour.failed} | régulateur 429={stats['throttled']} 529={stats['overloaded']}")
+    assert behaviour.failed and stats["throttled"] + stats["overloaded"] == sum(behaviour.failed.values())
+
+    # pannes simulées : reproductibles à graine égale
+    def failures(seed):
+        client = LocalAnthropic(behaviour=Behaviour(failures=FailureModel(rate=0.5, statuses={429: 1, 529: 1}), seed=seed))
+        out = []
+        for _ in range(40):
+            try:
+                client.messages.create(model="m", max_tokens=10, messages=[{"role": "user", "content": "x"}])
+                out.append(200)
+            except anthropic.APIStatusError as e:
+                out.append(e.status_code)
+        return out
+
+    runs = failures(7)
+    print(f"[LOCAL] pannes : {sum(s != 200 for s in runs)}/40 | 429={runs.count(429)} | 529={runs.count(529)}")
+    assert runs == failures(7) and 429 in runs and 529 in runs
+    assert LatencyModel(mean=0.2, dist="fixed").sample(None) == 0.2
+
+    # enregistrement puis rejeu
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "rec.jsonl"
+        request = {"model": "m", "max_tokens": 10, "messages": [{"role": "user", "content": "bonjour"}]}
+        recorded = fake_message(request).model_copy(update={"id": "msg_real"})
+        Recorder(path).record(request, recorded)
+        replay = Replay(path)
+        assert replay(request).id == "msg_real" and replay.hits == 1
+        assert replay({**request, "max_tokens": 11}).id != "msg_real" and replay.misses == 1
+
+    # serveur HTTP : le vrai SDK (retries compris) contre le backend simulé
+    server = serve(port=0, behaviour=Behaviour(failures=FailureModel(rate=0.3, statuses={529: 1}), seed=1))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sdk = anthropic.Anthropic(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}", max_retries=5)
+    message = sdk.messages.create(
+        model="m", max_tokens=100, messages=[{"role": "user", "content": TEXTS[2]}],
+        output_config={"format": {"type": "json_schema", "schema": CLASSIFICATION_SCHEMA}},
+    )
+    assert conforms(CLASSIFICATION_SCHEMA, json.loads(message.content[0].text))
+    with sdk.messages.stream(model="m", max_tokens=100, messages=[{"role": "user", "content": TEXTS[0]}]) as s:
+        streamed = "".join(s.text_stream)
+    assert streamed == s.get_final_message().content[0].text
+    server.shutdown()
+    print("[LOCAL] OK")
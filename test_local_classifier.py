@@ -0,0 +1,92 @@
+# test_local_classifier.py
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from local_classifier import LocalClassifier, calibration_report, print_report, train
+
+EXEMPLES = {
+    ("REMBOURSEMENT_SANTE", "SANTE", "SUIVI", "NORMALE", "INQUIET"): [
+        "je n'ai pas été remboursé pour une consultation",
+        "toujours pas de remboursement de ma consultation chez le médecin",
+        "le remboursement de mes lunettes n'est pas arrivé",
+    ],
+    ("ATTESTATION", "SANTE", "ACTION", "BASSE", "CALME"): [
+        "pouvez-vous m'envoyer une attestation de tiers payant",
+        "j'ai besoin d'une attestation de mutuelle pour mon employeur",
+    ],
+    ("ARRET_TRAVAIL_PREVOYANCE", "PREVOYANCE", "ENVOI_DOCUMENTS", "HAUTE", "URGENT"): [
+        "je vous envoie mon arrêt de travail, merci de traiter vite",
+        "voici la prolongation de mon arrêt de travail, c'est urgent",
+    ],
+    ("RECLAMATION", "MULTI", "CONTESTATION", "HAUTE", "MECONTENT"): [
+        "je conteste la décision de refus, c'est inadmissible",
+        "je suis très mécontent, je veux faire une réclamation",
+    ],
+}
+ACTIONS = {
+    "REMBOURSEMENT_SANTE": ["CREER_TICKET_GESTION"],
+    "ATTESTATION": ["ORIENTER_SELFCARE"],
+    "ARRET_TRAVAIL_PREVOYANCE": ["CREER_TICKET_GESTION", "DEMANDER_PIECES"],
+    "RECLAMATION": ["ESCALADER_URGENCE"],
+}
+INFOS = {"REMBOURSEMENT_SANTE": ["date de l'acte", "montant payé"]}
+BRUIT = ["Bonjour,", "Merci d'avance.", "Cordialement [NOM].", "Mon numéro est [TEL].", ""]
+
+
+def make_records(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    records = []
+    for _ in range(n):
+        labels, phrases = rng.choice(list(EXEMPLES.items()))
+        phrase = rng.choice(phrases)
+        text = f"{rng.choice(BRUIT)} {phrase}. {rng.choice(BRUIT)}".strip()
+        classification = dict(zip(("motif", "domaine", "intention", "priorite", "ton_client"), labels))
+        classification["actions_recommandees"] = ACTIONS[labels[0]]
+        classification["resume_1_phrase"] = phrase[:1].upper() + phrase[1:] + "."
+        classification["infos_a_collecter"] = INFOS.get(labels[0], [])
+        records.append({"text": f"DEMANDE CLIENT:\n{text}\n\nREPONSE ASSISTANT:\nBonjour...", "classification": classification})
+    return records
+
+
+if __name__ == "__main__":
+    model = train(make_records(300))
+    report = calibration_report(model, make_records(100, seed=1))
+    print_report(report)
+    assert report["precision_globale"] >= 0.95
+    # champs libres : le résumé saute "Bonjour," / "Cordialement [NOM]." et suit celui du journal
+    assert report["resume_recouvrement"] >= 0.8 and report["infos_manquees"] == 0.0
+
+    t0 = time.perf_counter()
+    result = model.classify("DEMANDE CLIENT:\nBonjour, je n'ai pas été remboursé pour une consultation du 12/01.", threshold=0.5)
+    print(f"local: {result} | {1000 * (time.perf_counter() - t0):.3f}ms")
+    assert result["motif"] == "REMBOURSEMENT_SANTE"
+    assert result["actions_recommandees"] == ["CREER_TICKET_GESTION"]
+    assert result["resume_1_phrase"].startswith("Je n'ai pas été remboursé")
+    assert result["infos_a_collecter"] == ["montant payé (facture)"]
+
+    # hors distribution : confiance faible => repli sur Claude
+    assert model.classify("DEMANDE CLIENT:\nQuel est le montant de ma retraite complémentaire ?", threshold=0.99) is None
+    print("stats:", model.stats.as_dict())
+
+    # sauvegardes concurrentes du modèle : un fichier temporaire par écriture, aucun reste
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "model.json"
+        errors = []
+
+        def save_many():
+            try:
+                for _ in range(5):
+                    model.save(path)
+            except OSError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=save_many) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        assert [f.name for f in Path(tmp).iterdir()] == ["model.json"] and LocalClassifier.load(path) is not None
@@ -0,0 +1,52 @@
+# test_passage_index.py
+import tempfile
+import threading
+from pathlib import Path
+
+from passage_index import PassageIndex, chunk_pages, normalize_tokens
+from project_types import TypeDocument
+
+PAGES = [
+    "TABLEAU DES GARANTIES\nARTICLE 1\nConsultations et visites : généraliste 100 % BR, spécialiste 150 % BR.",
+    "ARTICLE 2\nOptique : monture et verres, forfait 150 € tous les deux ans.\n"
+    "ARTICLE 3\nDentaire : prothèses remboursées à 300 % BR dans la limite du plafond annuel.",
+]
+
+if __name__ == "__main__":
+    print("tokens:", normalize_tokens("Les prothèses dentaires de l'assuré"))
+
+    passages = chunk_pages(TypeDocument.TABLEAU_DES_GARANTIES, PAGES)
+    for p in passages:
+        print(f"p.{p.page} | {p.section} | {p.text[:60]}")
+    assert [p.section for p in passages] == [None, "ARTICLE 1", "ARTICLE 2", "ARTICLE 3"]
+
+    index = PassageIndex(passages)
+    hits = index.search("remboursement prothese dentaire", k=2)
+    print("top:", [(score, p.section) for score, p in hits])
+    assert hits[0][1].section == "ARTICLE 3"
+
+    # round-trip persistance
+    reloaded = PassageIndex.from_dict(index.to_dict())
+    assert [p.section for _, p in reloaded.search("optique monture", k=1)] == ["ARTICLE 2"]
+    print("reloaded ok")
+
+    # sauvegardes concurrentes : un fichier temporaire par écriture, aucun reste
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "index.json"
+        errors = []
+
+        def save_many():
+            try:
+                for _ in range(20):
+                    index.save(path)
+            except OSError as e:  # ancien index.tmp fixe : remplacé sous les pieds d'un autre thread
+                errors.append(e)
+
+        threads = [threading.Thread(target=save_many) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        assert PassageIndex.load(path) is not None and [f.name for f in Path(tmp).iterdir()] == ["index.json"]
+    print("concurrent save ok")
@@ -0,0 +1,64 @@
+# test_pii_scan.py
+import random
+
+from security_layer import _redact, _redact_pii_sequential
+
+# Morceaux combinés au hasard : PII, noms, mots et chiffres, séparés par des blancs ou de la ponctuation
+PII = [
+    "jean.dupont@gmail.com", "06 12 34 56 78", "0612345678", "+33 6 12 34 56 78", "75012", "91190",
+    "FR76 3000 6000 0112 3456 7890 189", "180027501234567", "4111 1111 1111 1111",
+]
+NOMS = ["Paul", "Durand", "Jean-Pierre", "D'Artagnan", "Le Goff", "Émile Zola", "dupont"]
+AMORCES = ["M.", "Mr", "Monsieur", "Mme", "Madame", "Mlle", "Je m'appelle"]
+LIBELLES = ["Nom :", "Prénom :"]
+MOTS = ["Paris", "bonjour", "12", "rue", "merci", "le", "3"]
+SEPARATEURS = [" ", " ", " ", ". ", ", ", "\n", " - ", "'"]
+
+# Différence voulue (commit du scan unique) : l'ancien code re-matche le "Nom :" qu'il
+# vient d'insérer si un nom le précède. Les libellés suivent donc une ponctuation.
+PONCTUATION = [". ", ", ", ".\n"]
+
+
+def random_text(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(2, 8)):
+        kind = rng.random()
+        if kind < 0.1:
+            if parts:
+                parts[-1] = rng.choice(PONCTUATION)
+            parts.append(f"{rng.choice(LIBELLES)} {rng.choice(NOMS)}")
+        elif kind < 0.35:
+            parts.append(f"{rng.choice(AMORCES)} {rng.choice(NOMS)}")
+        elif kind < 0.7:
+            parts.append(rng.choice(PII))
+        else:
+            parts.append(rng.choice(MOTS))
+        parts.append(rng.choice(SEPARATEURS))
+    return "".join(parts)
+
+
+if __name__ == "__main__":
+    # cas relevés en revue : le nom n'avale plus l'espace devant la PII suivante
+    for text, expected in [
+        ("M. Paul 75012 Paris", "[CIVILITE] [NOM] [CODE_POSTAL] Paris"),
+        ("Madame Durand 0612345678", "[CIVILITE] [NOM] [TEL]"),
+    ]:
+        assert _redact(text)[0] == expected == _redact_pii_sequential(text)[0], _redact(text)
+
+    rng = random.Random(2024)
+    n, divergents = 20000, []
+    for _ in range(n):
+        text = random_text(rng)
+        if _redact(text) != _redact_pii_sequential(text):
+            divergents.append(text)
+    print(f"[PII] {n} textes aléatoires | divergents : {len(divergents)}")
+    for text in divergents[:5]:
+        print(f"  {text!r}\n    scan  {_redact(text)}\n    seq   {_redact_pii_sequential(text)}")
+    assert not divergents
+
+    # PII collées sans séparateur ("...@gmail.com+33 6...") : hors équivalence. Le
+    # placeholder inséré par l'ancien code supprime la frontière de mot et lui fait rater
+    # ou mal étiqueter la PII suivante ; le scan unique voit le texte d'origine.
+    assert _redact("jean.dupont@gmail.com+33 6 12 34 56 78")[0] == "[EMAIL][TEL]"
+    assert _redact_pii_sequential("jean.dupont@gmail.com+33 6 12 34 56 78")[0] == "[EMAIL]+33 6 12 34 56 78"
+    print("[PII] OK")
@@ -1,4 +1,6 @@
-from classification import process
+import asyncio
+
+from classification import aprocess, process
 
 if __name__ == "__main__":
     user_message = (
@@ -15,3 +17,7 @@ if __name__ == "__main__":
     print("\n=== CLASSIFICATION (JSON) ===\n")
     print("[TEST] motif=", result["classification"].get("motif"), "confiance=", result["classification"].get("confiance"))
     print(result["classification"])
+
+    print("\n=== APROCESS (parallel) ===\n")
+    result = asyncio.run(aprocess(user_message, mode="parallel"))
+    print("[TEST] motif=", result["classification"].get("motif"), "| reply_len=", len(result["reply"]))
@@ -0,0 +1,31 @@
+# test_pseudonymization.py
+from security_layer import PseudonymVault, prepare_safe_payload, pseudonymize_pii
+
+if __name__ == "__main__":
+    vault = PseudonymVault()
+
+    text = (
+        "Bonjour, je m'appelle Claire Martin. Écrivez à claire.martin@gmail.com "
+        "ou au 06 12 34 56 78. Madame Durand (ma sœur) a aussi écrit depuis claire.martin@gmail.com."
+    )
+    pseudo, found = pseudonymize_pii(text, vault)
+    print("pseudo:", pseudo)
+    print("found:", found)
+    assert "[EMAIL_1]" in pseudo and "[EMAIL_2]" not in pseudo  # même valeur => même jeton
+    assert "Madame [NOM_2]" in pseudo
+
+    reply = "Bonjour [NOM_1], nous vous recontactons au [TEL_1] et à l'adresse [EMAIL_1]."
+    print("rehydrated:", vault.rehydrate(reply))
+    assert vault.rehydrate(reply) == "Bonjour Claire Martin, nous vous recontactons au 06 12 34 56 78 et à l'adresse claire.martin@gmail.com."
+
+    # le coffre est partagé sur toute la session (messages suivants)
+    safe = prepare_safe_payload("Nom : Martin, nouveau numéro 07 11 22 33 44", vault=vault)
+    print("follow-up:", safe.text, "| vault size:", len(vault))
+    assert "[TEL_2]" in safe.text
+    assert vault.rehydrate(safe.text) == "Nom : Martin, nouveau numéro 07 11 22 33 44"
+
+    # flux de deltas : un jeton coupé entre deux deltas est retenu jusqu'à être complet
+    deltas = ["Bonjour [NO", "M_1], votre ", "numéro [TEL_2", "] est noté. [fin"]
+    streamed = list(vault.rehydrate_stream(deltas))
+    print("stream:", streamed)
+    assert "".join(streamed) == vault.rehydrate("".join(deltas))
@@ -0,0 +1,98 @@
+# test_rate_limiter.py
+import os
+
+os.environ.setdefault("LOCAL_BACKEND_RETRY_AFTER", "0.2")
+os.environ.setdefault("LLM_MAX_RETRIES", "5")
+
+import asyncio
+import threading
+import time
+
+from local_backend import Behaviour, FailureModel, serve
+from rate_limiter import Governor, TokenBucket, estimate_tokens, governor_stats, lane_for, priority
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+if __name__ == "__main__":
+    # seau à jetons : 60 / min = 1 / s, capacité d'une minute
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)
+    bucket.take(60, clock.now)
+    assert bucket.wait_time(1, clock.now) == 1.0
+    clock.now = 0.5
+    assert bucket.wait_time(1, clock.now) == 0.5
+    assert TokenBucket(0, clock).wait_time(10**6, clock.now) == 0.0  # 0 = pas de limite
+    assert estimate_tokens(b'{"max_tokens": 300, "messages": []}') == 300 + 35 // 4
+
+    # AIMD : divisée par 2 sur 429 (une fois par fenêtre), +1/limite par succès
+    gov = Governor(max_concurrency=8, min_concurrency=1, cooldown=2.0, clock=clock)
+    for _ in range(3):
+        gov.acquire()
+    for _ in range(3):
+        gov.release(429, retry_after_s=1.0)
+    assert gov.limit == 4.0 and gov.stats.decreases == 1 and gov.stats.throttled == 3
+    assert gov.paused_until == clock.now + 1.0
+    clock.now += 2.0
+    gov.acquire()
+    gov.release(200)
+    assert gov.limit == 4.25
+
+    # priorité stricte : une seule place, file low puis high -> high admis d'abord
+    gov = Governor(max_concurrency=1)
+    gov.acquire()
+    order = []
+
+    def call(lane):
+        gov.acquire(lane=lane)
+        order.append(lane)
+        gov.release(200)
+
+    threads = []
+    for lane in ("low", "normal", "low", "high"):
+        t = threading.Thread(target=call, args=(lane,))
+        t.start()
+        threads.append(t)
+        time.sleep(0.02)  # ordre d'arrivée fixé
+    assert gov.queue_depth() == {"high": 1, "normal": 1, "low": 2}
+    gov.release(200)
+    for t in threads:
+        t.join()
+    print(f"[RATE] ordre d'admission : {order}")
+    assert order == ["high", "normal", "low", "low"]
+    assert gov.waits["high"].count == 1 and lane_for("HAUTE") == "high"
+
+    # bout en bout : vrai SDK -> transport régulé -> backend local qui renvoie des 429
+    server = serve(port=0, behaviour=Behaviour(failures=FailureModel(rate=0.15, statuses={429: 1}), seed=3))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{server.server_port}"
+    from llm_client import build_anthropic_clients
+
+    sync_client, client = build_anthropic_clients()
+    assert sync_client.messages.create(model="m", max_tokens=50, messages=[{"role": "user", "content": "x"}]).content
+
+    async def one(i: int) -> str:
+        with priority("high" if i % 5 == 0 else "normal"):
+            msg = await client.messages.create(
+                model="m", max_tokens=50, messages=[{"role": "user", "content": f"Demande {i}"}]
+            )
+        return msg.content[0].text
+
+    async def main():
+        return await asyncio.gather(*(one(i) for i in range(40)))
+
+    t0 = time.perf_counter()
+    replies = asyncio.run(main())
+    stats = governor_stats()
+    print(f"[RATE] 40 appels en {time.perf_counter() - t0:.2f}s | {stats}")
+    assert len(replies) == 40 and all(replies)
+    assert stats["throttled"] > 0 and stats["decreases"] > 0
+    assert stats["admitted"] == 41 + stats["throttled"] and stats["inflight"] == 0
+    server.shutdown()
+    print("[RATE] OK")
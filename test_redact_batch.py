@@ -0,0 +1,59 @@
+# test_redact_batch.py
+import json
+import tempfile
+from pathlib import Path
+
+from security_layer import BatchStats, redact_batch, redact_jsonl
+
+RECORDS = [
+    {"id": 1, "message": "Écrivez-moi à jean.dupont@gmail.com", "montant": 60},
+    {"id": 2, "client": {"email": "claire@exemple.fr", "tel": ["06 12 34 56 78"]}, "message": "merci"},
+    "Mon IBAN est FR76 3000 6000 0112 3456 7890 189",
+    [1, 2],
+    {"id": 3, "message": "Rien à signaler", "notes": [{"texte": "rappeler au 0612345678"}]},
+]
+
+if __name__ == "__main__":
+    for processes in (1, 2):
+        stats = BatchStats()
+        out = list(redact_batch(RECORDS, processes=processes, stats=stats))
+        print(f"[BATCH] processes={processes} | {stats.summary()}")
+        # les objets et listes imbriqués sont rédigés ; rien ne fuit
+        assert "@" not in json.dumps(out) and "06 12" not in json.dumps(out) and "0612" not in json.dumps(out)
+        assert out[0]["montant"] == 60 and out[0]["pii_found"] == ["email"]
+        assert out[1]["client"] == {"email": "[EMAIL]", "tel": ["[TEL]"]}
+        assert out[1]["pii_found"] == ["email", "telephone"]
+        assert out[2] == "Mon IBAN est [IBAN]"
+        assert out[3]["notes"] == [{"texte": "rappeler au [TEL]"}]
+        # la liste [1, 2] n'est ni un texte ni un objet : comptée en erreur, sans arrêter le lot
+        assert len(out) == 4 and stats.records == 4 and stats.errors == 1 and stats.records_with_pii == 4
+
+    # identifiants laissés tels quels par défaut ; une clé de coordonnée reste rédigée
+    claim = {"request_id": "75012", "claim_no": "4970101234567890", "phone_no": "0612345678",
+             "text": "Je suis au 0612345678", "assure": {"id": "91190", "email": "a@b.fr"}}
+    out = list(redact_batch([claim], processes=1))[0]
+    print(f"[BATCH] identifiants : {out}")
+    assert out["request_id"] == "75012" and out["claim_no"] == "4970101234567890" and out["assure"]["id"] == "91190"
+    assert out["phone_no"] == "[TEL]" and out["text"] == "Je suis au [TEL]" and out["assure"]["email"] == "[EMAIL]"
+
+    # un champ "pii_found" existant n'est pas écrasé : enregistrement refusé, ou autre clé
+    stats = BatchStats()
+    existing = {"message": "a@b.fr", "pii_found": "valeur métier"}
+    assert list(redact_batch([existing], processes=1, stats=stats)) == [] and stats.errors == 1
+    out = list(redact_batch([existing], processes=1, pii_key="_pii_labels"))[0]
+    assert out["pii_found"] == "valeur métier" and out["_pii_labels"] == ["email"]
+
+    # champs choisis : seuls ces champs (et leur contenu imbriqué) sont rédigés
+    out = list(redact_batch(RECORDS[:2], text_fields=["client"], processes=1))
+    assert out[0]["message"] == RECORDS[0]["message"] and out[1]["client"]["email"] == "[EMAIL]"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = Path(tmp) / "in.jsonl", Path(tmp) / "out.jsonl"
+        lines = [json.dumps(r, ensure_ascii=False) for r in RECORDS] + ["{pas du json", "null"]
+        src.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        stats = redact_jsonl(str(src), str(dst), processes=2)
+        print(f"[BATCH] jsonl | {stats.summary()}")
+        written = [json.loads(line) for line in dst.read_text(encoding="utf-8").splitlines()]
+        assert len(written) == 4 and stats.errors == 3
+        assert written[1]["client"]["email"] == "[EMAIL]"
+    print("[BATCH] OK")
@@ -0,0 +1,42 @@
+# test_response_cache.py
+import tempfile
+from pathlib import Path
+
+from response_cache import ResponseCache, normalize_text
+
+if __name__ == "__main__":
+    now = [1000.0]
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "responses.sqlite"
+        cache = ResponseCache(db, ttl=60, max_entries=2, clock=lambda: now[0])
+
+        text = "Je n'ai pas été remboursé pour une consultation, [NOM_1]."
+        assert cache.get("reply", "claude", "v1", text) is None
+        cache.put("reply", "claude", "v1", text, "Bonjour [NOM_1], ...")
+        cache.put("classify", "claude", "v1", text, {"motif": "REMBOURSEMENT_SANTE", "infos_a_collecter": []})
+
+        # texte normalisé : casse et espaces n'entrent pas dans la clé
+        print("normalized:", normalize_text("  Je n'ai   PAS été\nremboursé "))
+        assert cache.get("reply", "claude", "v1", "  JE N'AI pas été remboursé pour une   consultation, [NOM_1].") == "Bonjour [NOM_1], ..."
+        # modèle ou version de prompt différents : autre entrée
+        assert cache.get("reply", "claude", "v2", text) is None
+        assert cache.get("reply", "other-model", "v1", text) is None
+
+        # chaque lecture renvoie une copie : la modifier ne touche pas le cache
+        data = cache.get("classify", "claude", "v1", text)
+        data["infos_a_collecter"].append("x")
+        assert cache.get("classify", "claude", "v1", text)["infos_a_collecter"] == []
+
+        # niveau disque : un nouveau process (nouvelle instance) retrouve l'entrée
+        other = ResponseCache(db, ttl=60, clock=lambda: now[0])
+        assert other.get("reply", "claude", "v1", text) == "Bonjour [NOM_1], ..."
+        print("disk stats:", other.stats.as_dict())
+        assert other.stats.disk_hits == 1
+
+        # expiration (TTL)
+        now[0] += 61
+        assert cache.get("reply", "claude", "v1", text) is None
+        print("purged:", cache.purge(), "| stats:", cache.stats.as_dict())
+        assert cache.disk_entries() == 0
+        cache.close()
+        other.close()
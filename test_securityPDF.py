@@ -1,20 +1,63 @@
 # test_pdf_security.py
+import os
+import sys
+from pathlib import Path
+
 from security_layer import extract_text_from_file, prepare_safe_payload
 
-PDF_PATH = "..\..\datas\Test_PDF_Security.pdf"
+# PDF réel via TEST_PDF_PATH ; sinon PDF synthétique généré ci-dessous (aucun fichier requis)
+PDF_PATH = os.getenv("TEST_PDF_PATH")
+
+LIGNES = [
+    "Demande de remboursement - consultation du 12/09/2026",
+    "Contact : jean.dupont@gmail.com / 06 12 34 56 78",
+    "IBAN : FR76 3000 6000 0112 3456 7890 189",
+]
+
+
+def synthetic_pdf(lines) -> bytes:
+    """PDF d'une page (Helvetica) écrit à la main : pas de dépendance de génération."""
+    stream = "BT /F1 12 Tf 72 720 Td 16 TL " + " ".join(
+        "(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") '" for line in lines
+    ) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{o:010d} 00000 n \n" for o in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
 
 if __name__ == "__main__":
-    with open(PDF_PATH, "rb") as f:
-        b = f.read()
+    if PDF_PATH:
+        if not Path(PDF_PATH).exists():
+            print(f"[SKIP] TEST_PDF_PATH introuvable : {PDF_PATH}")
+            sys.exit(0)
+        b = Path(PDF_PATH).read_bytes()
+        file_name = Path(PDF_PATH).name
+    else:
+        b = synthetic_pdf(LIGNES)
+        file_name = "Test_PDF_Security.pdf"
 
-    extracted = extract_text_from_file(b, "..\..\datas\Test_PDF_Security.pdf")
+    extracted = extract_text_from_file(b, file_name)
     print("\n=== EXTRACTED (head 500) ===")
     print(extracted[:500])
 
     safe = prepare_safe_payload(
         user_message="Voici ma demande, pièce jointe ci-dessous.",
         file_bytes=b,
-        file_name="Test_PDF_Security.pdf",
+        file_name=file_name,
         hard_block=False,  # mets True pour vérifier le blocage IBAN
     )
 
@@ -23,3 +66,9 @@ if __name__ == "__main__":
     print("blocked:", safe.blocked, "| reason:", safe.block_reason)
     print("\ntext_out (head 800):")
     print(safe.text[:800])
+
+    if not PDF_PATH:
+        assert "jean.dupont@gmail.com" in extracted
+        assert {"email", "telephone", "iban"} <= set(safe.pii_found), safe.pii_found
+        assert "jean.dupont" not in safe.text and "FR76" not in safe.text
+        print("\n[PDF] OK")
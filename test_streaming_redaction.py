@@ -0,0 +1,26 @@
+# test_streaming_redaction.py
+from bench_pii import make_text
+from security_layer import StreamingRedactor, _redact, iter_redact_chunks, iter_text_chunks, prepare_safe_payload
+
+if __name__ == "__main__":
+    # 1) IBAN coupé en deux par la frontière de morceaux
+    chunks = ["Bonjour, mon IBAN est FR76 3000 60", "00 0112 3456 7890 189, merci. Tél 06 12 ", "34 56 78."]
+    redactor = StreamingRedactor(overlap=64)
+    out = "".join(iter_redact_chunks(chunks, redactor))
+    print("out:", out, "| pii:", sorted(redactor.pii_found))
+    assert "[IBAN]" in out and "[TEL]" in out
+
+    # 2) même résultat que la rédaction en un bloc, quelle que soit la taille des morceaux
+    text = make_text(200_000, pii_every=2, seed=1)
+    expected = _redact(text)
+    for size in (17, 500, 4096):
+        r = StreamingRedactor()
+        got = "".join(iter_redact_chunks(iter_text_chunks(text, size), r))
+        print(f"chunk={size:<5} same={got == expected[0] and sorted(r.pii_found) == expected[1]} | carry_max<={r.overlap + size}")
+        assert got == expected[0]
+
+    # 3) pièce jointe texte volumineuse : seule la partie utile est lue et rédigée
+    big = ("Facture pour jean.dupont@gmail.com, IBAN FR76 3000 6000 0112 3456 7890 189. " * 50_000).encode()
+    safe = prepare_safe_payload("Voir pièce jointe.", file_bytes=big, file_name="releve.txt")
+    print("text_len:", len(safe.text), "| pii:", safe.pii_found)
+    assert "@" not in safe.text and "FR76" not in safe.text
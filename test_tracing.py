@@ -0,0 +1,86 @@
+# test_tracing.py
+import asyncio
+import json
+import socket
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from anthropic.types import Usage
+from pydantic_ai.usage import RunUsage
+
+import tracing
+from classification import aprocess, process
+from llm_client import usage_tokens
+from local_backend import install
+from tracing import metrics_snapshot, prometheus_text, reset_metrics, span, start_metrics_server
+
+if __name__ == "__main__":
+    install(latency=0.0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tracing.TRACE_EXPORT_PATH = str(Path(tmp) / "traces.jsonl")
+        process("Bonjour, je m'appelle Jean Dupont (jean.dupont@gmail.com), je n'ai pas été remboursé.")
+        asyncio.run(aprocess("Pouvez-vous m'envoyer une attestation ?", mode="parallel"))
+
+        traces = [json.loads(line) for line in Path(tracing.TRACE_EXPORT_PATH).read_text(encoding="utf-8").splitlines()]
+        tracing.TRACE_EXPORT_PATH = ""
+    for trace in traces:
+        print(f"[TRACE] {trace['name']} {1000 * trace['seconds']:.2f}ms -> {[c['name'] for c in trace['children']]}")
+        assert trace["name"] == "process"
+        assert {c["name"] for c in trace["children"]} >= {"redaction", "reply", "classify"}
+    # tokens de l'appel API rattachés au span qui l'entoure
+    reply_span = next(c for c in traces[0]["children"] if c["name"] == "reply")
+    assert reply_span["tokens"]["input"] > 0 and reply_span["tokens"]["output"] > 0
+
+    snap = metrics_snapshot()
+    assert snap["process"]["count"] == 2 and snap["redaction"]["count"] == 2
+    text = prometheus_text()
+    assert 'assurai_span_seconds_bucket{span="reply",le="+Inf"} 2' in text
+    assert 'assurai_tokens_total{span="reply",kind="output"}' in text
+
+    # tokens du cache : comptés une seule fois, que l'usage vienne de l'API ou de pydantic-ai
+    api = Usage(input_tokens=10, output_tokens=3, cache_read_input_tokens=100, cache_creation_input_tokens=5)
+    agent = RunUsage(input_tokens=115, output_tokens=3, cache_read_tokens=100, cache_write_tokens=5)
+    assert usage_tokens(api) == usage_tokens(agent) == (10, 3, 100, 5)
+    assert usage_tokens(Usage(input_tokens=10, output_tokens=3)) == (10, 3, 0, 0)
+
+    # erreurs comptées, exception propagée
+    try:
+        with span("boom"):
+            raise ValueError("x")
+    except ValueError:
+        pass
+    assert metrics_snapshot()["boom"]["errors"] == 1
+
+    # échantillonnage : trace non retenue = aucun enregistrement
+    reset_metrics()
+    tracing.TRACE_SAMPLE_RATE = 0.0
+    process("Demande de devis")
+    assert metrics_snapshot() == {}
+
+    # surcoût par span
+    n = 20_000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with span("noop"):
+            pass
+    unsampled = (time.perf_counter() - t0) / n
+    tracing.TRACE_SAMPLE_RATE = 1.0
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with span("bench"):
+            pass
+    sampled = (time.perf_counter() - t0) / n
+    print(f"[TRACE] surcoût : {1e6 * sampled:.2f}µs/span échantillonné | {1e6 * unsampled:.2f}µs/span non retenu")
+
+    # endpoint /metrics
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = start_metrics_server(port=port)
+    body = urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics").read().decode("utf-8")
+    assert 'assurai_span_seconds_count{span="bench"} 20000' in body
+    server.shutdown()
+    print("[TRACE] OK")
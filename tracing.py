@@ -0,0 +1,330 @@
+# tracing.py
+"""
+Traces légères du pipeline : spans par étape (rédaction, extraction de pièce
+jointe, réponse, classification, agent et ses outils).
+
+- chaque span mesure sa durée et les tokens de l'appel API qu'il couvre
+  (entrée, sortie, lus / écrits dans le cache de prompt : voir llm_client.record_usage) ;
+- les spans alimentent des histogrammes en mémoire (seaux fixes, style Prometheus) ;
+- échantillonnage à la racine (TRACE_SAMPLE_RATE) : une trace non retenue ne coûte
+  qu'un tirage aléatoire, ses spans enfants sont des no-op ;
+- export : texte Prometheus (fichier ou endpoint /metrics) et, optionnellement,
+  arbre de chaque trace retenue en JSONL (TRACE_EXPORT_PATH).
+
+Usage :
+    with span("reply") as s:
+        ...
+    @traced("classify")
+    def classify(...): ...
+"""
+from __future__ import annotations
+
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") not in ("0", "false", "False")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")  # JSONL des traces retenues (vide : désactivé)
+TRACE_METRICS_PORT = int(os.getenv("TRACE_METRICS_PORT", "0"))  # endpoint /metrics (0 : désactivé)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_KINDS = ("input", "output", "cache_read", "cache_write")
+
+
+@dataclass
+class Span:
+    name: str
+    attrs: Dict[str, Any] = field(default_factory=dict)
+    start: float = field(default_factory=time.time)
+    seconds: float = 0.0
+    tokens: Dict[str, int] = field(default_factory=dict)
+    error: Optional[str] = None
+    children: List["Span"] = field(default_factory=list)
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def add_tokens(self, input: int = 0, output: int = 0, cache_read: int = 0, cache_write: int = 0) -> None:
+        for kind, n in zip(TOKEN_KINDS, (input, output, cache_read, cache_write)):
+            if n:
+                self.tokens[kind] = self.tokens.get(kind, 0) + n
+
+    def as_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"name": self.name, "start": round(self.start, 6), "seconds": round(self.seconds, 6)}
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.tokens:
+            out["tokens"] = self.tokens
+        if self.error:
+            out["error"] = self.error
+        if self.children:
+            out["children"] = [c.as_dict() for c in self.children]
+        return out
+
+
+class _NoopSpan:
+    """Span d'une trace non échantillonnée (ou traces désactivées) : n'enregistre rien."""
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def add_tokens(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+NOOP = _NoopSpan()
+_CURRENT: contextvars.ContextVar[Any] = contextvars.ContextVar("assurai_span", default=None)
+_RNG = random.Random()
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # dernier seau : +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Borne supérieure du seau contenant le quantile q (estimation à la Prometheus)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    """Histogrammes de durée, compteurs de tokens et d'erreurs, par nom de span."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: Dict[str, Histogram] = {}
+        self.tokens: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def observe(self, name: str, seconds: float, tokens: Optional[Dict[str, int]] = None, error: bool = False) -> None:
+        with self._lock:
+            hist = self.latency.get(name)
+            if hist is None:
+                hist = self.latency[name] = Histogram()
+            hist.observe(seconds)
+            if tokens:
+                counters = self.tokens.setdefault(name, {})
+                for kind, n in tokens.items():
+                    counters[kind] = counters.get(kind, 0) + n
+            if error:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {
+                    "count": h.count,
+                    "avg_s": round(h.sum / h.count, 6) if h.count else 0.0,
+                    "p50_le_s": h.quantile(0.5),
+                    "p95_le_s": h.quantile(0.95),
+                    "errors": self.errors.get(name, 0),
+                    "tokens": dict(self.tokens.get(name, {})),
+                }
+                for name, h in self.latency.items()
+            }
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP assurai_span_seconds Durée des spans du pipeline.",
+            "# TYPE assurai_span_seconds histogram",
+        ]
+        with self._lock:
+            for name, h in sorted(self.latency.items()):
+                seen = 0
+                for bound, n in zip(h.buckets, h.counts):
+                    seen += n
+                    lines.append(f'assurai_span_seconds_bucket{{span="{name}",le="{bound}"}} {seen}')
+                lines.append(f'assurai_span_seconds_bucket{{span="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'assurai_span_seconds_sum{{span="{name}"}} {h.sum:.6f}')
+                lines.append(f'assurai_span_seconds_count{{span="{name}"}} {h.count}')
+            lines += ["# HELP assurai_tokens_total Tokens facturés par span.", "# TYPE assurai_tokens_total counter"]
+            for name, counters in sorted(self.tokens.items()):
+                for kind, n in sorted(counters.items()):
+                    lines.append(f'assurai_tokens_total{{span="{name}",kind="{kind}"}} {n}')
+            lines += ["# HELP assurai_span_errors_total Spans terminés par une exception.", "# TYPE assurai_span_errors_total counter"]
+            for name, n in sorted(self.errors.items()):
+                lines.append(f'assurai_span_errors_total{{span="{name}"}} {n}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self.latency.clear()
+            self.tokens.clear()
+            self.errors.clear()
+
+
+METRICS = Metrics()
+_EXPORT_LOCK = threading.Lock()
+_COLLECTORS: List[Callable[[], List[str]]] = []
+
+
+def register_collector(collector: Callable[[], List[str]]) -> None:
+    """Lignes Prometheus supplémentaires (ex. file du régulateur d'appels), ajoutées à prometheus_text()."""
+    _COLLECTORS.append(collector)
+
+
+def _export(root: Span) -> None:
+    line = json.dumps(root.as_dict(), ensure_ascii=False)
+    with _EXPORT_LOCK:
+        with open(TRACE_EXPORT_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def _sampled(parent: Any) -> bool:
+    if not TRACE_ENABLED or parent is NOOP:
+        return False
+    return parent is not None or _RNG.random() < TRACE_SAMPLE_RATE
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Any]:
+    """
+    Span enfant du span courant (contextvars : suit les threads de asyncio.to_thread
+    et les tâches asyncio). À la racine, la trace est retenue avec la probabilité
+    TRACE_SAMPLE_RATE ; sinon tous ses spans sont des no-op.
+    """
+    parent = _CURRENT.get()
+    if not TRACE_ENABLED or parent is NOOP:  # déjà dans une trace non retenue
+        yield NOOP
+        return
+    if not _sampled(parent):
+        token = _CURRENT.set(NOOP)
+        try:
+            yield NOOP
+        finally:
+            _CURRENT.reset(token)
+        return
+
+    s = Span(name, attrs)
+    token = _CURRENT.set(s)
+    t0 = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.error = type(e).__name__
+        raise
+    finally:
+        s.seconds = time.perf_counter() - t0
+        _CURRENT.reset(token)
+        METRICS.observe(name, s.seconds, s.tokens, s.error is not None)
+        if parent is not None:
+            parent.children.append(s)
+        elif TRACE_EXPORT_PATH:
+            _export(s)
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Décorateur : exécute la fonction (synchrone ou coroutine) dans un span."""
+
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def current_span() -> Any:
+    """Span actif, ou NOOP hors trace."""
+    return _CURRENT.get() or NOOP
+
+
+def add_tokens(input: int = 0, output: int = 0, cache_read: int = 0, cache_write: int = 0) -> None:
+    current_span().add_tokens(input, output, cache_read, cache_write)
+
+
+def observe(name: str, seconds: float, input: int = 0, output: int = 0, cache_read: int = 0, cache_write: int = 0) -> None:
+    """
+    Mesure hors span (ex. réponse en flux, dont la durée s'étend sur l'itération
+    par l'appelant) ; suit le même échantillonnage que span().
+    """
+    if _sampled(_CURRENT.get()):
+        tokens = dict(zip(TOKEN_KINDS, (input, output, cache_read, cache_write)))
+        METRICS.observe(name, seconds, {k: n for k, n in tokens.items() if n})
+
+
+def metrics_snapshot() -> Dict[str, Dict[str, Any]]:
+    return METRICS.snapshot()
+
+
+def prometheus_text() -> str:
+    extra = [line for collector in _COLLECTORS for line in collector()]
+    return METRICS.prometheus() + ("\n".join(extra) + "\n" if extra else "")
+
+
+def write_metrics(path: Path) -> None:
+    """Écrit les métriques au format texte Prometheus (remplacement atomique, compatible textfile collector)."""
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(prometheus_text(), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def reset_metrics() -> None:
+    METRICS.reset()
+
+
+_SERVER = None
+
+
+def start_metrics_server(port: int = TRACE_METRICS_PORT, host: str = "127.0.0.1"):
+    """Expose GET /metrics dans un thread ; une seule fois par process (0 : désactivé)."""
+    global _SERVER
+    if _SERVER is not None or not port:
+        return _SERVER
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    _SERVER = http.server.ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=_SERVER.serve_forever, name="metrics-server", daemon=True).start()
+    return _SERVER